@@ -0,0 +1,100 @@
+import logging
+
+from django.db import transaction
+
+from chain_of_responsibility.database_writer import WriteQueue, write
+from chain_of_responsibility.singleton import SingletonMeta
+from ift785_project import settings
+from .models import SensorAlert
+
+logger = logging.getLogger(__name__)
+
+
+class AlertInsertQueue(WriteQueue):
+    """
+    WriteQueue inserting the SensorAlerts of a group with a single bulk INSERT.
+
+    The writer thread gathers the alerts saved within max_delay seconds (up to max_batch alerts), inserts them all with
+    one bulk_create in one transaction, and only then releases the callers waiting for them. When the bulk INSERT fails,
+    the alerts of the group are saved one by one so that a single invalid alert only fails its own caller.
+
+    When DATABASE_WRITER_ENABLED is set, the queue only gathers the alerts: the INSERTs are made by the DatabaseWriter,
+    which remains the only thread writing to the database.
+    """
+
+    def save(self, sensor_alert: SensorAlert) -> SensorAlert:
+        """
+        Inserts a SensorAlert with the other alerts of its group and waits for it to be committed.
+
+        Args:
+            sensor_alert: The unsaved SensorAlert.
+
+        Returns:
+            SensorAlert: The saved SensorAlert, with its primary key.
+        """
+        self.run(self._save, sensor_alert)
+        return sensor_alert
+
+    @staticmethod
+    def _save(sensor_alert: SensorAlert) -> SensorAlert:
+        """
+        Saves a single SensorAlert, when it cannot be inserted with the other alerts of its group.
+
+        Args:
+            sensor_alert: The unsaved SensorAlert.
+
+        Returns:
+            SensorAlert: The saved SensorAlert.
+        """
+        sensor_alert.save()
+        return sensor_alert
+
+    def _commit(self, writes: list) -> None:
+        """
+        Inserts the SensorAlerts of a group with a single bulk INSERT and sets their results once it is committed.
+
+        The INSERT is made through the DatabaseWriter when it is enabled, so that the writes still come from a single
+        thread.
+
+        Args:
+            writes: The (future, callable, arguments) of the writes, the only argument being the SensorAlert.
+        """
+        sensor_alerts = [args[0] for _, _, args in writes]
+        try:
+            write(self._bulk_insert, sensor_alerts)
+        except Exception:
+            logger.warning("Could not insert a group of %d alerts at once, inserting them one by one", len(writes))
+            for future, fn, args in writes:
+                args[0].pk = None
+                try:
+                    future.set_result(write(fn, *args))
+                except Exception as error:
+                    future.set_exception(error)
+            return
+
+        for future, _, args in writes:
+            future.set_result(args[0])
+
+    @staticmethod
+    def _bulk_insert(sensor_alerts: list) -> None:
+        """
+        Inserts SensorAlerts with a single bulk INSERT, in one transaction.
+
+        Args:
+            sensor_alerts: The unsaved SensorAlerts.
+        """
+        with transaction.atomic():
+            SensorAlert.objects.bulk_create(sensor_alerts)
+
+
+class AlertWriteBuffer(AlertInsertQueue, metaclass=SingletonMeta):
+    """
+    Singleton AlertInsertQueue through which SensorAlertView saves the alerts when ALERT_WRITE_BUFFER_ENABLED is set.
+    """
+
+    def __init__(self):
+        """
+        Initializes the AlertWriteBuffer with the parameters defined in the settings.
+        """
+        super().__init__('alert-write-buffer', settings.ALERT_WRITE_BUFFER_MAX_ROWS,
+                         settings.ALERT_WRITE_BUFFER_MAX_DELAY_MS / 1000)
@@ -0,0 +1,176 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.db import transaction, DatabaseError
+from django.db.models import Q
+from django.utils import timezone
+
+from api.models import SensorAlert, Notification, ArchivedSensorAlert, ArchivedNotification, ArchivingState
+from chain_of_responsibility.database_writer import write
+from chain_of_responsibility.singleton import SingletonMeta
+from chain_of_responsibility.worker_pool import WorkerPool, WorkerPoolSaturated
+from ift785_project import settings
+
+logger = logging.getLogger(__name__)
+
+
+def archive_chunk(cutoff, after_id: int, chunk_size: int) -> tuple:
+    """
+    Moves one chunk of resolved alerts started before the cutoff, with their notifications, to the archive tables.
+
+    The chunk is selected by keyset (the alerts whose id follows the last one archived), so that each chunk is a short
+    transaction on an index range instead of an ever-growing OFFSET scan.
+
+    Args:
+        cutoff (datetime): The alerts started before this date are archived.
+        after_id (int): The id of the last alert archived (0 to start from the beginning).
+        chunk_size (int): The maximum number of alerts archived.
+
+    Returns:
+        tuple: The id of the last alert archived (None if there was nothing left to archive), and the number of alerts
+            and notifications archived.
+    """
+    with transaction.atomic():
+        alerts = list(SensorAlert.objects.filter(pk__gt=after_id, is_resolved=True, start__lt=cutoff)
+                      .order_by('pk')[:chunk_size])
+        if not alerts:
+            return None, 0, 0
+        alert_ids = [alert.pk for alert in alerts]
+        notifications = list(Notification.objects.filter(sensor_alert_id__in=alert_ids))
+
+        ArchivedSensorAlert.objects.bulk_create([
+            ArchivedSensorAlert(id=alert.pk, subject=alert.subject, start=alert.start, location=alert.location,
+                                state=alert.state, measurable=alert.measurable, home_id=alert.home_id)
+            for alert in alerts
+        ])
+        ArchivedNotification.objects.bulk_create([
+            ArchivedNotification(id=notification.pk, caregiver_id=notification.caregiver_id,
+                                 sensor_alert_id=notification.sensor_alert_id, token=notification.token,
+                                 has_accepted=notification.has_accepted)
+            for notification in notifications
+        ])
+        # Deleting the alerts also deletes their notifications and everything depending on them
+        SensorAlert.objects.filter(pk__in=alert_ids).delete()
+
+    return alert_ids[-1], len(alerts), len(notifications)
+
+
+def archive_alerts(older_than: timedelta, chunk_size: int, on_chunk=None) -> tuple:
+    """
+    Moves every resolved alert older than the given age, with its notifications, to the archive tables, chunk by chunk.
+
+    Each chunk is a write of its own through the DatabaseWriter, so that the archiving never competes with it.
+
+    Args:
+        older_than (timedelta): The minimum age of the alerts archived.
+        chunk_size (int): The maximum number of alerts archived in one transaction.
+        on_chunk (callable): Called with the number of alerts and notifications of each chunk and its duration.
+
+    Returns:
+        tuple: The number of alerts and notifications archived, and the duration of the archiving in seconds.
+    """
+    cutoff = timezone.now() - older_than
+    total_alerts = total_notifications = 0
+    last_id = 0
+    start = time.perf_counter()
+    while True:
+        chunk_start = time.perf_counter()
+        last_id, alerts, notifications = write(archive_chunk, cutoff, last_id, chunk_size)
+        if last_id is None:
+            break
+        total_alerts += alerts
+        total_notifications += notifications
+        if on_chunk is not None:
+            on_chunk(alerts, notifications, time.perf_counter() - chunk_start)
+    return total_alerts, total_notifications, time.perf_counter() - start
+
+
+def claim_archiving(force: bool = False) -> bool:
+    """
+    Reserves the archiving to the caller, unless another process is archiving or, when not forced, the last archiving
+    is more recent than ARCHIVE_INTERVAL seconds.
+
+    The archiving is claimed with a single UPDATE whose conditions are checked again on the row, so when several
+    processes claim it at the same time, only one of them gets it.
+
+    Args:
+        force (bool): Whether to claim the archiving even if the last one is recent.
+
+    Returns:
+        bool: Whether the caller got the archiving, in which case it must call release_archiving once done.
+    """
+    def claim():
+        now = timezone.now()
+        ArchivingState.objects.get_or_create(pk=1)
+        state = ArchivingState.objects.filter(pk=1).filter(Q(running_until__isnull=True) | Q(running_until__lt=now))
+        if not force:
+            state = state.filter(Q(last_run_at__isnull=True)
+                                 | Q(last_run_at__lte=now - timedelta(seconds=settings.ARCHIVE_INTERVAL)))
+        return state.update(running_until=now + timedelta(seconds=settings.ARCHIVE_LOCK_TIMEOUT)) == 1
+
+    return write(claim)
+
+
+def release_archiving() -> None:
+    """
+    Records the end of the archiving claimed by the caller.
+    """
+    write(lambda: ArchivingState.objects.filter(pk=1).update(last_run_at=timezone.now(), running_until=None))
+
+
+class ArchivingWorker(WorkerPool, metaclass=SingletonMeta):
+    """
+    Singleton WorkerPool with a single thread running the periodic archiving, so that a long archiving never holds one
+    of the workers of the EscalationScheduler.
+    """
+
+    def __init__(self):
+        """
+        Initializes the ArchivingWorker with one thread and room for a single pending archiving.
+        """
+        super().__init__('archiving', workers=1, queue_size=1)
+
+
+def schedule_archiving(delay: float = None) -> None:
+    """
+    Schedules a check of whether the archiving of the old alerts is due on the EscalationScheduler.
+
+    Args:
+        delay (float): The number of seconds before the check (ARCHIVE_CHECK_INTERVAL by default).
+    """
+    from chain_of_responsibility.escalation_scheduler import EscalationScheduler
+
+    EscalationScheduler().schedule(settings.ARCHIVE_CHECK_INTERVAL if delay is None else delay, submit_archiving)
+
+
+def submit_archiving() -> None:
+    """
+    Hands the archiving to the ArchivingWorker, unless it is already pending, and schedules the next check.
+    """
+    try:
+        ArchivingWorker().submit(run_scheduled_archiving)
+    except WorkerPoolSaturated:
+        pass
+    finally:
+        schedule_archiving()
+
+
+def run_scheduled_archiving() -> None:
+    """
+    Archives the old alerts when the archiving is due and no other process is running it, and logs the outcome.
+    """
+    try:
+        if not claim_archiving():
+            return
+    except DatabaseError:
+        logger.exception("Could not claim the archiving of the old alerts")
+        return
+    try:
+        alerts, notifications, elapsed = archive_alerts(timedelta(days=settings.ARCHIVE_AFTER_DAYS),
+                                                        settings.ARCHIVE_CHUNK_SIZE)
+        logger.info("Archived %d alerts and %d notifications in %.1fs", alerts, notifications, elapsed)
+    except DatabaseError:
+        logger.exception("Could not archive the old alerts")
+    finally:
+        release_archiving()
@@ -0,0 +1,63 @@
+import threading
+from collections import OrderedDict
+
+from chain_of_responsibility.singleton import SingletonMeta
+from ift785_project import settings
+
+
+class ConfirmationCache(metaclass=SingletonMeta):
+    """
+    Singleton bounded LRU cache of the confirmation tokens whose sensor alert has been resolved.
+
+    A resolved sensor alert stays resolved, so a new click on the link of one of its notifications (a caregiver clicking
+    twice, an email scanner prefetching the link...) can be answered from memory. The least recently used tokens are
+    forgotten once CONFIRMATION_CACHE_SIZE tokens are cached.
+
+    Attributes:
+        _tokens: The first name of the elderly person of each cached token, the most recently used last.
+        _lock: Lock protecting the cached tokens.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty ConfirmationCache.
+        """
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        """
+        Returns the first name of the elderly person of a resolved token.
+
+        Args:
+            token (str): The confirmation token.
+
+        Returns:
+            str: The first name of the elderly person, or None if the token is not cached.
+        """
+        with self._lock:
+            first_name = self._tokens.get(token)
+            if first_name is not None:
+                self._tokens.move_to_end(token)
+            return first_name
+
+    def put(self, token: str, first_name: str) -> None:
+        """
+        Caches a token whose sensor alert has been resolved.
+
+        Args:
+            token (str): The confirmation token.
+            first_name (str): The first name of the elderly person of the notification.
+        """
+        with self._lock:
+            self._tokens[token] = first_name
+            self._tokens.move_to_end(token)
+            while len(self._tokens) > settings.CONFIRMATION_CACHE_SIZE:
+                self._tokens.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Forgets every cached token.
+        """
+        with self._lock:
+            self._tokens.clear()
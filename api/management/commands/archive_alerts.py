@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.archiving import archive_alerts, claim_archiving, release_archiving
+from ift785_project import settings
+
+
+class Command(BaseCommand):
+    help = ("Moves the resolved alerts older than the given age, with their notifications, to the archive tables, in "
+            "chunks of bounded size.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=settings.ARCHIVE_AFTER_DAYS,
+                            help="Minimum age, in days, of the alerts archived.")
+        parser.add_argument('--chunk-size', type=int, default=settings.ARCHIVE_CHUNK_SIZE,
+                            help="Maximum number of alerts archived in one transaction.")
+
+    def handle(self, *args, **options):
+        def report_chunk(alerts, notifications, elapsed):
+            self.stdout.write(f"Archived {alerts} alerts and {notifications} notifications "
+                              f"({(alerts + notifications) / elapsed:.0f} rows/s)")
+
+        # Never archive along with the periodic archiving of a server process
+        if not claim_archiving(force=True):
+            raise CommandError("The alerts are already being archived by another process")
+        try:
+            alerts, notifications, elapsed = archive_alerts(timedelta(days=options['days']), options['chunk_size'],
+                                                            report_chunk)
+        finally:
+            release_archiving()
+        rate = (alerts + notifications) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"Archived {alerts} alerts and {notifications} notifications in "
+                                             f"{elapsed:.1f}s ({rate:.0f} rows/s)"))
@@ -0,0 +1,129 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.models import Person, CaregiverLevel, Caregiver, Home, SensorAlert, Notification
+
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = ("Seeds a large number of alerts in a transaction that is rolled back, and reports the query plans and "
+            "timings of the hot queries without and with the indexes of the api models.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alerts', type=int, default=1000000, help="Number of alerts to seed.")
+        parser.add_argument('--homes', type=int, default=1000, help="Number of homes the alerts are spread over.")
+        parser.add_argument('--repeat', type=int, default=100, help="Number of runs of each query.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            elderly, home, alert = self.seed(options['alerts'], options['homes'])
+            queries = {
+                "Caregivers of an elderly person at a level":
+                    Caregiver.objects.filter(elderly=elderly, level__level=3),
+                "Open alerts of a home":
+                    SensorAlert.objects.filter(home=home, is_resolved=False).order_by('start'),
+                "Latest resolved alerts of a home":
+                    SensorAlert.objects.filter(home=home, is_resolved=True).order_by('-start')[:20],
+                "Notifications of an alert":
+                    Notification.objects.filter(sensor_alert=alert),
+            }
+
+            self.drop_indexes()
+            self.stdout.write(self.style.MIGRATE_HEADING("Without the indexes"))
+            self.run_queries(queries, options['repeat'])
+
+            self.create_indexes()
+            self.stdout.write(self.style.MIGRATE_HEADING("With the indexes"))
+            self.run_queries(queries, options['repeat'])
+
+            # Leave the database as it was
+            transaction.set_rollback(True)
+
+    def seed(self, alerts: int, homes: int) -> tuple:
+        """
+        Seeds the homes, their elderly persons and caregivers, the alerts (mostly resolved) and a notification for one
+        alert out of ten.
+
+        Returns:
+            tuple: An elderly person, their home and one of its alerts, used as query parameters.
+        """
+        start = time.perf_counter()
+        levels = [CaregiverLevel.objects.get_or_create(level=level)[0] for level in range(4)]
+        persons = Person.objects.bulk_create(
+            [Person(first_name=f"bench-{index}", last_name="elderly", email=f"elderly{index}@example.com")
+             for index in range(homes)] +
+            [Person(first_name=f"bench-{index}", last_name=f"caregiver-{level.level}",
+                    email=f"caregiver{index}.{level.level}@example.com")
+             for index in range(homes) for level in levels],
+            batch_size=BATCH_SIZE)
+        elderly_persons = persons[:homes]
+        caregivers = Caregiver.objects.bulk_create(
+            [Caregiver(elderly=elderly_persons[index // len(levels)], caregiver=person,
+                       level=levels[index % len(levels)])
+             for index, person in enumerate(persons[homes:])],
+            batch_size=BATCH_SIZE)
+        home_objects = Home.objects.bulk_create(
+            [Home(home=f"bench-home-{index}", elderly=person) for index, person in enumerate(elderly_persons)],
+            batch_size=BATCH_SIZE)
+
+        now = timezone.now()
+        for offset in range(0, alerts, BATCH_SIZE):
+            sensor_alerts = SensorAlert.objects.bulk_create([
+                SensorAlert(subject="bench", start=now - timedelta(minutes=index), location="kitchen", state=20,
+                            measurable="temperature", home=random.choice(home_objects),
+                            is_resolved=random.random() > 0.01)
+                for index in range(offset, min(offset + BATCH_SIZE, alerts))
+            ])
+            Notification.objects.bulk_create([
+                Notification(caregiver=caregivers[random.randrange(len(caregivers))], sensor_alert=sensor_alert)
+                for sensor_alert in sensor_alerts[::10]
+            ])
+
+        self.stdout.write(f"Seeded {alerts} alerts over {homes} homes in {time.perf_counter() - start:.1f}s")
+        alert = SensorAlert.objects.filter(home=home_objects[0]).first() or sensor_alerts[0]
+        return elderly_persons[0], home_objects[0], alert
+
+    def run_queries(self, queries: dict, repeat: int) -> None:
+        """
+        Prints the query plan and the mean time of each query.
+        """
+        for name, queryset in queries.items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            elapsed = (time.perf_counter() - start) / repeat
+            self.stdout.write(f"{name}: {elapsed * 1000:.3f} ms")
+            for line in queryset.explain().splitlines():
+                self.stdout.write(f"    {line}")
+
+    @staticmethod
+    def get_indexes() -> list:
+        """
+        Returns the (model, index) of the indexes declared in the Meta of the api models.
+        """
+        return [(model, index) for model in (Caregiver, SensorAlert) for index in model._meta.indexes]
+
+    def drop_indexes(self) -> None:
+        """
+        Drops the declared indexes (within the transaction, so that they are restored by the rollback).
+        """
+        with connection.cursor() as cursor:
+            for model, index in self.get_indexes():
+                cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
+
+    def create_indexes(self) -> None:
+        """
+        Creates the declared indexes again, and updates the statistics used by the query planner.
+        """
+        schema_editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model, index in self.get_indexes():
+                cursor.execute(str(index.create_sql(model, schema_editor)))
+            if connection.vendor in ('sqlite', 'postgresql'):
+                cursor.execute("ANALYZE")
@@ -0,0 +1,86 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+from django.utils import timezone
+
+from api.alert_write_buffer import AlertInsertQueue
+from api.models import Person, Home, SensorAlert
+from chain_of_responsibility.database_writer import WriteQueue
+from ift785_project import settings
+
+HOME = 'bench-writes'
+
+
+def make_alert() -> SensorAlert:
+    return SensorAlert(subject="bench", start=timezone.now(), location="kitchen", state=20, measurable="temperature",
+                       home_id=HOME)
+
+
+class Command(BaseCommand):
+    help = ("Measures the number of alerts written per second by concurrent threads, each writing on its own "
+            "connection, all writing through a single writer thread and through the alert write buffer.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help="Number of concurrent threads.")
+        parser.add_argument('--writes', type=int, default=200, help="Number of alerts written by each thread.")
+        parser.add_argument('--max-batch', type=int, default=settings.DATABASE_WRITER_MAX_BATCH,
+                            help="Maximum number of writes committed together by the writer thread.")
+        parser.add_argument('--max-delay-ms', type=float, default=settings.DATABASE_WRITER_MAX_DELAY_MS,
+                            help="Maximum number of milliseconds the writer thread waits for more writes.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Database profile: {settings.DATABASE_PROFILE}")
+        elderly, _ = Person.objects.get_or_create(first_name=HOME, last_name=HOME, defaults={'email': 'bench@example.com'})
+        home, _ = Home.objects.get_or_create(home=HOME, defaults={'elderly': elderly})
+        try:
+            self.run_threads("Each thread on its own connection", options, lambda write: write())
+
+            write_queue = WriteQueue('bench-writer', options['max_batch'], options['max_delay_ms'] / 1000)
+            self.run_threads("Through a single writer thread", options,
+                             lambda write: write_queue.submit(write).result())
+
+            alert_queue = AlertInsertQueue('bench-alert-buffer', settings.ALERT_WRITE_BUFFER_MAX_ROWS,
+                                           settings.ALERT_WRITE_BUFFER_MAX_DELAY_MS / 1000)
+            self.run_threads("Through the alert write buffer", options,
+                             lambda write: alert_queue.save(make_alert()))
+        finally:
+            SensorAlert.objects.filter(home=home).delete()
+            home.delete()
+            elderly.delete()
+
+    def run_threads(self, name: str, options: dict, make_write) -> None:
+        """
+        Runs the threads writing the alerts and prints the number of alerts written per second.
+
+        Args:
+            name: The name of the mode benchmarked.
+            options: The options of the command.
+            make_write: Called by the threads with the callable writing an alert, to make the write (it may write an
+                alert of its own instead).
+        """
+        errors = []
+
+        def write_alert():
+            make_alert().save()
+
+        def work():
+            for _ in range(options['writes']):
+                try:
+                    make_write(write_alert)
+                except OperationalError as error:
+                    errors.append(error)
+            connection.close()
+
+        threads = [threading.Thread(target=work) for _ in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        written = options['threads'] * options['writes'] - len(errors)
+        self.stdout.write(f"{name}: {written} alerts in {elapsed:.2f}s ({written / elapsed:.0f} writes/s), "
+                          f"{len(errors)} failed")
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_alter_caregiverlevel_wait_time'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='token',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('token__isnull', False)), fields=('token',),
+                                               name='notification_legacy_token_unique'),
+        ),
+    ]
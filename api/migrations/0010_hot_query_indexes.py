@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_alter_notification_token'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='caregiver',
+            index=models.Index(fields=['elderly', 'level'], name='caregiver_elderly_level_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensoralert',
+            index=models.Index(fields=['home', 'start', 'is_resolved'], name='alert_home_start_resolved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensoralert',
+            index=models.Index(condition=models.Q(('is_resolved', False)), fields=['home', 'start'], name='alert_open_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedSensorAlert',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('subject', models.CharField(max_length=50)),
+                ('start', models.DateTimeField()),
+                ('location', models.CharField(max_length=50)),
+                ('state', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('measurable', models.CharField(max_length=50)),
+                ('home_id', models.CharField(max_length=50)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('caregiver_id', models.BigIntegerField()),
+                ('token', models.CharField(blank=True, max_length=64, null=True)),
+                ('has_accepted', models.BooleanField(default=False)),
+                ('sensor_alert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.archivedsensoralert')),
+            ],
+        ),
+    ]
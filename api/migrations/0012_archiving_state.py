@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivingState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('running_until', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
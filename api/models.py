@@ -1,5 +1,7 @@
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+
+from chain_of_responsibility.database_writer import write
 
 
 # Create your models here.
@@ -36,6 +38,10 @@ class Caregiver(models.Model):
 
     class Meta:
         unique_together = ('elderly', 'caregiver',)
+        indexes = [
+            # Caregivers of an elderly person at a given level
+            models.Index(fields=['elderly', 'level'], name='caregiver_elderly_level_idx'),
+        ]
 
     def __str__(self):
         return f'Caregiver: {self.caregiver} - Elderly: {self.elderly} - Level: {self.level}'
@@ -58,6 +64,15 @@ class SensorAlert(models.Model):
     home = models.ForeignKey(Home, on_delete=models.CASCADE)
     is_resolved = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Alerts of a home by date, possibly filtered on their state (which SQLite can only check on the index when
+            # it comes after the date, as Django filters on booleans without comparison operator)
+            models.Index(fields=['home', 'start', 'is_resolved'], name='alert_home_start_resolved_idx'),
+            # Open alerts only, which are few compared to the resolved ones
+            models.Index(fields=['home', 'start'], condition=models.Q(is_resolved=False), name='alert_open_idx'),
+        ]
+
     def __str__(self):
         return f'{self.home}'
 
@@ -65,5 +80,85 @@ class SensorAlert(models.Model):
 class Notification(models.Model):
     caregiver = models.ForeignKey(Caregiver, on_delete=models.CASCADE)
     sensor_alert = models.ForeignKey(SensorAlert, on_delete=models.CASCADE)
-    token = models.CharField(max_length=255, unique=True)
+    # Random token of the notifications created before the confirmation tokens were signed (see api.tokens)
+    token = models.CharField(max_length=64, null=True, blank=True)
     has_accepted = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            # Only the legacy random tokens are unique: the new notifications have no token and no entry in the index
+            models.UniqueConstraint(fields=['token'], condition=models.Q(token__isnull=False),
+                                    name='notification_legacy_token_unique'),
+        ]
+
+    def accept(self) -> bool:
+        """
+        Accepts the notification, unless its sensor alert has already been resolved.
+
+        The sensor alert is resolved with a compare-and-set UPDATE, in the same transaction as the update of the
+        notification, so that only one of several concurrent acceptances of the notifications of an alert succeeds. The
+        transaction is made through the DatabaseWriter when it is enabled.
+
+        Returns:
+            bool: Whether this acceptance resolved the sensor alert.
+        """
+        def resolve():
+            with transaction.atomic():
+                resolved = SensorAlert.objects.filter(pk=self.sensor_alert_id,
+                                                      is_resolved=False).update(is_resolved=True)
+                if resolved:
+                    Notification.objects.filter(pk=self.pk).update(has_accepted=True)
+                return bool(resolved)
+
+        if not write(resolve):
+            return False
+        self.has_accepted = True
+
+        # Keep the sensor alert already loaded with the notification, if any, up to date
+        if Notification.sensor_alert.is_cached(self):
+            self.sensor_alert.is_resolved = True
+        return True
+
+
+class ArchivedSensorAlert(models.Model):
+    """
+    Resolved SensorAlert moved out of the live table by the archive_alerts command. It keeps the same primary key.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    subject = models.CharField(max_length=50)
+    start = models.DateTimeField()
+    location = models.CharField(max_length=50)
+    state = models.DecimalField(max_digits=5, decimal_places=2)
+    measurable = models.CharField(max_length=50)
+    home_id = models.CharField(max_length=50)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Archived alert {self.id} - Home: {self.home_id} - Start: {self.start}'
+
+
+class ArchivingState(models.Model):
+    """
+    Single row recording when the old alerts were last archived and until when a process is archiving them, so that the
+    alerts are archived by a single process at a time, every ARCHIVE_INTERVAL seconds, whatever the number of processes
+    and however often they restart.
+    """
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    running_until = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Archiving - Last run at: {self.last_run_at}'
+
+
+class ArchivedNotification(models.Model):
+    """
+    Notification of an archived SensorAlert. It keeps the same primary key.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    caregiver_id = models.BigIntegerField()
+    sensor_alert = models.ForeignKey(ArchivedSensorAlert, on_delete=models.CASCADE)
+    token = models.CharField(max_length=64, null=True, blank=True)
+    has_accepted = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f'Archived notification {self.id} - Alert: {self.sensor_alert_id}'
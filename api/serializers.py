@@ -1,8 +1,30 @@
+from django.db import transaction
 from rest_framework import serializers
 from api.models import SensorAlert
 
 
+class SensorAlertListSerializer(serializers.ListSerializer):
+    """
+    List serializer used when several SensorAlerts are posted at once.
+
+    The validated alerts are written with a single bulk INSERT inside one transaction instead of one INSERT (and one
+    commit) per alert.
+    """
+
+    def create(self, validated_data):
+        """
+        Create all the SensorAlerts of the batch.
+
+        :param validated_data: The list of validated SensorAlert attributes.
+        :return: The list of created SensorAlerts, in the order of the request.
+        """
+        sensor_alerts = [SensorAlert(**attrs) for attrs in validated_data]
+        with transaction.atomic():
+            return SensorAlert.objects.bulk_create(sensor_alerts)
+
+
 class SensorAlertSerializer(serializers.ModelSerializer):
     class Meta:
         model = SensorAlert
         fields = '__all__'
+        list_serializer_class = SensorAlertListSerializer
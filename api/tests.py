@@ -1,12 +1,27 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
-from django.test import TestCase, override_settings
+from django.core.management import call_command, CommandError
+from django.core.exceptions import ValidationError
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.admin.sites import AdminSite
-from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_503_SERVICE_UNAVAILABLE
 from rest_framework.test import APIRequestFactory
-from api.models import SensorAlert, Person, Home, Caregiver, Notification, CaregiverLevel
+from api.alert_write_buffer import AlertInsertQueue
+from api.archiving import archive_alerts, archive_chunk, claim_archiving, release_archiving, run_scheduled_archiving, \
+    submit_archiving, ArchivingWorker
+from api.models import SensorAlert, Person, Home, Caregiver, Notification, CaregiverLevel, ArchivedSensorAlert, \
+    ArchivedNotification, ArchivingState
+from api.confirmation_cache import ConfirmationCache
+from api.tokens import make_notification_token
 from api.admin import CaregiverLevelFilter, CaregiverLevelAdmin, CaregiverAdmin
-from api.views import SensorAlertView
+from api.views import SensorAlertView, SensorAlertBatchView, throw_in_chains
+from chain_of_responsibility.chain_executor import ChainExecutor
+from chain_of_responsibility.worker_pool import WorkerPoolSaturated
 from django.apps import apps
 from ift785_project import settings
 
@@ -64,8 +79,56 @@ class SensorAlertViewTestCase(TestCase):
         self.assertTrue(SensorAlert.objects.filter(home__home=data['home']).exists())
 
         # Check that throw_in_chain was called with the correct arguments
+        ChainExecutor().join()
         mock_throw_in_chain.assert_called_once_with(SensorAlert.objects.get(home__home=data['home']))
 
+    @patch('api.views.ChainExecutor.submit', side_effect=WorkerPoolSaturated)
+    def test_post_when_executor_saturated(self, mock_submit):
+        """
+        This method tests the behavior of the SensorAlertView when the ChainExecutor cannot accept more alerts. It
+        checks if the response status code is HTTP_503_SERVICE_UNAVAILABLE with a Retry-After header, and if the
+        sensor alert was not kept in the database.
+        """
+        data = {
+            "subject": "stove",
+            "start": "2022-05-09T16:13:09.754Z",
+            "location": "kitchen",
+            "state": "29.22",
+            "measurable": "anomalous_location_temperature",
+            "home": "nears-hub-dev"
+        }
+        request = self.factory.post('/api/sensor-alerts/', data, format='json')
+        response = self.view(request)
+
+        self.assertEqual(response.status_code, HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], str(settings.CHAIN_EXECUTOR_RETRY_AFTER))
+        self.assertFalse(SensorAlert.objects.exists())
+
+    @patch('api.views.throw_in_chain')
+    def test_post_with_alert_write_buffer(self, mock_throw_in_chain):
+        """
+        This method tests the behavior of the SensorAlertView when the alerts are saved through the AlertWriteBuffer. It
+        checks if the response holds the saved alert and if throw_in_chain was called with it.
+        """
+        data = {
+            "subject": "stove",
+            "start": "2022-05-09T16:13:09.754Z",
+            "location": "kitchen",
+            "state": "29.22",
+            "measurable": "anomalous_location_temperature",
+            "home": "nears-hub-dev"
+        }
+        request = self.factory.post('/api/sensor-alerts/', data, format='json')
+        with patch.object(settings, 'ALERT_WRITE_BUFFER_ENABLED', True):
+            response = self.view(request)
+
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        sensor_alert = SensorAlert.objects.get(home__home=data['home'])
+        self.assertEqual(response.data['id'], sensor_alert.pk)
+
+        ChainExecutor().join()
+        mock_throw_in_chain.assert_called_once_with(sensor_alert)
+
     @patch('api.views.throw_in_chain')
     def test_post_invalid_data(self, mock_throw_in_chain):
         """
@@ -90,6 +153,149 @@ class SensorAlertViewTestCase(TestCase):
         mock_throw_in_chain.assert_not_called()
 
 
+class AlertInsertQueueTestCase(TransactionTestCase):
+    """
+    Test case class for AlertInsertQueue. The alerts are inserted by the writer thread of the queue, on its own
+    connection, hence the test case does not run within a transaction.
+    """
+
+    def setUp(self):
+        elderly = Person.objects.create(first_name='John', last_name='Doe', email='john.doe@example.com')
+        self.home = Home.objects.create(home='nears-hub-dev', elderly=elderly)
+        self.queue = AlertInsertQueue('test-alert-buffer', max_batch=10, max_delay=0.5)
+
+    def make_alert(self, state='29.22') -> SensorAlert:
+        return SensorAlert(subject='stove', start=timezone.now(), location='kitchen', state=state,
+                           measurable='temperature', home=self.home)
+
+    def test_alerts_are_inserted_together(self):
+        """
+        Test that the alerts saved within the delay are inserted with a single bulk INSERT before their callers return.
+        """
+        sensor_alerts = [self.make_alert() for _ in range(3)]
+
+        with patch.object(SensorAlert.objects, 'bulk_create', wraps=SensorAlert.objects.bulk_create) as bulk_create, \
+                ThreadPoolExecutor(max_workers=3) as executor:
+            saved = list(executor.map(self.queue.save, sensor_alerts))
+
+        bulk_create.assert_called_once()
+        self.assertEqual(saved, sensor_alerts)
+        self.assertTrue(all(sensor_alert.pk for sensor_alert in saved))
+        self.assertEqual(SensorAlert.objects.count(), 3)
+
+    def test_alerts_are_inserted_by_database_writer(self):
+        """
+        Test that when the DatabaseWriter is enabled, the alerts gathered by the queue are inserted by the writer thread
+        of the DatabaseWriter, which remains the only thread writing to the database.
+        """
+        threads = []
+        bulk_create = SensorAlert.objects.bulk_create
+
+        def record_bulk_create(sensor_alerts):
+            threads.append(threading.current_thread().name)
+            return bulk_create(sensor_alerts)
+
+        with patch.object(settings, 'DATABASE_WRITER_ENABLED', True), \
+                patch.object(SensorAlert.objects, 'bulk_create', side_effect=record_bulk_create):
+            sensor_alert = self.queue.save(self.make_alert())
+
+        self.assertIsNotNone(sensor_alert.pk)
+        self.assertEqual(threads, ['database-writer'])
+        self.assertEqual(SensorAlert.objects.count(), 1)
+
+    def test_invalid_alert_only_fails_its_caller(self):
+        """
+        Test that when the bulk INSERT fails, the alerts are saved one by one and only the invalid one is not saved.
+        """
+        valid = self.queue.submit(self.queue._save, self.make_alert())
+        invalid = self.queue.submit(self.queue._save, self.make_alert(state='invalid'))
+
+        self.assertIsNotNone(valid.result(timeout=5).pk)
+        with self.assertRaises(ValidationError):
+            invalid.result(timeout=5)
+        self.assertEqual(SensorAlert.objects.count(), 1)
+
+
+class SensorAlertBatchViewTestCase(TestCase):
+    """
+    Django TestCase for the SensorAlertBatchView. It contains methods to test the behavior of the view when receiving
+    POST requests with a valid batch of alerts and with a batch containing an invalid alert.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        This method is called once to set up non-modified data for all class methods. Here, it creates a Person and a
+        Home object that will be used in the tests.
+        """
+        elderly = Person.objects.create(first_name='John', last_name='Doe', email='john.doe@example.com')
+        Home.objects.create(home='nears-hub-dev', elderly=elderly)
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.view = SensorAlertBatchView.as_view()
+        self.alert = {
+            "subject": "stove",
+            "start": "2022-05-09T16:13:09.754Z",
+            "location": "kitchen",
+            "state": "29.22",
+            "measurable": "anomalous_location_temperature",
+            "home": "nears-hub-dev"
+        }
+
+    @patch('api.views.throw_in_chains')
+    def test_post_valid_batch(self, mock_throw_in_chains):
+        """
+        This method tests that a valid batch is saved, that one result is returned per alert and that the whole batch
+        is handed to throw_in_chains at once.
+        """
+        data = [self.alert, dict(self.alert, location='bathroom')]
+        request = self.factory.post('/api/alert/batch', data, format='json')
+        response = self.view(request)
+
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual([item['location'] for item in response.data], ['kitchen', 'bathroom'])
+        self.assertTrue(all(item['id'] is not None for item in response.data))
+        self.assertEqual(SensorAlert.objects.count(), 2)
+
+        # The whole batch is thrown into the chains at once
+        ChainExecutor().join()
+        mock_throw_in_chains.assert_called_once()
+        self.assertEqual(list(mock_throw_in_chains.call_args[0][0]), list(SensorAlert.objects.order_by('id')))
+
+    @patch('api.views.throw_in_chain', side_effect=[Exception("Chain failed"), None])
+    def test_failing_chain_does_not_abort_batch(self, mock_throw_in_chain):
+        """
+        This method tests that when the chain of an alert of the batch fails, the next alerts are still thrown into
+        their chains.
+        """
+        sensor_alerts = [SensorAlert.objects.create(subject='stove', start=timezone.now(), location='kitchen',
+                                                    state='29.22', measurable='anomalous_location_temperature',
+                                                    home_id=self.alert['home'])
+                         for _ in range(2)]
+
+        throw_in_chains(sensor_alerts)
+
+        self.assertEqual([call.args[0] for call in mock_throw_in_chain.call_args_list], sensor_alerts)
+
+    @patch('api.views.throw_in_chains')
+    def test_post_invalid_batch(self, mock_throw_in_chains):
+        """
+        This method tests that a batch containing an invalid alert is rejected as a whole and that the errors are
+        reported for each alert.
+        """
+        data = [self.alert, dict(self.alert, home='invalid-home')]
+        request = self.factory.post('/api/alert/batch', data, format='json')
+        response = self.view(request)
+
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('home', response.data[1])
+        self.assertFalse(SensorAlert.objects.exists())
+        mock_throw_in_chains.assert_not_called()
+
+
 class ConfirmNotificationViewTestCase(TestCase):
     """
     Django TestCase for the confirm_notification function. It contains methods to set up test data and test the
@@ -111,6 +317,12 @@ class ConfirmNotificationViewTestCase(TestCase):
                                                   state='29.22', measurable='anomalous_location_temperature', home=home)
         cls.notification = Notification.objects.create(token='12345', caregiver=caregiver, sensor_alert=sensor_alert)
 
+    def setUp(self):
+        """
+        This method forgets the tokens cached by the previous tests, since the tokens are reused across tests.
+        """
+        ConfirmationCache().clear()
+
     def test_confirm_notification_with_valid_token(self):
         """
         This method tests the behavior of the confirm_notification function when it receives a GET request with a
@@ -139,6 +351,284 @@ class ConfirmNotificationViewTestCase(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
+    def test_confirm_notification_with_signed_token(self):
+        """
+        This method tests that a signed token is accepted and that its notification is loaded by primary key.
+        """
+        url = reverse('api:confirm_notification')
+        token = make_notification_token(self.notification.pk)
+
+        response = self.client.get(f"{url}?token={token}")
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_confirm_notification_with_forged_token(self):
+        """
+        This method tests that a token whose signature does not match is rejected without querying the database.
+        """
+        url = reverse('api:confirm_notification')
+        token = make_notification_token(self.notification.pk)
+        forged_token = f"{self.notification.pk + 1}{token[token.index(':'):]}"
+
+        with self.assertNumQueries(0):
+            response = self.client.get(f"{url}?token={forged_token}")
+
+        self.assertEqual(response.status_code, 404)
+
+    @patch.object(settings, 'NOTIFICATION_TOKEN_MAX_AGE', -1)
+    def test_confirm_notification_with_expired_token(self):
+        """
+        This method tests that an expired token is rejected without querying the database.
+        """
+        url = reverse('api:confirm_notification')
+        token = make_notification_token(self.notification.pk)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(f"{url}?token={token}")
+
+        self.assertEqual(response.status_code, 410)
+
+    def test_confirm_notification_without_token(self):
+        """
+        This method tests that a request without token is rejected, even though new notifications store no token.
+        """
+        Notification.objects.filter(pk=self.notification.pk).update(token=None)
+
+        response = self.client.get(reverse('api:confirm_notification'))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_confirm_notification_only_first_click_wins(self):
+        """
+        This method tests that, when two notifications of the same alert are accepted, only the first acceptance
+        resolves the alert.
+        """
+        other_notification = Notification.objects.create(caregiver=self.notification.caregiver,
+                                                         sensor_alert=self.notification.sensor_alert)
+        url = reverse('api:confirm_notification')
+
+        first_response = self.client.get(f"{url}?token=12345")
+        second_response = self.client.get(f"{url}?token={make_notification_token(other_notification.pk)}")
+
+        self.assertContains(first_response, "Request for assistance accepted")
+        self.assertContains(second_response, "has already been accepted")
+        self.assertTrue(SensorAlert.objects.get(pk=self.notification.sensor_alert_id).is_resolved)
+        self.assertTrue(Notification.objects.get(pk=self.notification.pk).has_accepted)
+        self.assertFalse(Notification.objects.get(pk=other_notification.pk).has_accepted)
+
+    def test_confirm_notification_query_count(self):
+        """
+        This method locks in the number of queries of the confirm_notification function: one query to load the
+        notification with everything the response needs, the two updates of the acceptance (within a savepoint), and
+        no query at all for the following clicks.
+        """
+        url = reverse('api:confirm_notification')
+        token = make_notification_token(self.notification.pk)
+
+        with self.assertNumQueries(5):
+            response = self.client.get(f"{url}?token={token}")
+        self.assertContains(response, "Request for assistance accepted")
+
+        with self.assertNumQueries(0):
+            response = self.client.get(f"{url}?token={token}")
+        self.assertContains(response, "has already been accepted")
+
+    def test_confirm_notification_of_resolved_alert_query_count(self):
+        """
+        This method tests that a click on the notification of an already resolved alert takes a single query.
+        """
+        SensorAlert.objects.filter(pk=self.notification.sensor_alert_id).update(is_resolved=True)
+        url = reverse('api:confirm_notification')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f"{url}?token={make_notification_token(self.notification.pk)}")
+
+        self.assertContains(response, "has already been accepted")
+
+class MetricsViewTestCase(TestCase):
+    """
+    Django TestCase for the metrics function. It checks that the load of the ChainExecutor is exposed.
+    """
+
+    def test_metrics(self):
+        """
+        This method tests that the metrics endpoint returns the queue depth, the queue size and the number of workers
+        of the ChainExecutor, the number of live chains, the load of the NotificationDispatcher and the database
+        connections.
+        """
+        response = self.client.get(reverse('api:metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        chain_executor = response.json()['chain_executor']
+        self.assertEqual(chain_executor['queue_depth'], 0)
+        self.assertEqual(chain_executor['queue_size'], settings.CHAIN_EXECUTOR_QUEUE_SIZE)
+        self.assertEqual(chain_executor['workers'], settings.CHAIN_EXECUTOR_WORKERS)
+        self.assertIn('live', response.json()['chains'])
+        self.assertEqual(response.json()['notification_dispatcher']['queue_depth'], 0)
+        self.assertIn('dead_letters', response.json()['notification_dispatcher'])
+        database = response.json()['database']
+        # At least the connection of the test itself is open
+        self.assertGreaterEqual(database['open_connections'], 1)
+        self.assertGreaterEqual(database['opened_connections'], database['open_connections'])
+
+
+class BenchIndexesCommandTestCase(TestCase):
+    """
+    Django TestCase for the bench_indexes command. It checks that the command reports the hot queries with and without
+    the indexes, and leaves the database as it was.
+    """
+
+    def test_bench_indexes(self):
+        """
+        This method runs the command on a small data set and checks its report and that the seeded rows are gone.
+        """
+        output = StringIO()
+
+        call_command('bench_indexes', alerts=50, homes=5, repeat=1, stdout=output)
+
+        self.assertIn("Without the indexes", output.getvalue())
+        self.assertIn("With the indexes", output.getvalue())
+        self.assertFalse(SensorAlert.objects.exists())
+        self.assertFalse(Person.objects.exists())
+
+class ArchiveAlertsTestCase(TestCase):
+    """
+    Django TestCase for the archiving of the old alerts. It checks which alerts are archived and that they are moved
+    with their notifications.
+    """
+
+    def setUp(self):
+        """
+        This method creates an elderly person with a caregiver and a home, and alerts of several ages and states.
+        """
+        elderly = Person.objects.create(first_name='John', last_name='Doe', email='john.doe@example.com')
+        self.home = Home.objects.create(home='nears-hub-dev', elderly=elderly)
+        self.caregiver = Caregiver.objects.create(elderly=elderly, caregiver=elderly,
+                                                  level=CaregiverLevel.objects.create(level=0))
+        old = timezone.now() - timedelta(days=100)
+        self.old_alerts = [self.create_alert(old, is_resolved=True) for _ in range(3)]
+        self.old_open_alert = self.create_alert(old, is_resolved=False)
+        self.recent_alert = self.create_alert(timezone.now(), is_resolved=True)
+        self.notification = Notification.objects.create(caregiver=self.caregiver, sensor_alert=self.old_alerts[0],
+                                                        token='12345', has_accepted=True)
+
+    def create_alert(self, start, is_resolved):
+        return SensorAlert.objects.create(subject='stove', start=start, location='kitchen', state='29.22',
+                                          measurable='anomalous_location_temperature', home=self.home,
+                                          is_resolved=is_resolved)
+
+    def test_archive_alerts(self):
+        """
+        This method tests that only the old resolved alerts are archived, chunk by chunk, with their notifications.
+        """
+        chunks = []
+
+        alerts, notifications, _ = archive_alerts(timedelta(days=90), chunk_size=2,
+                                                  on_chunk=lambda *chunk: chunks.append(chunk[:2]))
+
+        self.assertEqual((alerts, notifications), (3, 1))
+        self.assertEqual(chunks, [(2, 1), (1, 0)])
+        self.assertEqual(set(SensorAlert.objects.values_list('pk', flat=True)),
+                         {self.old_open_alert.pk, self.recent_alert.pk})
+        self.assertEqual(set(ArchivedSensorAlert.objects.values_list('pk', flat=True)),
+                         {alert.pk for alert in self.old_alerts})
+        archived_notification = ArchivedNotification.objects.get(pk=self.notification.pk)
+        self.assertEqual(archived_notification.sensor_alert_id, self.old_alerts[0].pk)
+        self.assertTrue(archived_notification.has_accepted)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_archive_alerts_command(self):
+        """
+        This method tests that the archive_alerts command reports the number of rows archived and the rate.
+        """
+        output = StringIO()
+
+        call_command('archive_alerts', days=90, chunk_size=10, stdout=output)
+
+        self.assertIn("Archived 3 alerts and 1 notifications in", output.getvalue())
+        self.assertIn("rows/s", output.getvalue())
+
+    def test_archive_alerts_command_when_archiving_is_running(self):
+        """
+        This method tests that the archive_alerts command refuses to run while another process is archiving.
+        """
+        self.assertTrue(claim_archiving())
+
+        with self.assertRaises(CommandError):
+            call_command('archive_alerts', stdout=StringIO())
+        self.assertFalse(ArchivedSensorAlert.objects.exists())
+
+    def test_claim_archiving(self):
+        """
+        This method tests that the archiving is claimed by a single process, and only once ARCHIVE_INTERVAL seconds
+        have passed since the last one unless it is forced.
+        """
+        self.assertTrue(claim_archiving())
+        self.assertFalse(claim_archiving(force=True))
+
+        release_archiving()
+        self.assertFalse(claim_archiving())
+        self.assertTrue(claim_archiving(force=True))
+
+    def test_run_scheduled_archiving(self):
+        """
+        This method tests that the scheduled archiving archives the old alerts once, then waits for the next interval.
+        """
+        run_scheduled_archiving()
+        self.assertEqual(ArchivedSensorAlert.objects.count(), 3)
+
+        SensorAlert.objects.filter(pk=self.recent_alert.pk).update(start=timezone.now() - timedelta(days=100))
+        run_scheduled_archiving()
+        self.assertEqual(ArchivedSensorAlert.objects.count(), 3)
+
+    @patch('api.archiving.schedule_archiving')
+    @patch.object(ArchivingWorker, 'submit')
+    def test_submit_archiving(self, mock_submit, mock_schedule_archiving):
+        """
+        This method tests that the archiving is run by the ArchivingWorker rather than by the workers of the
+        EscalationScheduler, and that the next check is scheduled even when an archiving is already pending.
+        """
+        submit_archiving()
+        mock_submit.assert_called_once_with(run_scheduled_archiving)
+
+        mock_submit.side_effect = WorkerPoolSaturated
+        submit_archiving()
+        self.assertEqual(mock_schedule_archiving.call_count, 2)
+
+
+class ArchivingDatabaseWriterTestCase(TransactionTestCase):
+    """
+    Test case class for the archiving through the DatabaseWriter. The chunks are written by the writer thread, on its
+    own connection, hence the test case does not run within a transaction.
+    """
+
+    def setUp(self):
+        elderly = Person.objects.create(first_name='John', last_name='Doe', email='john.doe@example.com')
+        home = Home.objects.create(home='nears-hub-dev', elderly=elderly)
+        SensorAlert.objects.create(subject='stove', start=timezone.now() - timedelta(days=100), location='kitchen',
+                                   state='29.22', measurable='temperature', home=home, is_resolved=True)
+
+    def test_archiving_is_written_by_database_writer(self):
+        """
+        Test that when the DatabaseWriter is enabled, the chunks of the archiving are written by the writer thread of
+        the DatabaseWriter, which remains the only thread writing to the database.
+        """
+        threads = []
+
+        def record_archive_chunk(*args):
+            threads.append(threading.current_thread().name)
+            return archive_chunk(*args)
+
+        with patch.object(settings, 'DATABASE_WRITER_ENABLED', True), \
+                patch('api.archiving.archive_chunk', side_effect=record_archive_chunk):
+            run_scheduled_archiving()
+
+        self.assertEqual(threads, ['database-writer', 'database-writer'])
+        self.assertEqual(ArchivedSensorAlert.objects.count(), 1)
+        state = ArchivingState.objects.get(pk=1)
+        self.assertIsNotNone(state.last_run_at)
+        self.assertIsNone(state.running_until)
+
 class MockRequest:
     pass
 
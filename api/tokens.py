@@ -0,0 +1,56 @@
+from django.core import signing
+
+from ift785_project import settings
+
+SALT = 'api.notification.token'
+SEPARATOR = ':'
+
+
+def make_notification_token(notification_id: int) -> str:
+    """
+    Creates the confirmation token of a notification.
+
+    The token is the id of the notification, the time it was issued and an HMAC signature of both (keyed with the
+    SECRET_KEY), so it needs neither to be stored nor to be checked for uniqueness.
+
+    Args:
+        notification_id (int): The primary key of the notification.
+
+    Returns:
+        str: The signed token.
+    """
+    return signing.TimestampSigner(salt=SALT, sep=SEPARATOR).sign(str(notification_id))
+
+
+def is_signed_token(token: str) -> bool:
+    """
+    Tells whether a token has the signed format, as opposed to the random tokens stored with older notifications.
+
+    Args:
+        token (str): The token to check.
+
+    Returns:
+        bool: Whether the token is signed.
+    """
+    return SEPARATOR in token
+
+
+def read_notification_token(token: str) -> int:
+    """
+    Checks the signature and the age of a token and returns the id of its notification.
+
+    Args:
+        token (str): The signed token.
+
+    Returns:
+        int: The primary key of the notification.
+
+    Raises:
+        signing.SignatureExpired: If the token is older than NOTIFICATION_TOKEN_MAX_AGE seconds.
+        signing.BadSignature: If the token has been forged or altered.
+    """
+    value = signing.TimestampSigner(salt=SALT, sep=SEPARATOR).unsign(token, max_age=settings.NOTIFICATION_TOKEN_MAX_AGE)
+    try:
+        return int(value)
+    except ValueError:
+        raise signing.BadSignature(f"Token value {value!r} is not a notification id")
@@ -1,8 +1,10 @@
 from django.urls import path, include
 from rest_framework import routers
-from .views import SensorAlertView, confirm_notification
+from .views import SensorAlertView, SensorAlertBatchView, confirm_notification, metrics
 
 urlpatterns = [
     path('alert', SensorAlertView.as_view()),
-    path('confirm-notification/', confirm_notification, name='confirm_notification')
+    path('alert/batch', SensorAlertBatchView.as_view()),
+    path('confirm-notification/', confirm_notification, name='confirm_notification'),
+    path('metrics', metrics, name='metrics')
 ]
@@ -1,14 +1,27 @@
-from threading import Thread
-from django.http import HttpResponse
+import logging
+
+from django.core import signing
+from django.http import Http404, HttpResponse, JsonResponse
 from django.views.decorators.http import require_GET
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
+from chain_of_responsibility.chain_executor import ChainExecutor
 from chain_of_responsibility.chain_manager import ChainManager
+from chain_of_responsibility.connection_tracker import ConnectionTracker
+from chain_of_responsibility.database_writer import write
 from chain_of_responsibility.signals import notification_accepted, help_requested
+from chain_of_responsibility.worker_pool import WorkerPoolSaturated
+from ift785_project import settings
+from notifications_management.notification_sender.notification_dispatcher import NotificationDispatcher
+from .alert_write_buffer import AlertWriteBuffer
 from .serializers import SensorAlertSerializer
+from .confirmation_cache import ConfirmationCache
 from .models import SensorAlert, Notification
+from .tokens import is_signed_token, read_notification_token
+
+logger = logging.getLogger(__name__)
 
 
 def throw_in_chain(sensor_alert: SensorAlert) -> None:
@@ -24,7 +37,74 @@ def throw_in_chain(sensor_alert: SensorAlert) -> None:
     # Get the instance of the ChainManager
     chain_manager = ChainManager()
     # Throw the alert into a new chain
-    chain_manager.get_chain_of_responsibility().handle(sensor_alert)
+    chain = chain_manager.get_chain_of_responsibility(sensor_alert)
+    try:
+        chain.handle(sensor_alert)
+    except Exception:
+        # Never leave a broken chain registered
+        chain_manager.remove_chain(chain)
+        raise
+
+
+def throw_in_chains(sensor_alerts: list) -> None:
+    """
+    Throw each of the given SensorAlerts into its own chain of responsibility.
+
+    This function is used for the alerts received in a batch so that the whole batch is handed to the chain machinery
+    as one unit (a single task of the ChainExecutor for the batch instead of one task per alert). An alert whose chain
+    fails is logged and does not prevent the next alerts of the batch from being thrown into their chains.
+
+    :param sensor_alerts: The SensorAlerts to be thrown into the chain of responsibility.
+    """
+    for sensor_alert in sensor_alerts:
+        try:
+            throw_in_chain(sensor_alert)
+        except Exception:
+            logger.exception("Could not throw SensorAlert %s into a chain of responsibility", sensor_alert.pk)
+
+
+def save_sensor_alert(serializer: SensorAlertSerializer) -> SensorAlert:
+    """
+    Save the SensorAlert validated by the given serializer.
+
+    When ALERT_WRITE_BUFFER_ENABLED is set, the alert is inserted by the AlertWriteBuffer along with the other alerts
+    received within a few milliseconds, and this function returns once their common transaction is committed.
+
+    :param serializer: The SensorAlertSerializer holding the validated alert.
+    :return: The saved SensorAlert.
+    """
+    if not settings.ALERT_WRITE_BUFFER_ENABLED:
+        return write(serializer.save)
+    serializer.instance = AlertWriteBuffer().save(SensorAlert(**serializer.validated_data))
+    return serializer.instance
+
+
+def list_batch_errors(serializer: SensorAlertSerializer):
+    """
+    List the errors of a batch of SensorAlerts, one entry per alert of the request.
+
+    Depending on its version, Django REST framework reports the errors of a batch either as a list with an entry per
+    alert or as a dictionary holding the invalid alerts only, by index: the latter is turned into the former.
+
+    :param serializer: The invalid SensorAlertSerializer of the batch.
+    :return: The errors of each alert, in the order of the request (an empty object for the valid ones), or the errors
+        of the whole request when it is not a list of alerts.
+    """
+    errors = serializer.errors
+    if isinstance(errors, dict) and errors and all(isinstance(index, int) for index in errors):
+        return [errors.get(index, {}) for index in range(len(serializer.initial_data))]
+    return errors
+
+
+def saturated_response() -> Response:
+    """
+    Build the response returned when the ChainExecutor cannot accept more alerts.
+
+    :return: A 503 response telling the client when to retry.
+    """
+    return Response({'detail': 'Too many alerts are waiting to be handled, please retry later.'},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': str(settings.CHAIN_EXECUTOR_RETRY_AFTER)})
 
 
 class SensorAlertView(APIView):
@@ -36,20 +116,59 @@ class SensorAlertView(APIView):
         Create a new SensorAlert and throw it into a new chain of responsibility.
 
         This method validates the request data using the SensorAlertSerializer, saves the validated data as a new
-        SensorAlert, and starts a new thread to throw the SensorAlert into a new chain of responsibility.
+        SensorAlert (see save_sensor_alert), and submits it to the ChainExecutor to throw it into a new chain of
+        responsibility. When the ChainExecutor is saturated, the alert is not kept and a 503 response with a
+        Retry-After header is returned.
         """
+        chain_executor = ChainExecutor()
         serializer = SensorAlertSerializer(data=request.data)
         if serializer.is_valid():
-            sensor_alert = serializer.save()
+            sensor_alert = save_sensor_alert(serializer)
 
-            # Start a new thread to handle the chain
-            chain_thread = Thread(target=throw_in_chain, args=(sensor_alert,))
-            chain_thread.start()
+            # Submit the alert to the executor handling the chains
+            try:
+                chain_executor.submit(throw_in_chain, sensor_alert)
+            except WorkerPoolSaturated:
+                write(sensor_alert.delete)
+                return saturated_response()
 
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class SensorAlertBatchView(APIView):
+    """
+    A view to handle the creation of several SensorAlerts in a single request.
+    """
+    def post(self, request, format=None):
+        """
+        Create a batch of SensorAlerts and throw them into new chains of responsibility.
+
+        This method validates the list of alerts using the SensorAlertSerializer, saves all the validated alerts with a
+        single bulk INSERT and submits the whole batch to the ChainExecutor as one task. When the ChainExecutor is
+        saturated, the batch is not kept and a 503 response with a Retry-After header is returned.
+
+        The response contains the created alerts, in the order of the request, when the batch is valid. Otherwise the
+        whole batch is rejected and the response lists the errors of each alert, in the order of the request (an empty
+        object for the valid ones).
+        """
+        chain_executor = ChainExecutor()
+        serializer = SensorAlertSerializer(data=request.data, many=True)
+        if serializer.is_valid():
+            sensor_alerts = write(serializer.save)
+
+            # Submit the whole batch to the executor handling the chains
+            if sensor_alerts:
+                try:
+                    chain_executor.submit(throw_in_chains, sensor_alerts)
+                except WorkerPoolSaturated:
+                    write(SensorAlert.objects.filter(pk__in=[sensor_alert.pk for sensor_alert in sensor_alerts]).delete)
+                    return saturated_response()
+
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(list_batch_errors(serializer), status=status.HTTP_400_BAD_REQUEST)
+
+
 @require_GET
 def confirm_notification(request):
     """
@@ -58,18 +177,98 @@ def confirm_notification(request):
     This method gets the token and help_requested parameters from the GET request, retrieves the corresponding
     Notification object, and dispatches the appropriate signal (notification_accepted or help_requested) based on the
     value of the help_requested parameter.
+
+    Accepting a notification resolves its sensor alert atomically: when several caregivers click at the same time,
+    only the first one is told to proceed, the others that assistance is already in progress.
+
+    Signed tokens are checked before any query: a forged token gets a 404 response and an expired one a 410 response.
+    The random tokens of older notifications are still looked up in the database. The notification is loaded along
+    with its sensor alert and elderly person in a single query, and the tokens of resolved sensor alerts are cached so
+    that repeated clicks are answered without any query.
     """
     token = request.GET.get('token')
     is_help_requested = request.GET.get('help_requested') == 'true'
-    notification = get_object_or_404(Notification, token=token)
+    if not token:
+        raise Http404("No token given")
+    notifications = Notification.objects.select_related('sensor_alert', 'caregiver__elderly')
+    if is_signed_token(token):
+        try:
+            notification_id = read_notification_token(token)
+        except signing.SignatureExpired:
+            return HttpResponse("This link has expired", status=410)
+        except signing.BadSignature:
+            raise Http404("Invalid token")
+        lookup = {'pk': notification_id}
+    else:
+        lookup = {'token': token}
+
+    if not is_help_requested:
+        first_name = ConfirmationCache().get(token)
+        if first_name is not None:
+            return already_accepted_response(first_name)
+
+    notification = get_object_or_404(notifications, **lookup)
+    first_name = notification.caregiver.elderly.first_name
 
     if is_help_requested:
         help_requested.send(sender=confirm_notification, notification=notification)
         return HttpResponse("Your request for assistance has been transmitted and someone will come to help you soon")
-    # Check whether the sensor alert associated with this notification has already been resolved.
-    elif not notification.sensor_alert.is_resolved:
-        # Dispatch the signal
-        notification_accepted.send(sender=confirm_notification, notification=notification)
-        return HttpResponse(f"Request for assistance accepted : please proceed with the necessary actions for {notification.caregiver.elderly.first_name}")
+
+    if notification.sensor_alert.is_resolved:
+        is_accepted = False
+    else:
+        # Dispatch the signal: the handler that sent the notification accepts it and tells whether this click won
+        results = [result for _, result in notification_accepted.send(confirm_notification, notification=notification)
+                   if result is not None]
+        # Without a live chain (e.g. the escalation is handled by another process), accept the notification directly
+        is_accepted = any(results) if results else notification.accept()
+
+    # Either way, the sensor alert is now resolved
+    ConfirmationCache().put(token, first_name)
+    if is_accepted:
+        return HttpResponse(f"Request for assistance accepted : please proceed with the necessary actions for {first_name}")
     else:
-        return HttpResponse(f"The request for assistance has already been accepted : assistance is currently in progress for {notification.caregiver.elderly.first_name}")
+        return already_accepted_response(first_name)
+
+
+def already_accepted_response(first_name: str) -> HttpResponse:
+    """
+    Build the response to the acceptance of a notification whose sensor alert has already been resolved.
+
+    :param first_name: The first name of the elderly person of the notification.
+    :return: A response telling that assistance is already in progress.
+    """
+    return HttpResponse(f"The request for assistance has already been accepted : assistance is currently in progress for {first_name}")
+
+
+@require_GET
+def metrics(request):
+    """
+    Expose the current load of the alert handling machinery.
+
+    This method returns, as JSON, the number of alerts waiting in the queue of the ChainExecutor along with the size of
+    this queue and the number of workers consuming it, the number of live chains of responsibility, the number of
+    notifications waiting to be sent or given up on by the NotificationDispatcher, and the number of database
+    connections currently open (by all the threads of the process) and opened since its start.
+    """
+    chain_executor = ChainExecutor()
+    notification_dispatcher = NotificationDispatcher()
+    connection_tracker = ConnectionTracker()
+    return JsonResponse({
+        'chain_executor': {
+            'queue_depth': chain_executor.queue_depth,
+            'queue_size': chain_executor.queue_size,
+            'workers': chain_executor.workers,
+        },
+        'chains': {
+            'live': ChainManager().live_chains,
+        },
+        'notification_dispatcher': {
+            'queue_depth': notification_dispatcher.queue_depth,
+            'dead_letters': len(notification_dispatcher.dead_letters),
+        },
+        'database': {
+            'open_connections': connection_tracker.open,
+            'opened_connections': connection_tracker.opened,
+        },
+    })
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ChainOfResponsibilityConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chain_of_responsibility'
+
+    # Connect the receivers invalidating the CaregiverLevelCache and tracking the database connections
+    def ready(self):
+        from chain_of_responsibility import caregiver_level_cache  # noqa: F401
+        from chain_of_responsibility import connection_tracker  # noqa: F401
@@ -0,0 +1,95 @@
+import threading
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from api.models import CaregiverLevel
+from chain_of_responsibility.singleton import SingletonMeta
+
+
+class CaregiverLevelCache(metaclass=SingletonMeta):
+    """
+    Singleton in-process cache of the CaregiverLevel table.
+
+    The table is loaded once and kept until a CaregiverLevel is saved or deleted (e.g. when an admin edits a wait
+    time), so building a chain of responsibility does not query the database. Bulk updates bypassing the model signals
+    must call invalidate() themselves.
+
+    Attributes:
+        _levels: Dictionary mapping each level to its CaregiverLevel, or None when the cache must be (re)loaded.
+        _generation: Counter incremented at each invalidation, used to discard a load racing with an invalidation.
+        _lock: Lock serializing the loads of the table.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty CaregiverLevelCache.
+        """
+        self._levels = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, level: int) -> CaregiverLevel:
+        """
+        Returns the CaregiverLevel of the given level.
+
+        Args:
+            level: The level to look up.
+
+        Returns:
+            CaregiverLevel: The CaregiverLevel of the given level.
+
+        Raises:
+            CaregiverLevel.DoesNotExist: If the level does not exist in the database.
+        """
+        levels = self._levels
+        if levels is None or level not in levels:
+            levels = self._load()
+        if level not in levels:
+            raise CaregiverLevel.DoesNotExist(f"CaregiverLevel {level} does not exist.")
+        return levels[level]
+
+    def get_wait_time(self, level: int) -> int:
+        """
+        Returns the wait time of the given level.
+
+        Args:
+            level: The level to look up.
+
+        Returns:
+            int: The wait time, in seconds, of the given level.
+        """
+        return self.get(level).wait_time
+
+    def invalidate(self) -> None:
+        """
+        Drops the cached table, so that it is loaded again on the next access.
+        """
+        with self._lock:
+            self._generation += 1
+            self._levels = None
+
+    def _load(self) -> dict:
+        """
+        Loads the CaregiverLevel table.
+
+        Returns:
+            dict: Dictionary mapping each level to its CaregiverLevel.
+        """
+        with self._lock:
+            generation = self._generation
+        levels = {caregiver_level.level: caregiver_level for caregiver_level in CaregiverLevel.objects.all()}
+        with self._lock:
+            # Do not keep the table if it has been modified while it was being loaded
+            if generation == self._generation:
+                self._levels = levels
+        return levels
+
+
+@receiver(post_save, sender=CaregiverLevel)
+@receiver(post_delete, sender=CaregiverLevel)
+def invalidate_caregiver_level_cache(sender, **kwargs):
+    """
+    Invalidates the CaregiverLevelCache whenever a CaregiverLevel is saved or deleted.
+    """
+    CaregiverLevelCache().invalidate()
@@ -0,0 +1,18 @@
+from chain_of_responsibility.singleton import SingletonMeta
+from chain_of_responsibility.worker_pool import WorkerPool
+from ift785_project import settings
+
+
+class ChainExecutor(WorkerPool, metaclass=SingletonMeta):
+    """
+    Singleton worker pool starting the chains of responsibility of the incoming SensorAlerts.
+
+    The number of workers and the size of the queue are bounded, so that a burst of alerts is absorbed by the queue
+    (or rejected once it is full) instead of spawning one thread per alert.
+    """
+
+    def __init__(self):
+        """
+        Initializes the ChainExecutor with the sizes defined in the settings.
+        """
+        super().__init__('chain-executor', settings.CHAIN_EXECUTOR_WORKERS, settings.CHAIN_EXECUTOR_QUEUE_SIZE)
@@ -1,54 +1,77 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import DatabaseError
+from django.db.models import Q
+from django.utils import timezone
+
+from api.models import Notification, SensorAlert
 from chain_of_responsibility.handlers.Caregivers.generic_caregiver_handler.caregiver_one_handler import CaregiverOneHandler
 from chain_of_responsibility.handlers.Caregivers.generic_caregiver_handler.caregiver_three_handler import CaregiverThreeHandler
 from chain_of_responsibility.handlers.Caregivers.generic_caregiver_handler.caregiver_two_handler import CaregiverTwoHandler
 from chain_of_responsibility.handlers.Caregivers.caregiver_zero_handler import CaregiverZeroHandler
+from chain_of_responsibility.database_writer import write
+from chain_of_responsibility.escalation_plan import EscalationPlan
 from chain_of_responsibility.handlers.abstract_handler import Handler
+from chain_of_responsibility.models import EscalationState
+from chain_of_responsibility.notification_registry import NotificationRegistry
+from chain_of_responsibility.singleton import SingletonMeta
+from ift785_project import settings
+from notifications_management.notification_level.notification_level import NotificationLevel
 
-
-class SingletonMeta(type):
-    """
-    Metaclass for ApplicationInitializer class to ensure singleton behavior.
-
-    Attributes:
-        _instances: Dictionary to store singleton instances of ApplicationInitializer.
-            Key: An instance of the metaclass itself.
-            Value: Singleton instance of the class.
-    """
-
-    _instances = {}
-
-    def __call__(cls, *args, **kwargs):
-        """
-        Override the __call__ method to create or return an existing instance.
-
-        Returns:
-            obj: An instance of the class.
-        """
-        if cls not in cls._instances:
-            instance = super().__call__(*args, **kwargs)
-            cls._instances[cls] = instance
-        return cls._instances[cls]
+logger = logging.getLogger(__name__)
 
 
 class ChainManager(metaclass=SingletonMeta):
     """
     Singleton class responsible for managing chains of responsibility.
 
+    The chains are spread over several shards, each protected by its own lock, so that the request threads, the
+    chain workers and the escalation workers can register and remove chains concurrently without racing nor waiting on
+    a single global lock.
+
     Attributes:
-        _chains: List to store all chains of responsibility.
+        _shards: List of dictionaries storing all live chains of responsibility (HEAD), keyed by the id of the
+            SensorAlert they handle (or by the head itself for a chain created without SensorAlert).
+        _locks: List of the locks protecting each shard.
     """
 
     def __init__(self):
         """
         Initializes an instance of ChainManager.
         """
-        self._chains = []
+        self._shards = [{} for _ in range(settings.CHAIN_MANAGER_SHARDS)]
+        self._locks = [threading.Lock() for _ in range(settings.CHAIN_MANAGER_SHARDS)]
+
+    @property
+    def live_chains(self) -> int:
+        """
+        Returns the number of live chains of responsibility.
+        """
+        return sum(len(shard) for shard in self._shards)
+
+    def _get_shard_index(self, key) -> int:
+        """
+        Returns the index of the shard storing the chain registered under the given key.
+
+        Args:
+            key: The key of the chain.
 
-    def initialize_chain_of_responsibility(self) -> Handler:
+        Returns:
+            int: The index of the shard.
+        """
+        return hash(key) % len(self._shards)
+
+    def initialize_chain_of_responsibility(self, sensor_alert: SensorAlert = None) -> Handler:
         """
         Initializes a new chain of responsibility by creating instances of different handler classes
         and linking them together.
 
+        Args:
+            sensor_alert (SensorAlert): The sensor alert the chain is created for. Its escalation plan is built and
+                shared by the handlers, and a chain already registered for this sensor alert is removed first.
+
         Returns:
             Handler: The head of the new chain of responsibility.
         """
@@ -57,17 +80,34 @@ class ChainManager(metaclass=SingletonMeta):
         caregiver_two = CaregiverTwoHandler(chain_of_responsibility)
         caregiver_three = CaregiverThreeHandler(chain_of_responsibility)
         chain_of_responsibility.set_next(caregiver_one).set_next(caregiver_two).set_next(caregiver_three)
-        self._chains.append(chain_of_responsibility)
+
+        # Fetch the caregivers of every level at once
+        if sensor_alert is not None:
+            escalation_plan = EscalationPlan.build(sensor_alert)
+            for handler in (chain_of_responsibility, caregiver_one, caregiver_two, caregiver_three):
+                handler.set_escalation_plan(escalation_plan)
+
+        key = chain_of_responsibility if sensor_alert is None else sensor_alert.pk
+        chain_of_responsibility.chain_key = key
+        index = self._get_shard_index(key)
+        with self._locks[index]:
+            previous_chain = self._shards[index].get(key)
+            self._shards[index][key] = chain_of_responsibility
+        if previous_chain is not None:
+            self._dispose_chain(previous_chain)
         return chain_of_responsibility
 
-    def get_chain_of_responsibility(self) -> Handler:
+    def get_chain_of_responsibility(self, sensor_alert: SensorAlert = None) -> Handler:
         """
         Initializes and returns a new chain of responsibility.
 
+        Args:
+            sensor_alert (SensorAlert): The sensor alert the chain is created for.
+
         Returns:
             Handler: The head of the new chain of responsibility.
         """
-        return self.initialize_chain_of_responsibility()
+        return self.initialize_chain_of_responsibility(sensor_alert)
 
     def get_chains_of_responsibility(self):
         """
@@ -76,21 +116,167 @@ class ChainManager(metaclass=SingletonMeta):
         Returns:
             List[Handler]: All chains of responsibility.
         """
-        return self._chains
+        chains = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                chains.extend(shard.values())
+        return chains
+
+    def get_chain(self, sensor_alert: SensorAlert):
+        """
+        Returns the live chain of responsibility handling the given sensor alert.
+
+        Args:
+            sensor_alert (SensorAlert): The sensor alert handled by the chain.
+
+        Returns:
+            Handler: The head of the chain, or None if no chain is handling the sensor alert.
+        """
+        return self._shards[self._get_shard_index(sensor_alert.pk)].get(sensor_alert.pk)
 
     def remove_chain(self, chain: Handler) -> None:
         """
-        Removes a chain of responsibility from the list once it has completed its work.
+        Removes a chain of responsibility from the registry once it has completed its work.
+
+        Whatever the reason the chain ended for, the timers of its handlers are cancelled, its notifications are
+        unregistered and the persisted state of its escalation is deleted. Removing a chain that is not registered
+        (anymore) does nothing, so concurrent removals of the same chain are safe.
 
         Args:
             chain (Handler): The chain of responsibility to be removed (HEAD).
         """
-        if chain in self._chains:
-            self._chains.remove(chain)
+        key = chain.chain_key
+        index = self._get_shard_index(key)
+        with self._locks[index]:
+            if self._shards[index].get(key) is not chain:
+                return
+            del self._shards[index][key]
+        self._dispose_chain(chain)
+
+    @staticmethod
+    def _dispose_chain(chain: Handler) -> None:
+        """
+        Releases everything held by a chain of responsibility that is no longer registered.
+
+        Args:
+            chain (Handler): The chain of responsibility to be disposed of (HEAD).
+        """
+        # Cancel the timers, unregister the notifications of the chain and free it from memory
+        notification_registry = NotificationRegistry()
+        current_handler = chain
+        while current_handler is not None:
+            current_handler.cancel_timer()
+            notification_registry.unregister(current_handler.get_generated_notifications())
+            next_handler = current_handler.get_next()
+            del current_handler
+            current_handler = next_handler
+
+        if chain.chain_key is not chain:
+            NotificationLevel.evict_alert(chain.chain_key)
+
+        if chain.has_escalation_state:
+            write(EscalationState.objects.filter(sensor_alert_id=chain.chain_key).delete)
+
+    @staticmethod
+    def claim_escalations() -> int:
+        """
+        Leases to the current process the persisted escalations whose lease has expired (or that were never leased).
+
+        The escalations are claimed with a single UPDATE whose condition is checked again on each row, so when several
+        processes claim at the same time, each escalation is claimed by only one of them.
 
-            # Free the chain from memory
-            current_handler = chain
-            while current_handler is not None:
-                next_handler = current_handler.get_next()
-                del current_handler
-                current_handler = next_handler
+        Returns:
+            int: The number of escalations claimed.
+        """
+        now = timezone.now()
+        expired = EscalationState.objects.filter(Q(lease_until__isnull=True) | Q(lease_until__lt=now))
+        return write(lambda: expired.update(owner=EscalationState.current_owner(),
+                                            lease_until=now + timedelta(seconds=settings.ESCALATION_LEASE)))
+
+    @staticmethod
+    def renew_leases() -> int:
+        """
+        Extends the leases of the escalations run by the current process.
+
+        Returns:
+            int: The number of leases renewed.
+        """
+        lease_until = timezone.now() + timedelta(seconds=settings.ESCALATION_LEASE)
+        return write(lambda: EscalationState.objects.filter(owner=EscalationState.current_owner())
+                     .update(lease_until=lease_until))
+
+    def restore_chains(self) -> int:
+        """
+        Rebuilds the chains of responsibility of the escalations that were pending when their process stopped.
+
+        The escalations whose lease has expired are first claimed by the current process (see claim_escalations), so
+        that an escalation is resumed by a single process even when several of them restore the chains at the same time.
+        For each escalation owned by the current process of an unresolved sensor alert, a new chain is built and the
+        escalation is resumed at the handler of the persisted level, with the time left before its deadline (deadlines
+        that passed in the meantime expire immediately). Every handler of the chain gets back the notifications it
+        issued, so that an answer to a notification of an earlier level still ends the escalation. The states of the
+        sensor alerts resolved in the meantime are deleted, and the escalations already handled by a live chain are left
+        untouched.
+
+        Returns:
+            int: The number of chains restored.
+        """
+        write(EscalationState.objects.filter(sensor_alert__is_resolved=True).delete)
+        self.claim_escalations()
+        states = [state for state in EscalationState.objects
+                  .filter(owner=EscalationState.current_owner(), sensor_alert__is_resolved=False)
+                  .select_related('sensor_alert__home__elderly').order_by('due_at')
+                  if self.get_chain(state.sensor_alert) is None]
+        notifications = Notification.objects.in_bulk(
+            [notification_id for state in states for level_ids in state.notification_ids.values()
+             for notification_id in level_ids]
+        )
+        now = timezone.now()
+        for state in states:
+            chain = self.initialize_chain_of_responsibility(state.sensor_alert)
+            chain.has_escalation_state = True
+            handler = chain
+            while handler is not None:
+                handler_notifications = [notifications[pk] for pk in state.notification_ids.get(str(handler.LEVEL), [])
+                                         if pk in notifications]
+                if handler.LEVEL == state.level:
+                    handler.get_escalation_plan().skipped_levels = list(state.skipped_levels)
+                    delay = max(0.0, (state.due_at - now).total_seconds())
+                    handler.resume(state.sensor_alert, state.stage, delay, handler_notifications)
+                    break
+                # Earlier level: only its notifications are tracked again, its timer has already expired
+                for notification in handler_notifications:
+                    handler.track_notification(notification)
+                handler = handler.get_next()
+            if handler is None:
+                self.remove_chain(chain)
+        return len(states)
+
+
+def schedule_escalation_recovery(delay: float = None) -> None:
+    """
+    Schedules the recovery of the escalations on the EscalationScheduler, every third of ESCALATION_LEASE seconds.
+
+    Args:
+        delay (float): The number of seconds before the first recovery (a third of ESCALATION_LEASE by default).
+    """
+    from chain_of_responsibility.escalation_scheduler import EscalationScheduler
+
+    EscalationScheduler().schedule(settings.ESCALATION_LEASE / 3 if delay is None else delay, run_escalation_recovery)
+
+
+def run_escalation_recovery() -> None:
+    """
+    Renews the leases of the escalations run by the current process, resumes the escalations left by stopped processes
+    and schedules the next recovery.
+    """
+    chain_manager = ChainManager()
+    try:
+        chain_manager.renew_leases()
+        restored = chain_manager.restore_chains()
+        if restored:
+            logger.info("Resumed %d pending escalations", restored)
+    except DatabaseError:
+        logger.exception("Could not recover the pending escalations")
+    finally:
+        schedule_escalation_recovery()
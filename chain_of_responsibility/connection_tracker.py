@@ -0,0 +1,65 @@
+import threading
+import weakref
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from chain_of_responsibility.singleton import SingletonMeta
+
+
+class ConnectionTracker(metaclass=SingletonMeta):
+    """
+    Singleton keeping track of the database connections opened by every thread of the process.
+
+    Django keeps a connection per thread and only closes the connections of the request threads. The tracker exposes the
+    number of connections currently open across all the threads, so that the connections left open by the other threads
+    can be noticed.
+
+    Attributes:
+        _connections: The connection wrappers that have opened a connection, dropped once garbage collected.
+        _opened: The number of connections opened since the start of the process.
+        _lock: Lock protecting the attributes above.
+    """
+
+    def __init__(self):
+        """
+        Initializes the ConnectionTracker.
+        """
+        self._connections = weakref.WeakSet()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def open(self) -> int:
+        """
+        Returns the number of connections currently open.
+        """
+        with self._lock:
+            connections = list(self._connections)
+        return sum(1 for connection in connections if connection.connection is not None)
+
+    @property
+    def opened(self) -> int:
+        """
+        Returns the number of connections opened since the start of the process.
+        """
+        return self._opened
+
+    def on_connection_created(self, connection) -> None:
+        """
+        Records a newly opened connection.
+
+        Args:
+            connection: The wrapper of the connection.
+        """
+        with self._lock:
+            self._connections.add(connection)
+            self._opened += 1
+
+
+@receiver(connection_created)
+def track_connection(sender, connection, **kwargs):
+    """
+    Records every connection opened, whatever the thread opening it.
+    """
+    ConnectionTracker().on_connection_created(connection)
@@ -0,0 +1,154 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.db import close_old_connections, connection, transaction
+
+from chain_of_responsibility.singleton import SingletonMeta
+from ift785_project import settings
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    """
+    Serializes the writes to the database on a single writer thread, which commits them in groups.
+
+    The writer thread takes the first waiting write, then gathers the writes submitted within the next max_delay
+    seconds (up to max_batch writes) and runs them all in one transaction, each in its own savepoint so that a failing
+    write does not abort the others. A caller waiting for its write is released once the group is committed.
+
+    With SQLite, this removes the contention between the threads writing on their own connections (and the "database is
+    locked" errors it causes), and spreads the cost of a commit over every write of the group.
+
+    Attributes:
+        _queue: The writes waiting for the writer thread.
+        _max_batch: The maximum number of writes committed together.
+        _max_delay: The maximum number of seconds to wait for more writes before committing.
+        _thread: The writer thread.
+    """
+
+    def __init__(self, name: str, max_batch: int, max_delay: float):
+        """
+        Initializes a new WriteQueue and starts its writer thread.
+
+        Args:
+            name: The name of the writer thread.
+            max_batch: The maximum number of writes committed together.
+            max_delay: The maximum number of seconds to wait for more writes before committing.
+        """
+        self._queue = queue.Queue()
+        self._max_batch = max_batch
+        self._max_delay = max_delay
+        self._thread = threading.Thread(target=self._write, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args) -> Future:
+        """
+        Submits a write to the writer thread.
+
+        Args:
+            fn: The callable making the write.
+            *args: The arguments passed to the callable.
+
+        Returns:
+            Future: The future result of the callable, set once the write is committed.
+        """
+        future = Future()
+        self._queue.put((future, fn, args))
+        return future
+
+    def run(self, fn, *args):
+        """
+        Makes a write on the writer thread and waits for it to be committed.
+
+        The write is made directly by the caller when it runs on the writer thread, or within a transaction (whose locks
+        the writer thread could otherwise wait for).
+
+        Args:
+            fn: The callable making the write.
+            *args: The arguments passed to the callable.
+
+        Returns:
+            The result of the callable.
+        """
+        if threading.current_thread() is self._thread or connection.in_atomic_block:
+            return fn(*args)
+        return self.submit(fn, *args).result()
+
+    def _write(self) -> None:
+        """
+        Main loop of the writer thread: commits the submitted writes group by group.
+
+        The connection of the writer thread is recycled between the groups, the way the WorkerPool does between tasks.
+        """
+        while True:
+            writes = [self._queue.get()]
+            close_old_connections()
+            deadline = time.monotonic() + self._max_delay
+            while len(writes) < self._max_batch:
+                try:
+                    writes.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._commit(writes)
+
+    @staticmethod
+    def _commit(writes: list) -> None:
+        """
+        Runs a group of writes in one transaction and sets their results once it is committed.
+
+        Args:
+            writes: The (future, callable, arguments) of the writes.
+        """
+        results = []
+        try:
+            with transaction.atomic():
+                for future, fn, args in writes:
+                    try:
+                        with transaction.atomic():
+                            results.append((future, fn(*args), None))
+                    except Exception as error:
+                        results.append((future, None, error))
+        except Exception as error:
+            logger.exception("Could not commit a group of %d writes", len(writes))
+            for future, _, _ in writes:
+                future.set_exception(error)
+            return
+
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+class DatabaseWriter(WriteQueue, metaclass=SingletonMeta):
+    """
+    Singleton WriteQueue through which the handlers and views make their writes when DATABASE_WRITER_ENABLED is set.
+    """
+
+    def __init__(self):
+        """
+        Initializes the DatabaseWriter with the parameters defined in the settings.
+        """
+        super().__init__('database-writer', settings.DATABASE_WRITER_MAX_BATCH,
+                         settings.DATABASE_WRITER_MAX_DELAY_MS / 1000)
+
+
+def write(fn, *args):
+    """
+    Makes a write through the DatabaseWriter when it is enabled, or directly otherwise.
+
+    Args:
+        fn: The callable making the write.
+        *args: The arguments passed to the callable.
+
+    Returns:
+        The result of the callable.
+    """
+    if not settings.DATABASE_WRITER_ENABLED:
+        return fn(*args)
+    return DatabaseWriter().run(fn, *args)
@@ -0,0 +1,80 @@
+from collections import defaultdict
+
+from api.models import Caregiver, SensorAlert
+
+
+class EscalationPlan:
+    """
+    The caregivers of the elderly person of a SensorAlert, grouped by level.
+
+    The plan is built once, with a single query, when the chain of responsibility of the SensorAlert is created, so the
+    handlers of the later levels fire without querying the database and the caregivers come with their person, elderly
+    person and level already loaded for the rendering of the notifications.
+
+    Attributes:
+        skipped_levels: The levels skipped so far because they have no caregiver.
+        _caregivers_by_level: Dictionary mapping each level to the list of its caregivers.
+    """
+
+    def __init__(self, caregivers):
+        """
+        Initializes a new EscalationPlan.
+
+        Args:
+            caregivers: The caregivers of the elderly person, of every level.
+        """
+        self.skipped_levels = []
+        self._caregivers_by_level = defaultdict(list)
+        for caregiver in caregivers:
+            self._caregivers_by_level[caregiver.level.level].append(caregiver)
+
+    @classmethod
+    def build(cls, sensor_alert: SensorAlert):
+        """
+        Builds the escalation plan of the given sensor alert.
+
+        Args:
+            sensor_alert: The sensor alert to escalate.
+
+        Returns:
+            EscalationPlan: The escalation plan of the sensor alert.
+        """
+        if sensor_alert.home_id is None:
+            return cls([])
+        caregivers = Caregiver.objects.filter(elderly__home=sensor_alert.home_id) \
+            .select_related('caregiver', 'elderly', 'level')
+        return cls(caregivers)
+
+    def get_caregivers(self, level: int) -> list:
+        """
+        Returns the caregivers of the given level.
+
+        Args:
+            level: The level of the caregivers.
+
+        Returns:
+            list: The caregivers of the given level.
+        """
+        return list(self._caregivers_by_level.get(level, []))
+
+    def get_self_caregiver(self):
+        """
+        Returns the level 0 caregiver, i.e. the elderly person taking care of themselves.
+
+        Returns:
+            Caregiver: The level 0 caregiver, or None if there is none.
+        """
+        for caregiver in self._caregivers_by_level.get(0, []):
+            if caregiver.caregiver_id == caregiver.elderly_id:
+                return caregiver
+        return None
+
+    def record_skipped_level(self, level: int) -> None:
+        """
+        Records that the given level has been skipped because it has no caregiver.
+
+        Args:
+            level: The level skipped.
+        """
+        if level not in self.skipped_levels:
+            self.skipped_levels.append(level)
@@ -0,0 +1,174 @@
+import heapq
+import itertools
+import threading
+import time
+
+from chain_of_responsibility.singleton import SingletonMeta
+from chain_of_responsibility.worker_pool import WorkerPool
+from ift785_project import settings
+
+
+class ScheduledTask:
+    """
+    A callable scheduled by the EscalationScheduler to run once its deadline is reached.
+
+    Attributes:
+        deadline: The time (as given by time.monotonic) at which the task must run.
+        _scheduler: The scheduler owning the task.
+        _fn: The callable to run.
+        _args: The arguments passed to the callable.
+        _cancelled: Whether the task has been cancelled.
+        dispatched: Whether the task has left the heap of the scheduler to be run.
+        _done: Event set once the task has run or has been cancelled.
+    """
+
+    def __init__(self, scheduler, deadline: float, fn, args: tuple):
+        """
+        Initializes a new ScheduledTask.
+
+        Args:
+            scheduler: The scheduler owning the task.
+            deadline: The time (as given by time.monotonic) at which the task must run.
+            fn: The callable to run.
+            args: The arguments passed to the callable.
+        """
+        self.deadline = deadline
+        self._scheduler = scheduler
+        self._fn = fn
+        self._args = args
+        self._cancelled = False
+        self.dispatched = False
+        self._done = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        """
+        Returns whether the task has been cancelled.
+        """
+        return self._cancelled
+
+    def cancel(self) -> None:
+        """
+        Cancels the task if it has not run yet.
+        """
+        if not self._cancelled and not self._done.is_set():
+            self._cancelled = True
+            self._done.set()
+            self._scheduler.on_task_cancelled(self)
+
+    def join(self, timeout: float = None) -> bool:
+        """
+        Blocks until the task has run or has been cancelled.
+
+        Args:
+            timeout: The maximum number of seconds to wait.
+
+        Returns:
+            bool: Whether the task has run or has been cancelled.
+        """
+        return self._done.wait(timeout)
+
+    def run(self) -> None:
+        """
+        Runs the task unless it has been cancelled in the meantime.
+        """
+        try:
+            if not self._cancelled:
+                self._fn(*self._args)
+        finally:
+            self._done.set()
+
+
+class EscalationScheduler(metaclass=SingletonMeta):
+    """
+    Singleton scheduler owning every escalation deadline of the chains of responsibility.
+
+    The deadlines are kept in a heap watched by a single thread, so scheduling a task costs O(log n) and cancelling it
+    O(1) (cancelled tasks are dropped lazily). Expired tasks are run by a pool of workers so that a slow callback never
+    delays the other deadlines.
+
+    Attributes:
+        _heap: Heap of (deadline, sequence number, task) tuples.
+        _condition: Condition protecting the heap and used to wake the scheduler thread up.
+        _sequence: Counter used to keep the heap ordering stable for equal deadlines.
+        _cancelled: Number of cancelled tasks still present in the heap.
+        _pool: The pool of workers running the expired tasks.
+    """
+
+    def __init__(self):
+        """
+        Initializes the EscalationScheduler and starts its thread.
+        """
+        self._heap = []
+        self._condition = threading.Condition()
+        self._sequence = itertools.count()
+        self._cancelled = 0
+        self._pool = WorkerPool('escalation-worker', settings.ESCALATION_SCHEDULER_WORKERS)
+        self._thread = threading.Thread(target=self._run, name='escalation-scheduler', daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        """
+        Returns the number of tasks waiting for their deadline.
+        """
+        with self._condition:
+            return len(self._heap) - self._cancelled
+
+    def schedule(self, delay: float, fn, *args) -> ScheduledTask:
+        """
+        Schedules a callable to run after the given delay.
+
+        Args:
+            delay: The number of seconds to wait before running the callable.
+            fn: The callable to run.
+            *args: The arguments passed to the callable.
+
+        Returns:
+            ScheduledTask: The scheduled task, which can be cancelled.
+        """
+        task = ScheduledTask(self, time.monotonic() + delay, fn, args)
+        with self._condition:
+            heapq.heappush(self._heap, (task.deadline, next(self._sequence), task))
+            # Wake the scheduler thread up if this task is now the next one to run
+            if self._heap[0][2] is task:
+                self._condition.notify()
+        return task
+
+    def on_task_cancelled(self, task: ScheduledTask) -> None:
+        """
+        Keeps track of the cancelled tasks and compacts the heap when they make up most of it.
+
+        Args:
+            task: The task that has been cancelled.
+        """
+        with self._condition:
+            if task.dispatched:
+                return
+            self._cancelled += 1
+            if self._cancelled > len(self._heap) // 2:
+                self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def _run(self) -> None:
+        """
+        Main loop of the scheduler thread: waits for the next deadline and hands the expired tasks to the workers.
+        """
+        with self._condition:
+            while True:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                deadline, _, task = self._heap[0]
+                if task.cancelled:
+                    heapq.heappop(self._heap)
+                    self._cancelled -= 1
+                    continue
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                task.dispatched = True
+                self._pool.submit(task.run, block=True)
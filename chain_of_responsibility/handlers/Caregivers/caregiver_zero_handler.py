@@ -1,11 +1,12 @@
-import threading
-from api.models import SensorAlert, Caregiver, CaregiverLevel
+from api.models import SensorAlert, Caregiver
+from chain_of_responsibility.caregiver_level_cache import CaregiverLevelCache
 from chain_of_responsibility.handlers.base_handler import BaseHandler
-from chain_of_responsibility.signals import help_requested
 from ift785_project import settings
 from notifications_management.notification_level.notification_level_one import NotificationLevelOne
 from notifications_management.notification_level.notification_level_two import NotificationLevelTwo
 from notifications_management.notification_sender.email_notification_sender import EmailNotificationSender
+from notifications_management.notification_sender.notification_dispatcher import NotificationDispatcher
+from notifications_management.outbox import write_outbox_message
 
 
 class CaregiverZeroHandler(BaseHandler):
@@ -16,44 +17,48 @@ class CaregiverZeroHandler(BaseHandler):
     If the request cannot be handled by this handler, it will pass the request to the next handler in the chain.
     """
 
+    LEVEL = 0
+
     def __init__(self):
         """
         Initialize the CaregiverZeroHandler object.
 
         This method initializes the CaregiverZeroHandler object by calling the constructor of the parent class and
-        setting the value of the WAIT_TIME attribute to the one present in database.
+        setting the value of the WAIT_TIME attribute to the one present in database (through the CaregiverLevelCache).
         """
         super().__init__()
-        self.WAIT_TIME = CaregiverLevel.objects.get(level=0).wait_time
-        help_requested.connect(self.on_help_requested)
+        self.WAIT_TIME = CaregiverLevelCache().get_wait_time(0)
 
     def handle(self, request: SensorAlert):
         """
         Handles the incoming request.
 
         If the caregiver exists, it will build a notification for the caregiver with level 0
-        and send it. If the caregiver is not found, it will pass the request to the next handler
+        and send it. If the caregiver is not found, it will immediately pass the request to the next handler
         in the chain.
 
         Args:
             request: The request to be handled.
         """
-        # Get the caregiver
-        caregiver = self.get_caregiver(request)
+        # Get the caregiver, from the escalation plan of the chain when there is one
+        if self._escalation_plan is not None:
+            caregiver = self._escalation_plan.get_self_caregiver()
+        else:
+            caregiver = self.get_caregiver(request)
 
         if caregiver is not None:
 
             # print(caregiver)
-            notification = BaseHandler.build_notification(caregiver, request)
-            self._generated_notifications.add(notification)
-            EmailNotificationSender(NotificationLevelOne()).deliver_notification(notification)
+            notification = BaseHandler.build_notification(caregiver, request, NotificationLevelOne())
+            self.track_notification(notification)
+            if not settings.NOTIFICATION_OUTBOX_ENABLED:
+                NotificationDispatcher().dispatch(EmailNotificationSender(NotificationLevelOne()), [notification])
 
-            # Build & start the timer
-            self._timer = threading.Timer(self.WAIT_TIME, lambda: self.timer_callback(request, notification))
-            self._timer.start()
+            # Start the timer
+            self.start_timer(request, self.WAIT_TIME, self.timer_callback, request, notification)
         else:
-            # Pass the request to the next handler
-            super().handle(request)
+            # Pass the request to the next handler without waiting
+            self.skip_level(request)
 
     def get_caregiver(self, request: SensorAlert) -> Caregiver:
         """
@@ -63,9 +68,10 @@ class CaregiverZeroHandler(BaseHandler):
             request: The request to be handled.
 
         Returns:
-            The caregiver associated with the request.
+            The caregiver associated with the request, or None if the elderly person is not their own caregiver.
         """
-        return Caregiver.objects.get(elderly=request.home.elderly, caregiver=request.home.elderly, level__level=0)
+        return Caregiver.objects.filter(elderly=request.home.elderly, caregiver=request.home.elderly,
+                                        level__level=0).first()
 
     def timer_callback(self, request, notification):
         """
@@ -77,9 +83,12 @@ class CaregiverZeroHandler(BaseHandler):
             request: The request associated with the notification.
             notification: The notification to be sent.
         """
-        EmailNotificationSender(NotificationLevelTwo()).deliver_notification(notification)
-        self._timer = threading.Timer(self.WAIT_TIME - settings.CAREGIVER_ZERO_SECOND_TIMER_DELAY, lambda: self.second_timer_callback(request))
-        self._timer.start()
+        if settings.NOTIFICATION_OUTBOX_ENABLED:
+            write_outbox_message(notification, NotificationLevelTwo())
+        else:
+            NotificationDispatcher().dispatch(EmailNotificationSender(NotificationLevelTwo()), [notification])
+        self.start_timer(request, self.WAIT_TIME - settings.CAREGIVER_ZERO_SECOND_TIMER_DELAY,
+                         self.second_timer_callback, request, stage=1)
 
     def second_timer_callback(self, request):
         """
@@ -92,19 +101,39 @@ class CaregiverZeroHandler(BaseHandler):
         """
         super().handle(request)
 
+    def resume(self, request: SensorAlert, stage: int, delay: float, notifications) -> None:
+        """
+        Resumes, after a restart, the escalation of the given request where it was left by this handler.
+
+        Stage 0 is the wait following the first notification, stage 1 the wait following the reminder.
+
+        Args:
+            request: The sensor alert being escalated.
+            stage: The step of the handler the pending timer belonged to.
+            delay: The number of seconds left before the deadline (0 if it has already passed).
+            notifications: The notifications issued by the handler before the restart.
+        """
+        super().resume(request, stage, delay, notifications)
+        if stage == 0 and self._generated_notifications:
+            notification = next(iter(self._generated_notifications))
+            self.start_timer(request, delay, self.timer_callback, request, notification)
+        else:
+            self.start_timer(request, delay, self.second_timer_callback, request, stage=1)
+
     def on_help_requested(self, *args, **kwargs) -> None:
         """
         Handles the help_requested signal.
 
-        This method is called when the help_requested signal is emitted. It retrieves the notification object from the
-        keyword arguments and calls the next handler in the chain.
+        This method is called by the NotificationRegistry when the help_requested signal is emitted for a notification
+        issued by this handler. It retrieves the notification object from the keyword arguments and calls the next
+        handler in the chain.
         """
 
         notification = kwargs.get('notification')
 
         # Check if this notification was sent by this handler
         if notification in self._generated_notifications:
-            self._timer.cancel()
+            self.cancel_timer()
 
             # The elderly needs help
             super().handle(notification.sensor_alert)
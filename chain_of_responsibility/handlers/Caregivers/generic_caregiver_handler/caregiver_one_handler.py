@@ -1,4 +1,5 @@
-from api.models import SensorAlert, Caregiver, CaregiverLevel
+from api.models import SensorAlert, Caregiver
+from chain_of_responsibility.caregiver_level_cache import CaregiverLevelCache
 from chain_of_responsibility.handlers.Caregivers.generic_caregiver_handler.generic_caregiver import \
     GenericCaregiverHandler
 
@@ -11,17 +12,20 @@ class CaregiverOneHandler(GenericCaregiverHandler):
     and sends notifications to them when a sensor alert is triggered.
     """
 
+    LEVEL = 1
+
     def __init__(self, head_of_chain):
         """
         Initialize the CaregiverOneHandler object.
 
         This method initializes the CaregiverOneHandler object by calling the constructor of the parent class with
-        the head_of_chain argument and setting the value of the WAIT_TIME attribute to the one present in database.
+        the head_of_chain argument and setting the value of the WAIT_TIME attribute to the one present in database
+        (through the CaregiverLevelCache).
 
         :param head_of_chain: The first handler in the chain of responsibility.
         """
         super().__init__(head_of_chain)
-        self.WAIT_TIME = CaregiverLevel.objects.get(level=1).wait_time
+        self.WAIT_TIME = CaregiverLevelCache().get_wait_time(1)
 
     def get_caregivers(self, request: SensorAlert):
         """
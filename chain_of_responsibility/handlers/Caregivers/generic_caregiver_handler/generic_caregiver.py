@@ -1,9 +1,10 @@
-import threading
 from api.models import SensorAlert, CaregiverLevel
 from chain_of_responsibility.handlers.base_handler import BaseHandler
 from abc import ABC, abstractmethod
+from ift785_project import settings
 from notifications_management.notification_level.notification_level_three import NotificationLevelThree
 from notifications_management.notification_sender.email_notification_sender import EmailNotificationSender
+from notifications_management.notification_sender.notification_dispatcher import NotificationDispatcher
 
 
 class GenericCaregiverHandler(BaseHandler, ABC):
@@ -36,25 +37,31 @@ class GenericCaregiverHandler(BaseHandler, ABC):
         :param request: The sensor alert to handle.
         """
 
-        # Get all the rows in the table 'Caregiver' related to the elderly person and the level of help
-        caregivers = self.get_caregivers(request)
+        # Get all the rows in the table 'Caregiver' related to the elderly person and the level of help, from the
+        # escalation plan of the chain when there is one
+        if self._escalation_plan is not None:
+            caregivers = self._escalation_plan.get_caregivers(self.LEVEL)
+        else:
+            caregivers = self.get_caregivers(request)
 
-        if caregivers is not None:
+        if caregivers:
 
-            for caregiver in caregivers:
-                # print(caregiver)
-                notification = BaseHandler.build_notification(caregiver, request)
-                self._generated_notifications.add(notification)
+            # Build all the notifications of the level at once
+            notifications = BaseHandler.build_notifications(caregivers, request, NotificationLevelThree())
+            for notification in notifications:
+                self.track_notification(notification)
 
-                EmailNotificationSender(NotificationLevelThree()).deliver_notification(notification)
+            # Queue all the notifications of the level together, without waiting for them to be sent (with the outbox,
+            # their emails have already been written along with them)
+            if not settings.NOTIFICATION_OUTBOX_ENABLED:
+                NotificationDispatcher().dispatch(EmailNotificationSender(NotificationLevelThree()), notifications)
 
-            # Build & start the timer
-            self._timer = threading.Timer(self.WAIT_TIME, lambda: self.timer_callback(request))
-            self._timer.start()
+            # Start the timer
+            self.start_timer(request, self.WAIT_TIME, self.timer_callback, request)
 
         else:
-            # Pass the request to the next handler
-            super().handle(request)
+            # No caregiver at this level: pass the request to the next handler without waiting
+            self.skip_level(request)
 
     @abstractmethod
     def get_caregivers(self, request: SensorAlert) -> list:
@@ -66,6 +73,18 @@ class GenericCaregiverHandler(BaseHandler, ABC):
        """
         pass
 
+    def resume(self, request: SensorAlert, stage: int, delay: float, notifications) -> None:
+        """
+        Resumes, after a restart, the wait for an answer of the caregivers notified by this handler.
+
+        :param request: The sensor alert being escalated.
+        :param stage: The step of the handler the pending timer belonged to.
+        :param delay: The number of seconds left before the deadline (0 if it has already passed).
+        :param notifications: The notifications issued by the handler before the restart.
+        """
+        super().resume(request, stage, delay, notifications)
+        self.start_timer(request, delay, self.timer_callback, request)
+
     def timer_callback(self, request: SensorAlert) -> None:
         """
         Callback function that is called when the timer expires.
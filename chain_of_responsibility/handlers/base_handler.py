@@ -1,8 +1,21 @@
-import uuid
+import logging
+from datetime import timedelta
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
 
 from api.models import Notification, Caregiver, SensorAlert
+from api.tokens import make_notification_token
+from chain_of_responsibility.database_writer import write
+from chain_of_responsibility.escalation_scheduler import EscalationScheduler
 from chain_of_responsibility.handlers.abstract_handler import Handler
-from chain_of_responsibility.signals import notification_accepted
+from chain_of_responsibility.models import EscalationState
+from chain_of_responsibility.notification_registry import NotificationRegistry
+from ift785_project import settings
+from notifications_management.notification_level.notification_level import NotificationLevel
+from notifications_management.outbox import write_outbox_messages
+
+logger = logging.getLogger(__name__)
 
 
 class BaseHandler(Handler):
@@ -10,38 +23,73 @@ class BaseHandler(Handler):
     Base class implementing common functionality for handlers.
 
     Attributes:
+        LEVEL: The caregiver level handled by the handler.
+        chain_key: The key under which the chain is registered in the ChainManager (set on the head only).
+        has_escalation_state: Whether the escalation of the chain has been persisted (set on the head only).
         _next_handler: The next handler in the chain.
         _head_of_chain: The head of the chain.
     """
 
+    LEVEL = None
+    chain_key = None
+    has_escalation_state = False
+
     @staticmethod
-    def build_notification(caregiver: Caregiver, sensor_alert: SensorAlert) -> Notification:
+    def build_notification(caregiver: Caregiver, sensor_alert: SensorAlert,
+                           level: NotificationLevel = None) -> Notification:
         """
         Builds a new notification for the given caregiver and sensor alert.
 
+        When the notification outbox is enabled and a level is given, the email of the notification is rendered and
+        written to the outbox in the same transaction as the notification, so that it is sent even if the process dies
+        right after.
+
         :param caregiver: The association between an elderly_person and a caregiver.
         :param sensor_alert: The sensor alert that triggered the notification.
+        :param level: The level of notification used to render the email of the notification.
         :return: The new notification.
         """
-        notification = Notification(caregiver=caregiver, sensor_alert=sensor_alert,
-                                    token=BaseHandler.generate_token())
-        notification.save()
-        return notification
+        return BaseHandler.build_notifications([caregiver], sensor_alert, level)[0]
 
     @staticmethod
-    def generate_token() -> str:
+    def build_notifications(caregivers, sensor_alert: SensorAlert, level: NotificationLevel = None) -> list:
+        """
+        Builds the new notifications of several caregivers for the given sensor alert.
+
+        The notifications (and their emails, when the notification outbox is enabled and a level is given) are inserted
+        with a single bulk INSERT each, in one transaction, made through the DatabaseWriter when it is enabled.
+
+        :param caregivers: The associations between an elderly_person and the caregivers to notify.
+        :param sensor_alert: The sensor alert that triggered the notifications.
+        :param level: The level of notification used to render the emails of the notifications.
+        :return: The new notifications, saved, in the order of the caregivers.
         """
-        Generates a unique token for a notification.
+        def insert_notifications():
+            with transaction.atomic():
+                notifications = Notification.objects.bulk_create([
+                    Notification(caregiver=caregiver, sensor_alert=sensor_alert) for caregiver in caregivers
+                ])
+                # The signed tokens are not stored: they are computed again from the notifications whenever needed
+                for notification in notifications:
+                    notification.token = BaseHandler.generate_token(notification)
+                if settings.NOTIFICATION_OUTBOX_ENABLED and level is not None:
+                    write_outbox_messages(notifications, level)
+            return notifications
+
+        return write(insert_notifications)
 
-        :return: A unique token.
+    @staticmethod
+    def generate_token(notification: Notification) -> str:
         """
-        token = str(uuid.uuid4())
+        Generates the confirmation token of a notification.
 
-        # Check if the UUID already exists
-        while Notification.objects.filter(token=token).exists():
-            token = str(uuid.uuid4())
+        The token is signed and carries the id of the notification and its issue time, so it is unique without any
+        query to the database.
 
-        return token
+        :param notification: The saved notification.
+        :return: The signed token.
+        """
+        return make_notification_token(notification.pk)
 
     def __init__(self, head_of_chain=None):
         """
@@ -56,10 +104,11 @@ class BaseHandler(Handler):
         else:
             self._head_of_chain = head_of_chain
         self._timer = None
-        self._generated_notifications = set()
+        self._timer_attempts = 0
+        self._escalation_plan = None
 
         # Keeps track of the notifications generated by the Handler.
-        notification_accepted.connect(self.on_notification_accepted)
+        self._generated_notifications = set()
 
     def set_next(self, handler):
         """
@@ -95,6 +144,181 @@ class BaseHandler(Handler):
         else:
             self.remove_chain()  # Remove the chain from the ChainManager
 
+    def set_escalation_plan(self, escalation_plan) -> None:
+        """
+        Set the escalation plan of the chain, from which the handler takes its caregivers.
+
+        Args:
+            escalation_plan: The escalation plan of the sensor alert handled by the chain.
+        """
+        self._escalation_plan = escalation_plan
+
+    def get_escalation_plan(self):
+        """
+        Get the escalation plan of the chain.
+
+        Returns:
+            EscalationPlan: The escalation plan of the chain, or None if the chain has none.
+        """
+        return self._escalation_plan
+
+    def get_generated_notifications(self) -> set:
+        """
+        Get the notifications issued by the handler.
+
+        Returns:
+            set: The notifications issued by the handler.
+        """
+        return self._generated_notifications
+
+    def get_chain_notification_ids(self) -> dict:
+        """
+        Get the ids of the notifications issued by every handler of the chain, so that the answers to the notifications
+        of the earlier levels still reach the chain once it is restored.
+
+        Returns:
+            dict: The ids of the notifications issued, by level (as a string) of the handler that issued them.
+        """
+        notification_ids = {}
+        handler = self._head_of_chain
+        while handler is not None:
+            if handler.get_generated_notifications():
+                notification_ids[str(handler.LEVEL)] = [notification.pk
+                                                       for notification in handler.get_generated_notifications()]
+            handler = handler.get_next()
+        return notification_ids
+
+    def track_notification(self, notification: Notification) -> None:
+        """
+        Keeps track of a notification issued by the handler and registers the handler as its owner, so that the
+        answer to the notification is dispatched to it.
+
+        Args:
+            notification: The notification issued by the handler.
+        """
+        self._generated_notifications.add(notification)
+        NotificationRegistry().register(notification, self)
+
+    def skip_level(self, request: SensorAlert) -> None:
+        """
+        Passes the request straight to the next handler because the level of the handler has no caregiver to notify,
+        recording the skipped level in the escalation plan of the chain.
+
+        Args:
+            request: The request to be handled.
+        """
+        logger.info("Level %s has no caregiver for SensorAlert %s: skipped", self.LEVEL, request.pk)
+        if self._escalation_plan is not None:
+            self._escalation_plan.record_skipped_level(self.LEVEL)
+        BaseHandler.handle(self, request)
+
+    def start_timer(self, request: SensorAlert, delay: float, callback, *args, stage: int = 0) -> None:
+        """
+        Schedules the given callback on the EscalationScheduler and keeps the scheduled task as the timer of the handler.
+
+        The progress of the escalation (level, stage, deadline and notifications issued by every level) is persisted
+        beforehand, leased to the current process, so that it can be resumed if the process stops before the deadline.
+        A failure to persist it is logged but does not prevent the escalation from going on in this process.
+
+        Args:
+            request: The sensor alert being escalated.
+            delay: The number of seconds to wait before calling the callback.
+            callback: The callback to call once the delay has expired.
+            *args: The arguments passed to the callback.
+            stage: The step of the handler the timer belongs to, used to resume the right callback.
+        """
+        now = timezone.now()
+        defaults = {
+            'level': self.LEVEL,
+            'stage': stage,
+            'due_at': now + timedelta(seconds=delay),
+            'notification_ids': self.get_chain_notification_ids(),
+            'skipped_levels': self._escalation_plan.skipped_levels if self._escalation_plan else [],
+            'owner': EscalationState.current_owner(),
+            'lease_until': now + timedelta(seconds=settings.ESCALATION_LEASE),
+        }
+        try:
+            write(lambda: EscalationState.objects.update_or_create(sensor_alert=request, defaults=defaults))
+            self._head_of_chain.has_escalation_state = True
+        except DatabaseError:
+            logger.exception("Could not persist the escalation state of SensorAlert %s", request.pk)
+        self._timer_attempts = 0
+        self._timer = EscalationScheduler().schedule(delay, self.run_timer_callback, request, callback, *args)
+
+    def run_timer_callback(self, request: SensorAlert, callback, *args) -> None:
+        """
+        Runs the callback of an expired timer of the handler, making sure the chain never stays registered without
+        any timer armed.
+
+        The chain is ended instead when the sensor alert has been resolved in the meantime (e.g. through a notification
+        answered by another process). When the callback fails on a database error, it is run again after
+        ESCALATION_RETRY_DELAY seconds, up to ESCALATION_RETRY_ATTEMPTS times; when it fails otherwise, or too many
+        times, the chain is removed.
+
+        Args:
+            request: The sensor alert being escalated.
+            callback: The callback of the timer.
+            *args: The arguments passed to the callback.
+        """
+        if self.is_resolved(request):
+            self.remove_chain()
+            return
+        try:
+            callback(*args)
+        except DatabaseError:
+            self._timer_attempts += 1
+            if self._timer_attempts < settings.ESCALATION_RETRY_ATTEMPTS:
+                logger.warning("Escalation of SensorAlert %s failed (attempt %d), retrying in %ss", request.pk,
+                               self._timer_attempts, settings.ESCALATION_RETRY_DELAY, exc_info=True)
+                self._timer = EscalationScheduler().schedule(settings.ESCALATION_RETRY_DELAY, self.run_timer_callback,
+                                                             request, callback, *args)
+                return
+            logger.exception("Escalation of SensorAlert %s failed %d times, ending its chain", request.pk,
+                             self._timer_attempts)
+            self.remove_chain()
+        except Exception:
+            logger.exception("Escalation of SensorAlert %s failed, ending its chain", request.pk)
+            self.remove_chain()
+
+    @staticmethod
+    def is_resolved(request: SensorAlert) -> bool:
+        """
+        Checks in the database whether the given sensor alert has been resolved.
+
+        Args:
+            request: The sensor alert being escalated.
+
+        Returns:
+            bool: Whether the sensor alert has been resolved, False when the database could not be read (the callback
+                of the timer then runs and fails on its own if the database is unavailable).
+        """
+        try:
+            return SensorAlert.objects.filter(pk=request.pk, is_resolved=True).exists()
+        except DatabaseError:
+            return False
+
+    def cancel_timer(self) -> None:
+        """
+        Cancels the pending timer of the handler, if any.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def resume(self, request: SensorAlert, stage: int, delay: float, notifications) -> None:
+        """
+        Resumes, after a restart, the escalation of the given request where it was left by this handler.
+
+        Subclasses arming timers must extend this method to start the timer matching the given stage again.
+
+        Args:
+            request: The sensor alert being escalated.
+            stage: The step of the handler the pending timer belonged to.
+            delay: The number of seconds left before the deadline (0 if it has already passed).
+            notifications: The notifications issued by the handler before the restart.
+        """
+        for notification in notifications:
+            self.track_notification(notification)
+
     def remove_chain(self) -> None:
         """
         Removes the chain of responsibility from the list once it has completed its work.
@@ -103,26 +327,30 @@ class BaseHandler(Handler):
         chain_manager = ChainManager()
         chain_manager.remove_chain(self._head_of_chain)
 
-    def on_notification_accepted(self, *args, **kwargs) -> None:
+    def on_notification_accepted(self, *args, **kwargs):
         """
         Handles a notification acceptance signal.
 
+        The notification is accepted atomically (see Notification.accept): when several caregivers accept a
+        notification of the alert at the same time, only the first one stops the escalation.
+
         :param args: The arguments passed with the signal.
         :param kwargs: The keyword arguments passed with the signal.
+        :return: Whether this acceptance resolved the sensor alert, or None if the notification was not sent by this
+            handler.
         """
         notification = kwargs.get('notification')
         # Check if this notification was sent by this handler
         if notification in self._generated_notifications:
-            # Set the has_accepted attribute of the notification to True
-            notification.has_accepted = True
-            notification.save()
+            if not notification.accept():
+                logger.info("Notification %s has been accepted after the resolution of its SensorAlert.",
+                            notification.id)
+                return False
             print(f"Notification {notification.id} has been accepted.")
+            print(f"SensorAlert {notification.sensor_alert_id} has been resolved.")
 
-            # Resolve the SensorAlert
-            sensor_alert = notification.sensor_alert
-            sensor_alert.is_resolved = True
-            sensor_alert.save()
-            print(f"SensorAlert {sensor_alert.id} has been resolved.")
-
-            self._timer.cancel()
+            # The handler may have no timer, e.g. an earlier level of a restored chain
+            self.cancel_timer()
             self.remove_chain()
+            return True
+        return None
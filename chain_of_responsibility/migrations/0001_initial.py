@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('api', '0008_alter_caregiverlevel_wait_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EscalationState',
+            fields=[
+                ('sensor_alert', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='api.sensoralert')),
+                ('level', models.IntegerField(choices=[(0, 'Level 0'), (1, 'Level 1'), (2, 'Level 2'), (3, 'Level 3')])),
+                ('stage', models.IntegerField(default=0)),
+                ('due_at', models.DateTimeField(db_index=True)),
+                ('notification_ids', models.JSONField(default=list)),
+            ],
+        ),
+    ]
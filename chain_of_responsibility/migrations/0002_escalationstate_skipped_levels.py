@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chain_of_responsibility', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escalationstate',
+            name='skipped_levels',
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chain_of_responsibility', '0002_escalationstate_skipped_levels'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='escalationstate',
+            name='notification_ids',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chain_of_responsibility', '0003_escalationstate_notification_ids_by_level'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escalationstate',
+            name='lease_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='escalationstate',
+            name='owner',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
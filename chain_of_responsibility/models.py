@@ -1,3 +1,38 @@
+import os
+import socket
+
 from django.db import models
 
+from api.models import CaregiverLevel, SensorAlert
+
+
 # Create your models here.
+class EscalationState(models.Model):
+    """
+    Progress of the chain of responsibility handling a SensorAlert, persisted so that pending escalations survive a
+    restart of the process.
+
+    Each escalation is leased by the process running its chain, which renews the lease while the chain is live. Once a
+    lease has expired, e.g. because its process stopped, any process can claim the escalation and restore its chain.
+    """
+    sensor_alert = models.OneToOneField(SensorAlert, on_delete=models.CASCADE, primary_key=True)
+    level = models.IntegerField(choices=CaregiverLevel.LEVEL_CHOICES)
+    stage = models.IntegerField(default=0)
+    due_at = models.DateTimeField(db_index=True)
+    # Ids of the notifications issued so far, by level of the handler that issued them (levels as strings, as JSON keys)
+    notification_ids = models.JSONField(default=dict)
+    skipped_levels = models.JSONField(default=list)
+    # Process running the chain of the escalation, and date until which the escalation is leased to it
+    owner = models.CharField(max_length=255, blank=True, default='')
+    lease_until = models.DateTimeField(null=True, blank=True)
+
+    @staticmethod
+    def current_owner() -> str:
+        """
+        Returns the identifier of the current process, as owner of the escalations it runs. It is computed on each call
+        as the worker processes of a server may be forked after this module is imported.
+        """
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def __str__(self):
+        return f'Escalation of {self.sensor_alert_id} - Level: {self.level} - Due at: {self.due_at}'
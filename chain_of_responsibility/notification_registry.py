@@ -0,0 +1,86 @@
+from api.models import Notification
+from chain_of_responsibility.signals import notification_accepted, help_requested
+from chain_of_responsibility.singleton import SingletonMeta
+
+
+class NotificationRegistry(metaclass=SingletonMeta):
+    """
+    Singleton index of the notifications issued by the live chains of responsibility.
+
+    The registry is the only receiver of the notification_accepted and help_requested signals: it looks the owning
+    handler of the notification up by id and forwards the signal to it, so dispatching a confirmation costs O(1) no
+    matter how many chains are live.
+
+    Attributes:
+        _handlers: Dictionary mapping the id of each notification to the handler that issued it.
+    """
+
+    def __init__(self):
+        """
+        Initializes the NotificationRegistry and connects it to the signals.
+        """
+        self._handlers = {}
+        notification_accepted.connect(self.on_notification_accepted)
+        help_requested.connect(self.on_help_requested)
+
+    def __len__(self) -> int:
+        """
+        Returns the number of notifications registered.
+        """
+        return len(self._handlers)
+
+    def register(self, notification: Notification, handler) -> None:
+        """
+        Registers the handler that issued the given notification.
+
+        Args:
+            notification: The notification issued.
+            handler: The handler that issued the notification.
+        """
+        self._handlers[notification.pk] = handler
+
+    def unregister(self, notifications) -> None:
+        """
+        Unregisters the given notifications, e.g. once the chain that issued them has ended.
+
+        Args:
+            notifications: The notifications to unregister.
+        """
+        for notification in notifications:
+            self._handlers.pop(notification.pk, None)
+
+    def get_handler(self, notification: Notification):
+        """
+        Returns the handler that issued the given notification.
+
+        Args:
+            notification: The notification to look up.
+
+        Returns:
+            Handler: The handler that issued the notification, or None if its chain is not live.
+        """
+        return self._handlers.get(notification.pk)
+
+    def on_notification_accepted(self, sender, **kwargs):
+        """
+        Forwards the notification_accepted signal to the handler that issued the notification.
+
+        :param sender: The sender of the signal.
+        :param kwargs: The keyword arguments passed with the signal.
+        :return: Whether the acceptance resolved the sensor alert, or None if no live handler issued the notification.
+        """
+        handler = self.get_handler(kwargs.get('notification'))
+        if handler is not None:
+            return handler.on_notification_accepted(sender, **kwargs)
+        return None
+
+    def on_help_requested(self, sender, **kwargs) -> None:
+        """
+        Forwards the help_requested signal to the handler that issued the notification, if it handles it.
+
+        :param sender: The sender of the signal.
+        :param kwargs: The keyword arguments passed with the signal.
+        """
+        handler = self.get_handler(kwargs.get('notification'))
+        if handler is not None and hasattr(handler, 'on_help_requested'):
+            handler.on_help_requested(sender, **kwargs)
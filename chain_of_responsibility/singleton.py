@@ -0,0 +1,31 @@
+import threading
+
+
+class SingletonMeta(type):
+    """
+    Metaclass for ApplicationInitializer class to ensure singleton behavior.
+
+    Attributes:
+        _instances: Dictionary to store singleton instances of ApplicationInitializer.
+            Key: An instance of the metaclass itself.
+            Value: Singleton instance of the class.
+        _lock: Reentrant lock ensuring that concurrent first calls create a single instance (reentrant because a
+            singleton may create other singletons while being initialized).
+    """
+
+    _instances = {}
+    _lock = threading.RLock()
+
+    def __call__(cls, *args, **kwargs):
+        """
+        Override the __call__ method to create or return an existing instance.
+
+        Returns:
+            obj: An instance of the class.
+        """
+        if cls not in cls._instances:
+            with SingletonMeta._lock:
+                if cls not in cls._instances:
+                    instance = super().__call__(*args, **kwargs)
+                    cls._instances[cls] = instance
+        return cls._instances[cls]
@@ -1,10 +1,28 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 from unittest.mock import patch, MagicMock
+from django.db import OperationalError
+from django.db.backends.signals import connection_created
 from django.test import TestCase
 
 import api
+from datetime import timedelta
+
+from django.utils import timezone
+
 from api.models import Person, CaregiverLevel, Home, Caregiver, SensorAlert, Notification
+from api.tokens import read_notification_token
+from chain_of_responsibility.caregiver_level_cache import CaregiverLevelCache
 from chain_of_responsibility.chain_manager import ChainManager
+from chain_of_responsibility.connection_tracker import ConnectionTracker
+from chain_of_responsibility.database_writer import WriteQueue, write
+from chain_of_responsibility.escalation_plan import EscalationPlan
+from chain_of_responsibility.escalation_scheduler import EscalationScheduler
+from chain_of_responsibility.models import EscalationState
+from chain_of_responsibility.notification_registry import NotificationRegistry
+from chain_of_responsibility.signals import notification_accepted
+from chain_of_responsibility.singleton import SingletonMeta
 from chain_of_responsibility.handlers.Caregivers.caregiver_zero_handler import CaregiverZeroHandler
 from chain_of_responsibility.handlers.Caregivers.generic_caregiver_handler.caregiver_one_handler import \
     CaregiverOneHandler
@@ -16,6 +34,8 @@ from chain_of_responsibility.handlers.Caregivers.generic_caregiver_handler.gener
     GenericCaregiverHandler
 from chain_of_responsibility.handlers.abstract_handler import Handler
 from chain_of_responsibility.handlers.base_handler import BaseHandler
+from ift785_project import settings
+from chain_of_responsibility.worker_pool import WorkerPool, WorkerPoolSaturated
 from notifications_management.notification_level.notification_level_one import NotificationLevelOne
 from notifications_management.notification_level.notification_level_two import NotificationLevelTwo
 
@@ -49,33 +69,55 @@ class GenericCaregiverHandlerTestCase(TestCase):
         self.assertEqual(notification.sensor_alert, self.sensor_alert)
         self.assertIsNotNone(notification.token)
 
+    def test_build_notifications(self):
+        """
+        This test verifies that the `build_notifications` method of the `GenericCaregiverHandler` class
+        saves the notifications of all the given caregivers with a single INSERT.
+        """
+        other_person = Person.objects.create(first_name='Jack', last_name='Smith', email='jack@example.com')
+        other_caregiver = Caregiver.objects.create(elderly=self.caregiver.elderly, caregiver=other_person,
+                                                   level=self.caregiver.level)
+
+        # One INSERT, between the SAVEPOINT and RELEASE SAVEPOINT of the transaction
+        with self.assertNumQueries(3):
+            notifications = GenericCaregiverHandler.build_notifications([self.caregiver, other_caregiver],
+                                                                        self.sensor_alert)
+
+        self.assertEqual([notification.caregiver for notification in notifications], [self.caregiver, other_caregiver])
+        self.assertTrue(all(notification.pk is not None for notification in notifications))
+        self.assertEqual(Notification.objects.filter(sensor_alert=self.sensor_alert).count(), 2)
+
     def test_generate_token(self):
         """
         This test verifies that the `generate_token` method of the `GenericCaregiverHandler` class
-        generates a token of type string (`str`) and that this token does not already exist in the database.
+        generates a token of type string (`str`) that carries the id of the notification, without storing it.
         """
-        token = GenericCaregiverHandler.generate_token()
+        notification = GenericCaregiverHandler.build_notification(self.caregiver, self.sensor_alert)
+        token = GenericCaregiverHandler.generate_token(notification)
         self.assertIsInstance(token, str)
+        self.assertEqual(read_notification_token(token), notification.pk)
         self.assertFalse(Notification.objects.filter(token=token).exists())
 
     @mock.patch('notifications_management.notification_sender.notification_sender.NotificationSender'
-                '.deliver_notification')
-    def test_handle(self, mock_deliver_notification):
+                '.deliver_notifications', return_value=[])
+    def test_handle(self, mock_deliver_notifications):
         """
         This test verifies that the `handle` method of the `CaregiverOneHandler` class
-        correctly calls the `deliver_notification` method of the `NotificationSender` class
+        correctly calls the `deliver_notifications` method of the `NotificationSender` class
         with a `Notification` instance containing the correct `caregiver` and `sensor_alert`.
         """
 
-        # Create a mock head of chain
+        # Create a mock head of chain, alone in its chain
         head_of_chain = mock.Mock(spec=BaseHandler)
+        head_of_chain.get_next.return_value = None
+        head_of_chain.get_generated_notifications.return_value = set()
 
         handler = CaregiverOneHandler(head_of_chain)
         handler.get_caregivers = mock.Mock(return_value=[self.caregiver])
         handler.handle(self.sensor_alert)
 
-        self.assertTrue(mock_deliver_notification.called)
-        notification = mock_deliver_notification.call_args[0][0]
+        self.assertTrue(mock_deliver_notifications.called)
+        notification = mock_deliver_notifications.call_args[0][0][0]
         self.assertIsInstance(notification, Notification)
         self.assertEqual(notification.caregiver, self.caregiver)
         self.assertEqual(notification.sensor_alert, self.sensor_alert)
@@ -96,24 +138,102 @@ class GenericCaregiverHandlerTestCase(TestCase):
         handler._next_handler.handle.assert_called_once_with(self.sensor_alert)
 
     @mock.patch('notifications_management.notification_sender.notification_sender.NotificationSender'
-                '.deliver_notification')
-    def test_on_notification_accepted(self, mock_deliver_notification):
+                '.deliver_notifications', return_value=[])
+    def test_on_notification_accepted(self, mock_deliver_notifications):
         """
         This test verifies that the `on_notification_accepted` method of the `CaregiverOneHandler` class
         correctly cancels the timer when a notification is accepted by a caregiver.
         """
 
-        # Create a mock head of chain
+        # Create a mock head of chain, alone in its chain
         head_of_chain = mock.Mock(spec=BaseHandler)
+        head_of_chain.get_next.return_value = None
+        head_of_chain.get_generated_notifications.return_value = set()
 
         handler = CaregiverOneHandler(head_of_chain)
         handler.get_caregivers = mock.Mock(return_value=[self.caregiver])
         handler.handle(self.sensor_alert)
 
-        notification = mock_deliver_notification.call_args[0][0]
+        notification = mock_deliver_notifications.call_args[0][0][0]
         handler._timer = mock.Mock()
-        handler.on_notification_accepted(notification=notification)
+        self.assertTrue(handler.on_notification_accepted(notification=notification))
         handler._timer.cancel.assert_called_once()
+        self.assertTrue(SensorAlert.objects.get(pk=self.sensor_alert.pk).is_resolved)
+
+
+    @mock.patch('notifications_management.notification_sender.notification_sender.NotificationSender'
+                '.deliver_notifications', return_value=[])
+    def test_on_notification_accepted_after_resolution(self, mock_deliver_notifications):
+        """
+        This test verifies that the `on_notification_accepted` method of the `CaregiverOneHandler` class
+        leaves the escalation running and reports it when the sensor alert has already been resolved.
+        """
+        head_of_chain = mock.Mock(spec=BaseHandler)
+        head_of_chain.get_next.return_value = None
+        head_of_chain.get_generated_notifications.return_value = set()
+        handler = CaregiverOneHandler(head_of_chain)
+        handler.get_caregivers = mock.Mock(return_value=[self.caregiver])
+        handler.handle(self.sensor_alert)
+        notification = mock_deliver_notifications.call_args[0][0][0]
+        handler._timer = mock.Mock()
+        SensorAlert.objects.filter(pk=self.sensor_alert.pk).update(is_resolved=True)
+
+        with self.assertLogs('chain_of_responsibility.handlers.base_handler', level='INFO') as logs:
+            self.assertFalse(handler.on_notification_accepted(notification=notification))
+        handler._timer.cancel.assert_not_called()
+        self.assertFalse(Notification.objects.get(pk=notification.pk).has_accepted)
+        self.assertIn("accepted after the resolution", logs.output[0])
+
+class NotificationRegistryTestCase(TestCase):
+    """
+    Test case class for NotificationRegistry.
+    """
+
+    def setUp(self):
+        """
+        This method creates two notifications issued for the same sensor alert.
+        """
+        elderly = Person.objects.create(first_name='John', last_name='Doe', email='john@example.com')
+        caregiver_person = Person.objects.create(first_name='Jane', last_name='Doe', email='jane@example.com')
+        home = Home.objects.create(home='nears-hub-dev', elderly=elderly)
+        caregiver = Caregiver.objects.create(elderly=elderly, caregiver=caregiver_person,
+                                             level=CaregiverLevel.objects.create(level=1))
+        sensor_alert = SensorAlert.objects.create(subject='stove', start='2022-05-09T16:13:09.754Z',
+                                                  location='kitchen', state=29.22,
+                                                  measurable='anomalous_location_temperature', home=home)
+        self.notification = Notification.objects.create(caregiver=caregiver, sensor_alert=sensor_alert, token='1')
+        self.other_notification = Notification.objects.create(caregiver=caregiver, sensor_alert=sensor_alert,
+                                                              token='2')
+
+    def test_signal_is_dispatched_to_owning_handler_only(self):
+        """
+        Test that the notification_accepted signal is forwarded to the handler that issued the notification only.
+        """
+        registry = NotificationRegistry()
+        owner = mock.Mock()
+        other = mock.Mock()
+        registry.register(self.notification, owner)
+        registry.register(self.other_notification, other)
+
+        notification_accepted.send(self, notification=self.notification)
+
+        owner.on_notification_accepted.assert_called_once_with(self, notification=self.notification)
+        other.on_notification_accepted.assert_not_called()
+        registry.unregister([self.notification, self.other_notification])
+
+    def test_unregister(self):
+        """
+        Test that the notifications of a chain are no longer dispatched once unregistered.
+        """
+        registry = NotificationRegistry()
+        owner = mock.Mock()
+        registry.register(self.notification, owner)
+        registry.unregister([self.notification])
+
+        notification_accepted.send(self, notification=self.notification)
+
+        self.assertIsNone(registry.get_handler(self.notification))
+        owner.on_notification_accepted.assert_not_called()
 
 
 class ChainManagerTestCase(TestCase):
@@ -209,6 +329,511 @@ class ChainManagerTestCase(TestCase):
         self.assertIn(chain2, chains)
         self.assertNotIn(chain1, chains)
 
+    def test_chains_keyed_by_sensor_alert(self):
+        """
+        Test that a chain created for a sensor alert can be retrieved by it, that creating a new chain for the same
+        sensor alert replaces the previous one, and that the number of live chains is kept up to date.
+        """
+        manager = ChainManager()
+        live_chains = manager.live_chains
+        sensor_alert = SensorAlert(pk=42)
+
+        chain1 = manager.get_chain_of_responsibility(sensor_alert)
+        self.assertIs(manager.get_chain(sensor_alert), chain1)
+        self.assertEqual(manager.live_chains, live_chains + 1)
+
+        chain2 = manager.get_chain_of_responsibility(sensor_alert)
+        self.assertIs(manager.get_chain(sensor_alert), chain2)
+        self.assertEqual(manager.live_chains, live_chains + 1)
+
+        manager.remove_chain(chain2)
+        self.assertIsNone(manager.get_chain(sensor_alert))
+        self.assertEqual(manager.live_chains, live_chains)
+
+    def test_remove_chain_cleans_up_handlers(self):
+        """
+        Test that removing a chain cancels the timers of its handlers and unregisters their notifications.
+        """
+        manager = ChainManager()
+        chain = manager.get_chain_of_responsibility()
+        handler = chain.get_next()
+        handler._timer = mock.Mock()
+        notification = Notification(pk=1234)
+        handler.track_notification(notification)
+
+        manager.remove_chain(chain)
+
+        handler._timer.cancel.assert_called_once()
+        self.assertIsNone(NotificationRegistry().get_handler(notification))
+        self.assertNotIn(chain, manager.get_chains_of_responsibility())
+
+
+class EscalationStateTestCase(TestCase):
+    """
+    Test case class for the persistence of the escalations (EscalationState) and their restoration.
+    """
+
+    def setUp(self):
+        """
+        This method creates the caregiver levels, a level 1 caregiver and a sensor alert used in the tests.
+        """
+        for level in range(4):
+            CaregiverLevel.objects.create(level=level)
+        self.elderly = Person.objects.create(first_name='John', last_name='Doe', email='john@example.com')
+        self.caregiver_person = Person.objects.create(first_name='Jane', last_name='Doe', email='jane@example.com')
+        self.home = Home.objects.create(home='nears-hub-dev', elderly=self.elderly)
+        self.caregiver = Caregiver.objects.create(elderly=self.elderly, caregiver=self.caregiver_person,
+                                                  level=CaregiverLevel.objects.get(level=1))
+        self.sensor_alert = SensorAlert.objects.create(subject='stove', start='2022-05-09T16:13:09.754Z',
+                                                       location='kitchen', state=29.22,
+                                                       measurable='anomalous_location_temperature', home=self.home)
+
+    @patch.object(EscalationScheduler, 'schedule')
+    @patch('notifications_management.notification_sender.notification_sender.NotificationSender'
+           '.deliver_notifications', return_value=[])
+    def test_start_timer_persists_state(self, mock_deliver_notifications, mock_schedule):
+        """
+        Test that arming the timer of a handler persists the level, the deadline and the notifications issued, and
+        that removing the chain deletes the persisted state.
+        """
+        chain = ChainManager().get_chain_of_responsibility(self.sensor_alert)
+        handler = chain.get_next()
+        handler.handle(self.sensor_alert)
+
+        state = EscalationState.objects.get(sensor_alert=self.sensor_alert)
+        notification = Notification.objects.get(sensor_alert=self.sensor_alert)
+        self.assertEqual(state.level, 1)
+        self.assertEqual(state.notification_ids, {'1': [notification.pk]})
+        self.assertGreater(state.due_at, timezone.now())
+        self.assertEqual(state.owner, EscalationState.current_owner())
+        self.assertGreater(state.lease_until, timezone.now())
+
+        handler.remove_chain()
+        self.assertFalse(EscalationState.objects.exists())
+
+    @patch.object(EscalationScheduler, 'schedule')
+    def test_restore_chains(self, mock_schedule):
+        """
+        Test that restore_chains rebuilds a chain for each persisted escalation and resumes it at the persisted level,
+        with an immediate deadline when it passed while the process was stopped.
+        """
+        notification = Notification.objects.create(caregiver=self.caregiver, sensor_alert=self.sensor_alert,
+                                                   token='12345')
+        EscalationState.objects.create(sensor_alert=self.sensor_alert, level=1,
+                                       due_at=timezone.now() - timedelta(minutes=1),
+                                       notification_ids={'1': [notification.pk]})
+
+        restored = ChainManager().restore_chains()
+
+        self.assertEqual(restored, 1)
+        self.assertIsNotNone(ChainManager().get_chain(self.sensor_alert))
+        delay, run_timer_callback, request, callback, *args = mock_schedule.call_args[0]
+        self.assertEqual(delay, 0)
+        self.assertEqual(args, [self.sensor_alert])
+        self.assertIsInstance(callback.__self__, CaregiverOneHandler)
+        self.assertIn(notification, callback.__self__._generated_notifications)
+        self.assertEqual(request, self.sensor_alert)
+        ChainManager().remove_chain(ChainManager().get_chain(self.sensor_alert))
+
+    @patch.object(EscalationScheduler, 'schedule')
+    def test_accepting_earlier_level_notification_ends_restored_chain(self, mock_schedule):
+        """
+        Test that once a chain is restored at a later level, accepting a notification of an earlier level resolves the
+        sensor alert, removes the chain and deletes its persisted state.
+        """
+        level_one_notification = Notification.objects.create(caregiver=self.caregiver, sensor_alert=self.sensor_alert)
+        EscalationState.objects.create(sensor_alert=self.sensor_alert, level=2, due_at=timezone.now(),
+                                       notification_ids={'1': [level_one_notification.pk]})
+        ChainManager().restore_chains()
+
+        results = notification_accepted.send(self, notification=level_one_notification)
+
+        self.assertIn(True, [result for _, result in results])
+        self.assertIsNone(ChainManager().get_chain(self.sensor_alert))
+        self.assertFalse(EscalationState.objects.exists())
+        self.sensor_alert.refresh_from_db()
+        self.assertTrue(self.sensor_alert.is_resolved)
+
+    def test_claim_escalations(self):
+        """
+        Test that an escalation is claimed by a single process until its lease expires.
+        """
+        EscalationState.objects.create(sensor_alert=self.sensor_alert, level=1, due_at=timezone.now())
+
+        with patch.object(EscalationState, 'current_owner', return_value='host:1'):
+            self.assertEqual(ChainManager.claim_escalations(), 1)
+        with patch.object(EscalationState, 'current_owner', return_value='host:2'):
+            self.assertEqual(ChainManager.claim_escalations(), 0)
+            EscalationState.objects.update(lease_until=timezone.now() - timedelta(seconds=1))
+            self.assertEqual(ChainManager.claim_escalations(), 1)
+
+        self.assertEqual(EscalationState.objects.get().owner, 'host:2')
+
+    @patch.object(EscalationScheduler, 'schedule')
+    def test_restore_chains_skips_escalations_leased_by_other_process(self, mock_schedule):
+        """
+        Test that the escalation leased by another (live) process is not restored.
+        """
+        EscalationState.objects.create(sensor_alert=self.sensor_alert, level=1, due_at=timezone.now(),
+                                       owner='other-host:1', lease_until=timezone.now() + timedelta(minutes=1))
+
+        self.assertEqual(ChainManager().restore_chains(), 0)
+        self.assertIsNone(ChainManager().get_chain(self.sensor_alert))
+        self.assertEqual(EscalationState.objects.get().owner, 'other-host:1')
+
+    @patch.object(EscalationScheduler, 'schedule')
+    def test_restore_chains_skips_resolved_alerts(self, mock_schedule):
+        """
+        Test that the escalation of a sensor alert resolved in the meantime is not restored and its state is deleted.
+        """
+        EscalationState.objects.create(sensor_alert=self.sensor_alert, level=1, due_at=timezone.now())
+        SensorAlert.objects.filter(pk=self.sensor_alert.pk).update(is_resolved=True)
+
+        self.assertEqual(ChainManager().restore_chains(), 0)
+        self.assertIsNone(ChainManager().get_chain(self.sensor_alert))
+        self.assertFalse(EscalationState.objects.exists())
+
+    @patch.object(EscalationScheduler, 'schedule')
+    def test_timer_callback_retried_on_database_error(self, mock_schedule):
+        """
+        Test that a timer callback failing on a database error is scheduled again, and that the chain is removed once
+        it has failed ESCALATION_RETRY_ATTEMPTS times.
+        """
+        chain = ChainManager().get_chain_of_responsibility(self.sensor_alert)
+        callback = MagicMock(side_effect=OperationalError("database is locked"))
+
+        for attempt in range(1, settings.ESCALATION_RETRY_ATTEMPTS):
+            chain.run_timer_callback(self.sensor_alert, callback, self.sensor_alert)
+            self.assertEqual(mock_schedule.call_count, attempt)
+            self.assertEqual(mock_schedule.call_args[0][0], settings.ESCALATION_RETRY_DELAY)
+            self.assertIs(ChainManager().get_chain(self.sensor_alert), chain)
+
+        chain.run_timer_callback(self.sensor_alert, callback, self.sensor_alert)
+        self.assertEqual(callback.call_count, settings.ESCALATION_RETRY_ATTEMPTS)
+        self.assertIsNone(ChainManager().get_chain(self.sensor_alert))
+
+    def test_failing_timer_callback_removes_chain(self):
+        """
+        Test that a chain whose timer callback fails is removed instead of staying registered without timer.
+        """
+        chain = ChainManager().get_chain_of_responsibility(self.sensor_alert)
+        live_chains = ChainManager().live_chains
+
+        chain.run_timer_callback(self.sensor_alert, MagicMock(side_effect=ValueError), self.sensor_alert)
+
+        self.assertIsNone(ChainManager().get_chain(self.sensor_alert))
+        self.assertEqual(ChainManager().live_chains, live_chains - 1)
+
+    def test_timer_callback_of_resolved_alert_removes_chain(self):
+        """
+        Test that the escalation of a sensor alert resolved in the meantime (e.g. by another process) goes no further.
+        """
+        chain = ChainManager().get_chain_of_responsibility(self.sensor_alert)
+        callback = MagicMock()
+        SensorAlert.objects.filter(pk=self.sensor_alert.pk).update(is_resolved=True)
+
+        chain.run_timer_callback(self.sensor_alert, callback, self.sensor_alert)
+
+        callback.assert_not_called()
+        self.assertIsNone(ChainManager().get_chain(self.sensor_alert))
+
+
+class CaregiverLevelCacheTestCase(TestCase):
+    """
+    Test case class for CaregiverLevelCache.
+    """
+
+    def setUp(self):
+        """
+        This method creates the four caregiver levels.
+        """
+        for level in range(4):
+            CaregiverLevel.objects.create(level=level, wait_time=60 * (level + 1))
+
+    def test_building_chain_does_not_query_database(self):
+        """
+        Test that, once the cache is loaded, building a chain of responsibility runs no query.
+        """
+        CaregiverLevelCache().get(0)
+
+        with self.assertNumQueries(0):
+            chain = ChainManager().initialize_chain_of_responsibility()
+
+        self.assertEqual(chain.WAIT_TIME, 60)
+        self.assertEqual(chain.get_next().WAIT_TIME, 120)
+        ChainManager().remove_chain(chain)
+
+    def test_invalidated_on_save(self):
+        """
+        Test that editing a CaregiverLevel invalidates the cache.
+        """
+        self.assertEqual(CaregiverLevelCache().get_wait_time(2), 180)
+
+        caregiver_level = CaregiverLevel.objects.get(level=2)
+        caregiver_level.wait_time = 30
+        caregiver_level.save()
+
+        self.assertEqual(CaregiverLevelCache().get_wait_time(2), 30)
+
+    def test_unknown_level(self):
+        """
+        Test that asking for a level missing from the database raises CaregiverLevel.DoesNotExist.
+        """
+        CaregiverLevel.objects.filter(level=3).delete()
+        CaregiverLevelCache().invalidate()
+
+        with self.assertRaises(CaregiverLevel.DoesNotExist):
+            CaregiverLevelCache().get(3)
+
+
+class WorkerPoolTestCase(TestCase):
+    """
+    Test case class for WorkerPool.
+    """
+
+    def test_submit_runs_task(self):
+        """
+        Test that a submitted task is run by one of the workers of the pool.
+        """
+        pool = WorkerPool('test-pool', workers=2, queue_size=10)
+        task = MagicMock()
+
+        pool.submit(task, 1, 2)
+        pool.join()
+
+        task.assert_called_once_with(1, 2)
+        self.assertEqual(pool.queue_depth, 0)
+
+    def test_submit_when_queue_is_full(self):
+        """
+        Test that submitting a task to a pool whose queue is full raises WorkerPoolSaturated.
+        """
+        # A pool without worker never drains its queue
+        pool = WorkerPool('test-pool', workers=0, queue_size=1)
+        pool.submit(MagicMock())
+
+        with self.assertRaises(WorkerPoolSaturated):
+            pool.submit(MagicMock())
+        self.assertEqual(pool.queue_depth, 1)
+
+    @patch('chain_of_responsibility.worker_pool.close_old_connections')
+    def test_connections_recycled_around_each_task(self, mock_close_old_connections):
+        """
+        Test that the workers recycle their database connection before and after each task, even a failing one.
+        """
+        pool = WorkerPool('test-pool', workers=1, queue_size=10)
+
+        pool.submit(MagicMock())
+        pool.submit(MagicMock(side_effect=Exception("task failed")))
+        pool.join()
+
+        self.assertEqual(mock_close_old_connections.call_count, 4)
+
+
+class ConnectionTrackerTestCase(TestCase):
+    """
+    Test case class for ConnectionTracker.
+    """
+
+    def test_tracks_connections_of_other_threads(self):
+        """
+        Test that a connection opened by another thread is counted as open until it is closed.
+        """
+        tracker = ConnectionTracker()
+        opened = tracker.opened
+        connection = MagicMock()
+
+        thread = threading.Thread(target=connection_created.send, args=(None,), kwargs={'connection': connection})
+        thread.start()
+        thread.join()
+
+        self.assertEqual(tracker.opened, opened + 1)
+        self.assertIn(connection, tracker._connections)
+        open_connections = tracker.open
+        connection.connection = None
+        self.assertEqual(tracker.open, open_connections - 1)
+
+
+class WriteQueueTestCase(TestCase):
+    """
+    Test case class for WriteQueue.
+    """
+
+    def test_writes_are_committed_together(self):
+        """
+        Test that the writes submitted within the delay are committed as one group, on the writer thread.
+        """
+        write_queue = WriteQueue('test-writer', max_batch=10, max_delay=0.5)
+        groups = []
+        commit = WriteQueue._commit
+
+        def record_commit(writes):
+            groups.append(len(writes))
+            commit(writes)
+
+        with patch.object(write_queue, '_commit', side_effect=record_commit):
+            futures = [write_queue.submit(lambda value: (value, threading.current_thread().name), value)
+                       for value in range(3)]
+            results = [future.result(timeout=5) for future in futures]
+
+        self.assertEqual(results, [(value, 'test-writer') for value in range(3)])
+        self.assertEqual(groups, [3])
+
+    def test_failing_write_does_not_abort_the_group(self):
+        """
+        Test that a failing write only fails its own future, the other writes of the group being committed.
+        """
+        write_queue = WriteQueue('test-writer', max_batch=10, max_delay=0.5)
+
+        def fail():
+            raise ValueError("write failed")
+
+        failing = write_queue.submit(fail)
+        succeeding = write_queue.submit(lambda: 'written')
+
+        with self.assertRaises(ValueError):
+            failing.result(timeout=5)
+        self.assertEqual(succeeding.result(timeout=5), 'written')
+
+    def test_run_within_transaction_writes_directly(self):
+        """
+        Test that a write made within a transaction is made by the caller rather than by the writer thread.
+        """
+        write_queue = WriteQueue('test-writer', max_batch=10, max_delay=0.5)
+
+        # Test cases run within a transaction
+        self.assertEqual(write_queue.run(lambda: threading.current_thread()), threading.current_thread())
+
+    def test_write_without_database_writer(self):
+        """
+        Test that write() makes the write directly when the DatabaseWriter is disabled.
+        """
+        fn = MagicMock(return_value='written')
+
+        with patch.object(settings, 'DATABASE_WRITER_ENABLED', False):
+            self.assertEqual(write(fn, 1), 'written')
+
+        fn.assert_called_once_with(1)
+
+
+class EscalationSchedulerTestCase(TestCase):
+    """
+    Test case class for EscalationScheduler.
+    """
+
+    def test_singleton(self):
+        """
+        Test that only one EscalationScheduler (and thus one scheduler thread) exists.
+        """
+        self.assertIs(EscalationScheduler(), EscalationScheduler())
+
+    def test_tasks_run_in_deadline_order(self):
+        """
+        Test that the scheduled tasks run once their deadline is reached, the earliest deadline first.
+        """
+        scheduler = EscalationScheduler()
+        calls = []
+
+        late_task = scheduler.schedule(0.2, calls.append, 'late')
+        early_task = scheduler.schedule(0.05, calls.append, 'early')
+        late_task.join(timeout=5)
+        early_task.join(timeout=5)
+
+        self.assertEqual(calls, ['early', 'late'])
+
+    def test_cancelled_task_does_not_run(self):
+        """
+        Test that a cancelled task never runs and that joining it does not block.
+        """
+        scheduler = EscalationScheduler()
+        callback = MagicMock()
+
+        task = scheduler.schedule(0.05, callback)
+        task.cancel()
+
+        self.assertTrue(task.join(timeout=1))
+        # Let the deadline pass to make sure the callback is not called later on
+        scheduler.schedule(0.1, MagicMock()).join(timeout=5)
+        callback.assert_not_called()
+        self.assertTrue(task.cancelled)
+
+
+class ChainManagerConcurrencyTestCase(TestCase):
+    """
+    Stress tests of the ChainManager and of the singletons under concurrent access.
+    """
+
+    def test_singleton_created_once_under_concurrency(self):
+        """
+        Test that concurrent first calls of a singleton class all get the same instance.
+        """
+        class Counter(metaclass=SingletonMeta):
+            created = 0
+
+            def __init__(self):
+                Counter.created += 1
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            instances = list(executor.map(lambda _: Counter(), range(200)))
+
+        self.assertEqual(Counter.created, 1)
+        self.assertTrue(all(instance is instances[0] for instance in instances))
+
+    @patch('chain_of_responsibility.handlers.base_handler.print', create=True)
+    @patch.object(CaregiverLevelCache, 'get_wait_time', return_value=600)
+    def test_parallel_starts_and_accepts(self, mock_get_wait_time, mock_print):
+        """
+        Test that many chains started and accepted in parallel are all registered, dispatched to the right handler and
+        removed, leaving the registries as they were. Each notification is clicked twice at the same time, through the
+        notification_accepted signal as the confirmation view does, and only one of the clicks resolves its alert.
+        """
+        manager = ChainManager()
+        registry = NotificationRegistry()
+        live_chains = manager.live_chains
+        registered_notifications = len(registry)
+
+        # Compare-and-set of the resolution of the sensor alerts, standing in for the database one
+        resolved_alerts = set()
+        resolution_lock = threading.Lock()
+
+        def accept_notification(notification):
+            with resolution_lock:
+                if notification.sensor_alert_id in resolved_alerts:
+                    return False
+                resolved_alerts.add(notification.sensor_alert_id)
+                return True
+
+        def start(index):
+            chain = manager.get_chain_of_responsibility(SensorAlert(pk=100000 + index))
+            handler = chain.get_next()
+            notification = Notification(pk=100000 + index, sensor_alert_id=100000 + index)
+            handler.track_notification(notification)
+            return notification
+
+        def click(notification):
+            # As the confirmation view: the owning handler answers, or the notification is accepted directly once the
+            # chain has been removed by the other click
+            results = [result for _, result in notification_accepted.send(self, notification=notification)
+                       if result is not None]
+            if results:
+                return notification.pk, results[0], True
+            return notification.pk, notification.accept(), False
+
+        with patch.object(Notification, 'accept', autospec=True, side_effect=accept_notification), \
+                ThreadPoolExecutor(max_workers=32) as executor:
+            notifications = list(executor.map(start, range(500)))
+            self.assertEqual(manager.live_chains, live_chains + 500)
+            clicks = list(executor.map(click, notifications + notifications))
+
+        resolutions = {}
+        for notification_id, resolved, by_handler in clicks:
+            resolutions[notification_id] = resolutions.get(notification_id, 0) + resolved
+            # The alerts are resolved by the handlers owning the notifications
+            self.assertTrue(by_handler or not resolved)
+        self.assertEqual(set(resolutions.values()), {1})
+        self.assertEqual(manager.live_chains, live_chains)
+        self.assertEqual(len(registry), registered_notifications)
+
 
 class HandlersTestCase(TestCase):
     def setUp(self):
@@ -444,6 +1069,68 @@ class HandlersTestCase(TestCase):
             self.assertEqual(caregiver.elderly, self.elderly_person)
 
 
+    def test_escalation_plan(self):
+        """
+            Test the EscalationPlan class.
+            This test ensures that the plan fetches the caregivers of every level with a single query and groups them
+            by level, with their persons and level already loaded.
+        """
+        with self.assertNumQueries(1):
+            escalation_plan = EscalationPlan.build(self.sensor_alert)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(escalation_plan.get_self_caregiver(), self.caregiverLevelZero)
+            self.assertCountEqual(escalation_plan.get_caregivers(1), [self.caregiverLevelOne, self.caregiverLevelOne_2])
+            self.assertCountEqual(escalation_plan.get_caregivers(3),
+                                  [self.caregiverLevelThree, self.caregiverLevelThree_2])
+            caregiver = escalation_plan.get_caregivers(2)[0]
+            self.assertEqual(caregiver.elderly.first_name, 'John')
+            self.assertEqual(caregiver.level.level, 2)
+            self.assertIn(caregiver.caregiver.first_name, ['Sam', 'Sammy'])
+
+    @patch('chain_of_responsibility.handlers.base_handler.EscalationScheduler')
+    @patch('notifications_management.notification_sender.notification_sender.NotificationSender'
+           '.deliver_notifications', return_value=[])
+    def test_handlers_use_escalation_plan(self, mock_deliver_notifications, mock_scheduler):
+        """
+            Test that the handlers of a chain created for a sensor alert take their caregivers from the escalation
+            plan of the chain instead of querying them.
+        """
+        chain = ChainManager().get_chain_of_responsibility(self.sensor_alert)
+        handler = chain.get_next().get_next()
+
+        with patch.object(CaregiverTwoHandler, 'get_caregivers') as mock_get_caregivers:
+            handler.handle(self.sensor_alert)
+
+        mock_get_caregivers.assert_not_called()
+        notified = [notification.caregiver for notification in mock_deliver_notifications.call_args[0][0]]
+        self.assertCountEqual(notified, [self.caregiverLevelTwo, self.caregiverLevelTwo_2])
+        ChainManager().remove_chain(chain)
+
+
+    @patch('chain_of_responsibility.handlers.base_handler.EscalationScheduler')
+    @patch('notifications_management.notification_sender.notification_sender.NotificationSender'
+           '.deliver_notifications', return_value=[])
+    def test_empty_levels_are_skipped(self, mock_deliver_notifications, mock_scheduler):
+        """
+            Test that the levels without caregiver are skipped immediately (without arming their timer) and recorded,
+            and that the escalation goes on with the next populated level.
+        """
+        Caregiver.objects.filter(level__level__in=[1, 2]).delete()
+        chain = ChainManager().get_chain_of_responsibility(self.sensor_alert)
+        handler = chain.get_next()
+
+        handler.handle(self.sensor_alert)
+
+        # Only the level 3 handler armed a timer
+        mock_scheduler.return_value.schedule.assert_called_once()
+        notified = [notification.caregiver for notification in mock_deliver_notifications.call_args[0][0]]
+        self.assertCountEqual(notified, [self.caregiverLevelThree, self.caregiverLevelThree_2])
+        self.assertEqual(chain.get_escalation_plan().skipped_levels, [1, 2])
+        self.assertEqual(EscalationState.objects.get(sensor_alert=self.sensor_alert).skipped_levels, [1, 2])
+        ChainManager().remove_chain(chain)
+
+
 class CaregiverZeroHandlerTest(TestCase):
     """
         This class contains test cases for the CaregiverZeroHandler class.
@@ -479,7 +1166,7 @@ class CaregiverZeroHandlerTest(TestCase):
         # Assert
         call_args = mock_sender.call_args
         self.assertIsInstance(call_args[0][0], NotificationLevelOne)
-        mock_sender.return_value.deliver_notification.assert_called()
+        mock_sender.return_value.deliver_notifications.assert_called()
 
 
     @patch('chain_of_responsibility.handlers.Caregivers.caregiver_zero_handler.EmailNotificationSender')
@@ -491,11 +1178,15 @@ class CaregiverZeroHandlerTest(TestCase):
         # Setup
         request = self.sensor_alert
         handler = CaregiverZeroHandler()
+        next_handler = mock.Mock()
+        handler.set_next(next_handler)
 
-        # Act & Assert
-        with self.assertRaises(api.models.Caregiver.DoesNotExist):
-            handler.handle(request)
+        # Act
+        handler.handle(request)
 
+        # Assert
+        next_handler.handle.assert_called_once_with(request)
+        self.assertIsNone(handler._timer)
         mock_sender.assert_not_called()
     @patch('chain_of_responsibility.handlers.Caregivers.caregiver_zero_handler.EmailNotificationSender')
     def test_sends_second_notification_after_wait_time(self, mock_sender):
@@ -515,7 +1206,7 @@ class CaregiverZeroHandlerTest(TestCase):
         # Assert
         call_args = mock_sender.call_args
         self.assertIsInstance(call_args[0][0], NotificationLevelTwo)
-        mock_sender.return_value.deliver_notification.assert_called()
+        mock_sender.return_value.deliver_notifications.assert_called()
 
     @patch('chain_of_responsibility.handlers.Caregivers.caregiver_zero_handler.EmailNotificationSender')
     def test_passes_request_to_next_handler_after_second_wait_time(self, mock_sender):
@@ -537,4 +1228,4 @@ class CaregiverZeroHandlerTest(TestCase):
         # Assert
         call_args = mock_sender.call_args
         self.assertIsInstance(call_args[0][0], NotificationLevelTwo)
-        mock_sender.return_value.deliver_notification.assert_called()
+        mock_sender.return_value.deliver_notifications.assert_called()
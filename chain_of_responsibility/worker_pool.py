@@ -0,0 +1,105 @@
+import logging
+import queue
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPoolSaturated(Exception):
+    """
+    Raised when a task is submitted to a WorkerPool whose queue is full.
+    """
+    pass
+
+
+class WorkerPool:
+    """
+    A fixed set of long-lived worker threads consuming tasks from a bounded queue.
+
+    Like Django does around each request, the workers close their database connection before and after each task when
+    it is unusable or older than CONN_MAX_AGE, so that a worker reuses its connection without ever keeping a broken or
+    stale one.
+
+    Attributes:
+        _name: The name of the pool, used to name its threads.
+        _queue: The queue of the tasks waiting for a worker.
+        _workers: The worker threads of the pool.
+    """
+
+    def __init__(self, name: str, workers: int, queue_size: int = 0):
+        """
+        Initializes a new WorkerPool and starts its worker threads.
+
+        Args:
+            name: The name of the pool.
+            workers: The number of worker threads.
+            queue_size: The maximum number of tasks waiting for a worker (0 means unbounded).
+        """
+        self._name = name
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._workers = []
+        for index in range(workers):
+            worker = threading.Thread(target=self._work, name=f"{name}-{index}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Returns the number of tasks waiting for a worker.
+        """
+        return self._queue.qsize()
+
+    @property
+    def queue_size(self) -> int:
+        """
+        Returns the maximum number of tasks waiting for a worker (0 means unbounded).
+        """
+        return self._queue.maxsize
+
+    @property
+    def workers(self) -> int:
+        """
+        Returns the number of worker threads of the pool.
+        """
+        return len(self._workers)
+
+    def submit(self, fn, *args, block: bool = False) -> None:
+        """
+        Submits a task to the pool.
+
+        Args:
+            fn: The callable to run on a worker thread.
+            *args: The arguments passed to the callable.
+            block: Whether to wait for a free slot when the queue is full.
+
+        Raises:
+            WorkerPoolSaturated: If the queue is full and block is False.
+        """
+        try:
+            self._queue.put((fn, args), block=block)
+        except queue.Full:
+            raise WorkerPoolSaturated(f"The queue of the worker pool '{self._name}' is full")
+
+    def join(self) -> None:
+        """
+        Blocks until every submitted task has been run.
+        """
+        self._queue.join()
+
+    def _work(self) -> None:
+        """
+        Main loop of a worker thread: runs the submitted tasks one after the other.
+        """
+        while True:
+            fn, args = self._queue.get()
+            close_old_connections()
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception("Task %r failed in the worker pool '%s'", fn, self._name)
+            finally:
+                close_old_connections()
+                self._queue.task_done()
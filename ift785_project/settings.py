@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.0/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
+import os
 import sys
 from pathlib import Path
 
@@ -81,9 +82,30 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # The connections are kept up to CONN_MAX_AGE seconds, and checked before being reused, by the requests as well
+        # as by the worker threads, which recycle them around each of their tasks (see WorkerPool)
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Database profiles, selected with the DATABASE_PROFILE environment variable:
+# - default: the SQLite defaults;
+# - sqlite-concurrent: WAL journal (readers no longer block the writer), writes waiting up to 20 seconds for the lock
+#   instead of failing with "database is locked", and transactions taking the write lock as soon as they begin.
+DATABASE_PROFILES = {
+    'default': {},
+    'sqlite-concurrent': {
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+        },
+    },
+}
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'default')
+DATABASES['default'].update(DATABASE_PROFILES[DATABASE_PROFILE])
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -142,3 +164,88 @@ TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
 
 # Other configurations
 CAREGIVER_ZERO_SECOND_TIMER_DELAY = 20
+
+# Chain executor: number of threads starting chains, maximum number of alerts waiting for one of them and number of
+# seconds after which a client should retry once the queue is full
+CHAIN_EXECUTOR_WORKERS = 8
+CHAIN_EXECUTOR_QUEUE_SIZE = 1000
+CHAIN_EXECUTOR_RETRY_AFTER = 5
+
+# Escalation scheduler: number of threads running the expired escalation deadlines
+ESCALATION_SCHEDULER_WORKERS = 4
+# Number of times the callback of an expired escalation deadline is run when it fails on a database error (e.g. a
+# locked SQLite database), waiting ESCALATION_RETRY_DELAY seconds between two attempts, before the chain is ended
+ESCALATION_RETRY_ATTEMPTS = 3
+ESCALATION_RETRY_DELAY = 5
+
+# Whether the server resumes, when it starts, the escalations persisted by the previous process
+ESCALATION_RESTORE_ON_STARTUP = True
+# Number of seconds for which a process leases the escalations it runs. Each process renews its leases three times per
+# lease, and claims and resumes the escalations whose lease has expired (those of a stopped process), so that only one
+# process resumes each of them
+ESCALATION_LEASE = 60
+
+# Number of shards (each with its own lock) of the registry of the live chains of responsibility
+CHAIN_MANAGER_SHARDS = 16
+
+# Email connection pool: maximum number of connections used at the same time and number of seconds after which an idle
+# connection is closed
+EMAIL_CONNECTION_POOL_SIZE = 4
+EMAIL_CONNECTION_POOL_IDLE_TIMEOUT = 60
+
+# Notification dispatcher: number of sender threads (0 sends the notifications inline, as in the tests), maximum number
+# of queued deliveries, maximum number of attempts per notification, delay in seconds before the first retry (doubled at
+# each retry, up to the maximum) and number of undeliverable notifications kept as dead letters
+NOTIFICATION_DISPATCHER_WORKERS = 0 if TESTING else 4
+NOTIFICATION_DISPATCHER_QUEUE_SIZE = 1000
+NOTIFICATION_DISPATCHER_MAX_ATTEMPTS = 5
+NOTIFICATION_DISPATCHER_BACKOFF = 2
+NOTIFICATION_DISPATCHER_MAX_BACKOFF = 300
+NOTIFICATION_DISPATCHER_DEAD_LETTERS = 1000
+
+# Notification outbox: when enabled, the rendered emails are written to the outbox in the same transaction as their
+# notification and sent by the run_outbox command instead of the NotificationDispatcher. The command sends them in
+# batches of NOTIFICATION_OUTBOX_BATCH_SIZE, polls the outbox every NOTIFICATION_OUTBOX_POLL_INTERVAL seconds when it is
+# empty and gives up on an email after NOTIFICATION_OUTBOX_MAX_ATTEMPTS attempts. A batch is reserved to the process
+# sending it for NOTIFICATION_OUTBOX_CLAIM_TIMEOUT seconds, after which it is sent again should the process have stopped.
+# While no email of a batch can be sent, the polling interval is doubled up to NOTIFICATION_OUTBOX_MAX_BACKOFF seconds
+NOTIFICATION_OUTBOX_ENABLED = False
+NOTIFICATION_OUTBOX_BATCH_SIZE = 100
+NOTIFICATION_OUTBOX_POLL_INTERVAL = 1
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = 5
+NOTIFICATION_OUTBOX_CLAIM_TIMEOUT = 300
+NOTIFICATION_OUTBOX_MAX_BACKOFF = 60
+
+# Maximum number of alerts whose partially rendered notification templates are kept in memory
+NOTIFICATION_RENDER_CACHE_SIZE = 1024
+
+# Number of seconds during which the signed confirmation link of a notification remains valid
+NOTIFICATION_TOKEN_MAX_AGE = 7 * 24 * 3600
+
+# Maximum number of confirmation tokens of resolved sensor alerts kept in memory to answer repeated clicks
+CONFIRMATION_CACHE_SIZE = 4096
+
+# Archiving: the resolved alerts older than ARCHIVE_AFTER_DAYS days are moved, with their notifications, to the archive
+# tables by chunks of ARCHIVE_CHUNK_SIZE alerts, every ARCHIVE_INTERVAL seconds (0 disables the periodic archiving, the
+# archive_alerts command can still be run). Each server process checks whether the archiving is due ARCHIVE_STARTUP_DELAY
+# seconds after it starts then every ARCHIVE_CHECK_INTERVAL seconds; a single process runs it, holding it for up to
+# ARCHIVE_LOCK_TIMEOUT seconds
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_CHUNK_SIZE = 1000
+ARCHIVE_INTERVAL = 24 * 3600
+ARCHIVE_STARTUP_DELAY = 60
+ARCHIVE_CHECK_INTERVAL = 3600
+ARCHIVE_LOCK_TIMEOUT = 6 * 3600
+
+# Database writer: when enabled, the writes of the handlers and views are made by a single writer thread, which commits
+# up to DATABASE_WRITER_MAX_BATCH writes together, waiting up to DATABASE_WRITER_MAX_DELAY_MS milliseconds for them
+DATABASE_WRITER_ENABLED = False
+DATABASE_WRITER_MAX_BATCH = 100
+DATABASE_WRITER_MAX_DELAY_MS = 2
+
+# Alert write buffer: when enabled, the alerts received one by one are buffered for up to ALERT_WRITE_BUFFER_MAX_DELAY_MS
+# milliseconds (the latency added to their requests) or ALERT_WRITE_BUFFER_MAX_ROWS alerts, then inserted together with
+# a single bulk INSERT and one commit (made by the DatabaseWriter when it is enabled) before their requests are answered
+ALERT_WRITE_BUFFER_ENABLED = False
+ALERT_WRITE_BUFFER_MAX_ROWS = 200
+ALERT_WRITE_BUFFER_MAX_DELAY_MS = 5
@@ -9,8 +9,20 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ift785_project.settings')
 
 application = get_wsgi_application()
+
+# Resume the escalations that were pending when the previous process stopped, then keep the leases of the escalations
+# of this process and resume those of the processes that stop
+if settings.ESCALATION_RESTORE_ON_STARTUP:
+    from chain_of_responsibility.chain_manager import schedule_escalation_recovery
+    schedule_escalation_recovery(0)
+
+# Archive the old alerts periodically, shortly after the start (one process archives them, when it is due)
+if settings.ARCHIVE_INTERVAL:
+    from api.archiving import schedule_archiving
+    schedule_archiving(settings.ARCHIVE_STARTUP_DELAY)
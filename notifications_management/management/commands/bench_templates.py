@@ -0,0 +1,44 @@
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from api.models import Person, CaregiverLevel, Caregiver, Home, SensorAlert, Notification
+from notifications_management.notification_level.notification_level import NotificationLevel
+from notifications_management.notification_level.notification_level_one import NotificationLevelOne
+from notifications_management.notification_level.notification_level_three import NotificationLevelThree
+from notifications_management.notification_level.notification_level_two import NotificationLevelTwo
+
+
+class Command(BaseCommand):
+    help = "Measures the time needed to render the subject and content of a notification at each level."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10000,
+                            help="Number of notifications rendered at each level.")
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        # Unsaved objects: the benchmark measures the rendering only, not the database. The alert is given a primary
+        # key so that, as for a real alert, its part of the notifications is rendered once for all of them
+        elderly = Person(first_name="John", last_name="Doe", email="john@example.com")
+        caregiver = Caregiver(elderly=elderly, caregiver=Person(first_name="Jane", last_name="Doe",
+                                                                email="jane@example.com"),
+                              level=CaregiverLevel(level=3))
+        sensor_alert = SensorAlert(pk=0, subject="stove", start=datetime(2022, 5, 9, 16, 13, 9), location="kitchen",
+                                   state=Decimal("29.22"), measurable="anomalous_location_temperature",
+                                   home=Home(home="nears-hub-dev", elderly=elderly))
+        notification = Notification(caregiver=caregiver, sensor_alert=sensor_alert,
+                                    token="00000000-0000-0000-0000-000000000000")
+
+        for level in (NotificationLevelOne(), NotificationLevelTwo(), NotificationLevelThree()):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                level.generate_subject(notification)
+                level.generate_content(notification)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"{type(level).__name__}: {iterations} renders in {elapsed:.3f}s "
+                              f"({elapsed / iterations * 1e6:.1f} us/render)")
+        NotificationLevel.evict_alert(sensor_alert.pk)
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ift785_project import settings
+from notifications_management.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Sends the emails waiting in the notification outbox, in batches sharing a single connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_OUTBOX_BATCH_SIZE,
+                            help="Maximum number of emails sent over one connection.")
+        parser.add_argument('--interval', type=float, default=settings.NOTIFICATION_OUTBOX_POLL_INTERVAL,
+                            help="Number of seconds to wait when the outbox is empty.")
+        parser.add_argument('--once', action='store_true',
+                            help="Stop once the outbox is empty instead of waiting for new emails.")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        backoff = options['interval']
+        while True:
+            sent, failed = drain_outbox(options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} email(s), {failed} failed")
+            if failed and not sent:
+                # The email server is likely unreachable: wait longer and longer before trying again
+                if options['once']:
+                    break
+                time.sleep(backoff)
+                backoff = min(max(backoff * 2, 1), settings.NOTIFICATION_OUTBOX_MAX_BACKOFF)
+                continue
+            backoff = options['interval']
+            if sent + failed >= options['batch_size']:
+                # The batch was full: more emails may be waiting
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Outbox drained: {total_sent} email(s) sent, {total_failed} failed"))
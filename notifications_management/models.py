@@ -1,3 +1,28 @@
 from django.db import models
 
+from api.models import Notification
+
+
 # Create your models here.
+class OutboxMessage(models.Model):
+    """
+    Rendered email of a notification, written in the same transaction as the notification and sent later by the
+    run_outbox command.
+    """
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE)
+    subject = models.CharField(max_length=255)
+    content = models.TextField()
+    recipient = models.EmailField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Drain that is sending the message, and date until which the message is reserved to it
+    claimed_by = models.CharField(max_length=32, blank=True, default='')
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['sent_at', 'id'])]
+
+    def __str__(self):
+        return f'Email of notification {self.notification_id} to {self.recipient} - Sent at: {self.sent_at}'
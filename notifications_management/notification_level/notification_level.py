@@ -1,9 +1,33 @@
+import threading
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from string import Template
 
 from api.models import Notification
+from ift785_project import settings
 
 
 class NotificationLevel(ABC):
+    """
+    Abstract base class for the levels of notification.
+
+    The subject and content of a notification are rendered from the SUBJECT_TEMPLATE and CONTENT_TEMPLATE of its level.
+    The fields shared by all the notifications of an alert are substituted once, and the partially rendered templates
+    are cached until the escalation of the alert ends, so that only the fields of the recipient remain to be substituted
+    for each notification.
+
+    Attributes:
+        SUBJECT_TEMPLATE: The template of the subject of the notifications.
+        CONTENT_TEMPLATE: The template of the content of the notifications.
+        _alert_templates: The templates partially rendered for an alert, the most recently used last.
+        _alert_templates_lock: Lock protecting the partially rendered templates.
+    """
+
+    SUBJECT_TEMPLATE = None
+    CONTENT_TEMPLATE = None
+
+    _alert_templates = OrderedDict()
+    _alert_templates_lock = threading.Lock()
 
     @abstractmethod
     def generate_content(self, notification: Notification):
@@ -33,4 +57,92 @@ class NotificationLevel(ABC):
         Returns:
             str: The subject line of the notification.
         """
-        pass
\ No newline at end of file
+        pass
+
+    def get_alert_fields(self, notification: Notification) -> dict:
+        """
+        Get the fields of the templates shared by all the notifications of the alert.
+
+        Subclasses may add their own fields, as long as they do not depend on the recipient of the notification.
+
+        Args:
+            notification (Notification): The notification object.
+
+        Returns:
+            dict: The values of the alert-scoped fields.
+        """
+        sensor_alert = notification.sensor_alert
+        return {
+            'start': sensor_alert.start,
+            'location': sensor_alert.location,
+            'state': sensor_alert.state,
+            'measurable': sensor_alert.measurable,
+        }
+
+    def get_alert_key(self, notification: Notification):
+        """
+        Get what, besides the alert, the alert-scoped fields of the notification depend on.
+
+        Args:
+            notification (Notification): The notification object.
+
+        Returns:
+            The part of the cache key identifying the alert-scoped fields within the alert (None by default).
+        """
+        return None
+
+    def get_alert_templates(self, notification: Notification) -> tuple:
+        """
+        Get the subject and content templates of the notification, with the alert-scoped fields already substituted.
+
+        Args:
+            notification (Notification): The notification object.
+
+        Returns:
+            tuple[Template, Template]: The partially rendered subject and content templates.
+        """
+        key = (type(self), notification.sensor_alert_id, self.get_alert_key(notification))
+        if notification.sensor_alert_id is None:
+            # An alert that is not saved cannot be told apart from the others: do not cache its templates
+            return self.render_alert_templates(notification)
+
+        with self._alert_templates_lock:
+            templates = self._alert_templates.get(key)
+            if templates is not None:
+                self._alert_templates.move_to_end(key)
+                return templates
+
+        templates = self.render_alert_templates(notification)
+        with self._alert_templates_lock:
+            self._alert_templates[key] = templates
+            while len(self._alert_templates) > settings.NOTIFICATION_RENDER_CACHE_SIZE:
+                self._alert_templates.popitem(last=False)
+        return templates
+
+    def render_alert_templates(self, notification: Notification) -> tuple:
+        """
+        Substitute the alert-scoped fields of the notification in the subject and content templates.
+
+        Args:
+            notification (Notification): The notification object.
+
+        Returns:
+            tuple[Template, Template]: The partially rendered subject and content templates.
+        """
+        # Escape the values so that a '$' in them is not taken for a placeholder when the recipient fields are
+        # substituted
+        fields = {name: str(value).replace('$', '$$') for name, value in self.get_alert_fields(notification).items()}
+        return (Template(self.SUBJECT_TEMPLATE.safe_substitute(fields)),
+                Template(self.CONTENT_TEMPLATE.safe_substitute(fields)))
+
+    @classmethod
+    def evict_alert(cls, sensor_alert_id) -> None:
+        """
+        Forgets the templates partially rendered for an alert, once its escalation is over.
+
+        Args:
+            sensor_alert_id: The primary key of the alert.
+        """
+        with cls._alert_templates_lock:
+            for key in [key for key in cls._alert_templates if key[1] == sensor_alert_id]:
+                del cls._alert_templates[key]
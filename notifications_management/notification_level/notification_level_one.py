@@ -1,3 +1,5 @@
+from string import Template
+
 from api.models import Notification
 from notifications_management.notification_level.notification_level import NotificationLevel
 from notifications_management.notification_sender.notification_sender import NotificationSender
@@ -5,6 +7,25 @@ from notifications_management.notification_sender.notification_sender import Not
 
 class NotificationLevelOne(NotificationLevel):
 
+    CONTENT_TEMPLATE = Template(
+        "Dear $first_name $last_name,\n\n"
+        "We request your attention because a new alert has been triggered. \n"
+        "Details : "
+        "Start: $start\n"
+        "Location: $location\n"
+        "State: $state\n"
+        "Measurable: $measurable\n\n"
+        "Please click on the following link to confirm "
+        "that you have received this notification\n\n"
+        "Confirmation link: $link\n\n"
+        "If you need help, please click on the following link to request assistance:\n\n"
+        "Help link: $link&help_requested=true\n\n"
+        "Best regards,\n"
+        "IFT785 Project Team"
+        "(This in an alert with level 1)"
+    )
+    SUBJECT_TEMPLATE = Template("Alert detected for $first_name $last_name ($location)")
+
     def generate_content(self, notification: Notification):
         """
          Generate the content of the notification email with level one.
@@ -18,24 +39,12 @@ class NotificationLevelOne(NotificationLevel):
              str: The content of the notification email.
          """
         elderly = notification.caregiver.elderly
-        sensor_alert = notification.sensor_alert
-
-        content = (
-            f"Dear {elderly.first_name} {elderly.last_name},\n\n"
-            f"We request your attention because a new alert has been triggered. \n"
-            f"Details : "
-            f"Start: {sensor_alert.start}\n"
-            f"Location: {sensor_alert.location}\n"
-            f"State: {sensor_alert.state}\n"
-            f"Measurable: {sensor_alert.measurable}\n\n"
-            f"Please click on the following link to confirm "
-            f"that you have received this notification\n\n"
-            f"Confirmation link: {NotificationSender.generate_link(notification)}\n\n"
-            f"If you need help, please click on the following link to request assistance:\n\n"
-            f"Help link: {NotificationSender.generate_link(notification)}&help_requested=true\n\n"
-            f"Best regards,\n"
-            f"IFT785 Project Team"
-            f"(This in an alert with level 1)"
+        content_template = self.get_alert_templates(notification)[1]
+
+        content = content_template.substitute(
+            first_name=elderly.first_name,
+            last_name=elderly.last_name,
+            link=NotificationSender.generate_link(notification),
         )
         return content
 
@@ -51,7 +60,7 @@ class NotificationLevelOne(NotificationLevel):
         Returns:
             str: The subject line of the notification email.
         """
-        sensor_alert = notification.sensor_alert
         elderly = notification.caregiver.elderly
-        subject = f"Alert detected for {elderly.first_name} {elderly.last_name} ({sensor_alert.location})"
+        subject_template = self.get_alert_templates(notification)[0]
+        subject = subject_template.substitute(first_name=elderly.first_name, last_name=elderly.last_name)
         return subject
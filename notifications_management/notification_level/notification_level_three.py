@@ -1,3 +1,5 @@
+from string import Template
+
 from api.models import Notification
 from notifications_management.notification_level.notification_level import NotificationLevel
 from notifications_management.notification_sender.notification_sender import NotificationSender
@@ -5,6 +7,26 @@ from notifications_management.notification_sender.notification_sender import Not
 
 class NotificationLevelThree(NotificationLevel):
 
+    CONTENT_TEMPLATE = Template(
+        "Dear $caregiver_first_name $caregiver_last_name,\n\n"
+        "We request your assistance for $first_name $last_name "
+        "with a caregiver level of $caregiver_level.\n\n"
+        "Reason: A new alert has been triggered for $first_name "
+        "$last_name with the following details:\n\n"
+        "Start: $start\n"
+        "Location: $location\n"
+        "State: $state\n"
+        "Measurable: $measurable\n\n"
+        "Please click on the following link to confirm "
+        "that you have received this notification and will provide the "
+        "necessary assistance.\n\n"
+        "Confirmation link: $link\n\n"
+        "Best regards,\n"
+        "IFT785 Project Team"
+        "(This in an alert with level 3)"
+    )
+    SUBJECT_TEMPLATE = Template("Assistance Requested for $first_name $last_name - Caregiver Level $caregiver_level")
+
     def generate_content(self, notification: Notification):
         """
          Generate the content of the notification email with level three.
@@ -18,27 +40,12 @@ class NotificationLevelThree(NotificationLevel):
              str: The content of the notification email.
          """
         caregiver = notification.caregiver.caregiver
-        elderly = notification.caregiver.elderly
-        caregiver_level = notification.caregiver.level.level
-        sensor_alert = notification.sensor_alert
-
-        content = (
-            f"Dear {caregiver.first_name} {caregiver.last_name},\n\n"
-            f"We request your assistance for {elderly.first_name} {elderly.last_name} "
-            f"with a caregiver level of {caregiver_level}.\n\n"
-            f"Reason: A new alert has been triggered for {elderly.first_name} "
-            f"{elderly.last_name} with the following details:\n\n"
-            f"Start: {sensor_alert.start}\n"
-            f"Location: {sensor_alert.location}\n"
-            f"State: {sensor_alert.state}\n"
-            f"Measurable: {sensor_alert.measurable}\n\n"
-            f"Please click on the following link to confirm "
-            f"that you have received this notification and will provide the "
-            f"necessary assistance.\n\n"
-            f"Confirmation link: {NotificationSender.generate_link(notification)}\n\n"
-            f"Best regards,\n"
-            f"IFT785 Project Team"
-            f"(This in an alert with level 3)"
+        content_template = self.get_alert_templates(notification)[1]
+
+        content = content_template.substitute(
+            caregiver_first_name=caregiver.first_name,
+            caregiver_last_name=caregiver.last_name,
+            link=NotificationSender.generate_link(notification),
         )
         return content
 
@@ -54,7 +61,36 @@ class NotificationLevelThree(NotificationLevel):
         Returns:
             str: The subject line of the notification email.
         """
+        subject = self.get_alert_templates(notification)[0].substitute()
+        return subject
+
+    def get_alert_fields(self, notification: Notification) -> dict:
+        """
+        Get the fields of the templates shared by all the notifications of the alert.
+
+        With level three, the name of the elderly person and the caregiver level are the same for all the caregivers
+        notified at a level, so they are rendered along with the alert.
+
+        Args:
+            notification (Notification): The notification object containing information about the alert.
+
+        Returns:
+            dict: The values of the alert-scoped fields.
+        """
         elderly = notification.caregiver.elderly
-        caregiver_level = notification.caregiver.level.level
-        subject = f"Assistance Requested for {elderly.first_name} {elderly.last_name} - Caregiver Level {caregiver_level}"
-        return subject
\ No newline at end of file
+        fields = super().get_alert_fields(notification)
+        fields.update(first_name=elderly.first_name, last_name=elderly.last_name,
+                      caregiver_level=notification.caregiver.level.level)
+        return fields
+
+    def get_alert_key(self, notification: Notification):
+        """
+        Get what, besides the alert, the alert-scoped fields of the notification depend on.
+
+        Args:
+            notification (Notification): The notification object containing information about the alert.
+
+        Returns:
+            The caregiver level of the notification, since an alert is escalated through several levels.
+        """
+        return notification.caregiver.level_id
@@ -1,3 +1,5 @@
+from string import Template
+
 from api.models import Notification
 from notifications_management.notification_level.notification_level import NotificationLevel
 from notifications_management.notification_sender.notification_sender import NotificationSender
@@ -5,6 +7,24 @@ from notifications_management.notification_sender.notification_sender import Not
 
 class NotificationLevelTwo(NotificationLevel):
 
+    CONTENT_TEMPLATE = Template(
+        "Dear $first_name $last_name,\n\n"
+        "This is a reminder that an alert has been triggered ! \n"
+        "Please take note of the following alert. \n"
+        "Details : "
+        "Start: $start\n"
+        "Location: $location\n"
+        "State: $state\n"
+        "Measurable: $measurable\n\n"
+        "Please click on the following link to confirm "
+        "that you have received this notification and you can solve the problem by your own. \n"
+        "Confirmation link: $link\n\n"
+        "Best regards,\n"
+        "IFT785 Project Team"
+        "(This in an alert with level 2)"
+    )
+    SUBJECT_TEMPLATE = Template("REMINDER : Alert detected for $first_name $last_name ($location)")
+
     def generate_content(self, notification: Notification):
         """
          Generate the content of the notification email with level two.
@@ -18,23 +38,12 @@ class NotificationLevelTwo(NotificationLevel):
              str: The content of the notification email.
          """
         elderly = notification.caregiver.elderly
-        sensor_alert = notification.sensor_alert
-
-        content = (
-            f"Dear {elderly.first_name} {elderly.last_name},\n\n"
-            f"This is a reminder that an alert has been triggered ! \n"
-            f"Please take note of the following alert. \n"
-            f"Details : "
-            f"Start: {sensor_alert.start}\n"
-            f"Location: {sensor_alert.location}\n"
-            f"State: {sensor_alert.state}\n"
-            f"Measurable: {sensor_alert.measurable}\n\n"
-            f"Please click on the following link to confirm "
-            f"that you have received this notification and you can solve the problem by your own. \n"
-            f"Confirmation link: {NotificationSender.generate_link(notification)}\n\n"
-            f"Best regards,\n"
-            f"IFT785 Project Team"
-            f"(This in an alert with level 2)"
+        content_template = self.get_alert_templates(notification)[1]
+
+        content = content_template.substitute(
+            first_name=elderly.first_name,
+            last_name=elderly.last_name,
+            link=NotificationSender.generate_link(notification),
         )
         return content
 
@@ -50,7 +59,7 @@ class NotificationLevelTwo(NotificationLevel):
         Returns:
             str: The subject line of the notification email.
         """
-        sensor_alert = notification.sensor_alert
         elderly = notification.caregiver.elderly
-        subject = f"REMINDER : Alert detected for {elderly.first_name} {elderly.last_name} ({sensor_alert.location})"
+        subject_template = self.get_alert_templates(notification)[0]
+        subject = subject_template.substitute(first_name=elderly.first_name, last_name=elderly.last_name)
         return subject
\ No newline at end of file
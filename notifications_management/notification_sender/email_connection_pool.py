@@ -0,0 +1,130 @@
+import smtplib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from chain_of_responsibility.singleton import SingletonMeta
+
+
+class EmailConnectionPool(metaclass=SingletonMeta):
+    """
+    Singleton pool of persistent, authenticated connections to the email server, shared by every thread sending
+    notifications.
+
+    At most EMAIL_CONNECTION_POOL_SIZE connections are borrowed at the same time. An idle connection is checked (NOOP)
+    before being lent again, and dropped if it has been idle for more than EMAIL_CONNECTION_POOL_IDLE_TIMEOUT seconds or
+    if the check fails, in which case a new connection is opened.
+
+    Attributes:
+        _idle: The idle connections, with the time they were last used, the most recently used last.
+        _slots: Semaphore bounding the number of borrowed connections.
+        _lock: Lock protecting the idle connections.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty EmailConnectionPool.
+        """
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(settings.EMAIL_CONNECTION_POOL_SIZE)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a connection from the pool for the duration of the with block.
+
+        A connection whose use raised an exception is closed instead of being given back to the pool.
+
+        Yields:
+            BaseEmailBackend: An open connection to the email server.
+        """
+        self._slots.acquire()
+        try:
+            connection = self._acquire()
+            try:
+                yield connection
+            except Exception:
+                self._discard(connection)
+                raise
+            self._release(connection)
+        finally:
+            self._slots.release()
+
+    def close_all(self) -> None:
+        """
+        Closes every idle connection of the pool.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def _acquire(self):
+        """
+        Takes the most recently used healthy idle connection, or opens a new one.
+
+        Returns:
+            BaseEmailBackend: An open connection to the email server.
+        """
+        while True:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                break
+            connection, last_used = entry
+            if time.monotonic() - last_used <= settings.EMAIL_CONNECTION_POOL_IDLE_TIMEOUT \
+                    and self._is_alive(connection):
+                return connection
+            self._discard(connection)
+
+        connection = get_connection()
+        connection.open()
+        return connection
+
+    def _release(self, connection) -> None:
+        """
+        Gives a connection back to the pool.
+
+        Args:
+            connection: The connection to give back.
+        """
+        with self._lock:
+            self._idle.append((connection, time.monotonic()))
+
+    @staticmethod
+    def _discard(connection) -> None:
+        """
+        Closes a connection, ignoring the errors of an already broken connection.
+
+        Args:
+            connection: The connection to close.
+        """
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_alive(connection) -> bool:
+        """
+        Checks that a connection to an SMTP server is still usable by sending it a NOOP command.
+
+        Args:
+            connection: The connection to check.
+
+        Returns:
+            bool: Whether the connection is usable. Connections of non-SMTP backends are always considered usable.
+        """
+        if not hasattr(connection, 'connection'):
+            return True
+        if connection.connection is None:
+            return False
+        try:
+            return connection.connection.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
@@ -1,9 +1,15 @@
-from django.core.mail import send_mail
+import logging
+import smtplib
+
+from django.core.mail import send_mail, EmailMessage
 from django.conf import settings
 from api.models import Notification
 from notifications_management.notification_level.notification_level import NotificationLevel
+from notifications_management.notification_sender.email_connection_pool import EmailConnectionPool
 from notifications_management.notification_sender.notification_sender import NotificationSender
 
+logger = logging.getLogger(__name__)
+
 
 class EmailNotificationSender(NotificationSender):
 
@@ -35,17 +41,57 @@ class EmailNotificationSender(NotificationSender):
         """
         Send the notification email.
 
-        This method sends the notification email to the recipient caregiver.
+        This method sends the notification email to the recipient caregiver over a connection borrowed from the
+        EmailConnectionPool. If the server closed that connection, the email is sent again over a new one.
 
         Args:
             subject (str): The subject line of the email.
             content (str): The content/body of the email.
             recipient (str): The email address of the recipient.
         """
-        send_mail(
-            subject=subject,
-            message=content,
-            from_email=settings.EMAIL_FROM,
-            recipient_list=[recipient],
-            fail_silently=False,
-        )
+        for attempt in range(2):
+            try:
+                with EmailConnectionPool().connection() as connection:
+                    send_mail(
+                        subject=subject,
+                        message=content,
+                        from_email=settings.EMAIL_FROM,
+                        recipient_list=[recipient],
+                        fail_silently=False,
+                        connection=connection,
+                    )
+                return
+            except smtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+
+    def send_batch(self, messages) -> list:
+        """
+        Send several notification emails over a single connection.
+
+        This method borrows one connection from the EmailConnectionPool for the whole batch instead of using one per
+        email. Each email is sent on its own so that a failing one is reported without preventing the others from
+        being sent. If the server closes the connection, it is reopened once and the email is sent again.
+
+        Args:
+            messages (list[tuple]): The (notification, subject, content, recipient) of each email.
+
+        Returns:
+            list[Notification]: The notifications whose email could not be sent.
+        """
+        failed_notifications = []
+        with EmailConnectionPool().connection() as connection:
+            for notification, subject, content, recipient in messages:
+                email = EmailMessage(subject=subject, body=content, from_email=settings.EMAIL_FROM,
+                                     to=[recipient], connection=connection)
+                try:
+                    try:
+                        connection.send_messages([email])
+                    except smtplib.SMTPServerDisconnected:
+                        connection.close()
+                        connection.open()
+                        connection.send_messages([email])
+                except Exception:
+                    logger.exception("Could not send the email of notification %s", notification.pk)
+                    failed_notifications.append(notification)
+        return failed_notifications
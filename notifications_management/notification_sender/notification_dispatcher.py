@@ -0,0 +1,182 @@
+import logging
+import random
+import threading
+from collections import deque
+
+from chain_of_responsibility.escalation_scheduler import EscalationScheduler
+from chain_of_responsibility.singleton import SingletonMeta
+from chain_of_responsibility.worker_pool import WorkerPool, WorkerPoolSaturated
+from ift785_project import settings
+from notifications_management.notification_sender.notification_sender import NotificationSender
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryQueue:
+    """
+    Delivers notifications in the background, retrying the failed deliveries.
+
+    The deliveries are consumed by a WorkerPool with a bounded queue. A delivery that fails, or that cannot be queued
+    because the queue is full, is retried, through the EscalationScheduler, after an exponential backoff with jitter. A
+    delivery that still fails after the maximum number of attempts is moved to the dead letters.
+
+    Attributes:
+        _pool: The worker pool sending the notifications, or None when they are sent inline.
+        _max_attempts: The maximum number of attempts to deliver a notification.
+        _backoff: The delay, in seconds, before the first retry. It doubles at each retry.
+        _max_backoff: The maximum delay, in seconds, before a retry.
+        _dead_letters: The notifications that could not be delivered, with the reason why.
+        _lock: Lock protecting the dead letters.
+    """
+
+    def __init__(self, name: str, workers: int, queue_size: int, max_attempts: int, backoff: float,
+                 max_backoff: float, dead_letters: int):
+        """
+        Initializes a new DeliveryQueue.
+
+        Args:
+            name: The name of the queue, used to name its worker threads.
+            workers: The number of worker threads (0 means the notifications are sent inline by the caller).
+            queue_size: The maximum number of deliveries waiting for a worker.
+            max_attempts: The maximum number of attempts to deliver a notification.
+            backoff: The delay, in seconds, before the first retry.
+            max_backoff: The maximum delay, in seconds, before a retry.
+            dead_letters: The maximum number of dead letters kept (the oldest are dropped first).
+        """
+        self._pool = WorkerPool(name, workers, queue_size) if workers > 0 else None
+        self._max_attempts = max_attempts
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._dead_letters = deque(maxlen=dead_letters)
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Returns the number of deliveries waiting for a worker.
+        """
+        return self._pool.queue_depth if self._pool is not None else 0
+
+    @property
+    def dead_letters(self) -> list:
+        """
+        Returns the (notification, reason) of the notifications that could not be delivered.
+        """
+        with self._lock:
+            return list(self._dead_letters)
+
+    def dispatch(self, sender: NotificationSender, notifications) -> None:
+        """
+        Queues the delivery of notifications and returns without waiting for them to be sent.
+
+        Args:
+            sender: The sender delivering the notifications.
+            notifications: The notifications to deliver.
+        """
+        self._submit(sender, list(notifications), 1)
+
+    def join(self) -> None:
+        """
+        Blocks until every queued delivery has been attempted.
+        """
+        if self._pool is not None:
+            self._pool.join()
+
+    def get_retry_delay(self, attempt: int) -> float:
+        """
+        Computes the delay before retrying a delivery.
+
+        Args:
+            attempt: The number of the attempt that failed.
+
+        Returns:
+            float: A delay drawn between half and the whole of the exponential backoff.
+        """
+        delay = min(self._max_backoff, self._backoff * 2 ** (attempt - 1))
+        return random.uniform(delay / 2, delay)
+
+    def _submit(self, sender: NotificationSender, notifications: list, attempt: int) -> None:
+        """
+        Queues an attempt to deliver notifications, or makes it inline when there is no worker.
+
+        When the queue is full, the attempt counts as failed and is retried after a backoff, without blocking the
+        caller.
+
+        Args:
+            sender: The sender delivering the notifications.
+            notifications: The notifications to deliver.
+            attempt: The number of the attempt.
+        """
+        if self._pool is None:
+            self._deliver(sender, notifications, attempt)
+            return
+        try:
+            self._pool.submit(self._deliver, sender, notifications, attempt)
+        except WorkerPoolSaturated as error:
+            self._retry(sender, notifications, attempt, str(error))
+
+    def _deliver(self, sender: NotificationSender, notifications: list, attempt: int) -> None:
+        """
+        Attempts to deliver notifications and schedules a retry of the failed ones.
+
+        Args:
+            sender: The sender delivering the notifications.
+            notifications: The notifications to deliver.
+            attempt: The number of the attempt.
+        """
+        try:
+            failed_notifications = list(sender.deliver_notifications(notifications))
+            reason = "The sender reported a failure"
+        except Exception as error:
+            logger.exception("Delivery of %d notification(s) failed", len(notifications))
+            failed_notifications, reason = notifications, repr(error)
+
+        if failed_notifications:
+            self._retry(sender, failed_notifications, attempt, reason)
+
+    def _retry(self, sender: NotificationSender, notifications: list, attempt: int, reason: str) -> None:
+        """
+        Schedules another attempt to deliver notifications after a backoff, or gives up on them after the last attempt.
+
+        Args:
+            sender: The sender delivering the notifications.
+            notifications: The notifications that could not be delivered.
+            attempt: The number of the attempt that failed.
+            reason: Why the attempt failed.
+        """
+        if attempt >= self._max_attempts:
+            self._add_dead_letters(notifications, f"{reason} after {attempt} attempt(s)")
+            return
+
+        delay = self.get_retry_delay(attempt)
+        logger.warning("Retrying the delivery of %d notification(s) in %.1fs (attempt %d): %s",
+                       len(notifications), delay, attempt + 1, reason)
+        EscalationScheduler().schedule(delay, self._submit, sender, notifications, attempt + 1)
+
+    def _add_dead_letters(self, notifications: list, reason: str) -> None:
+        """
+        Records notifications that will not be delivered.
+
+        Args:
+            notifications: The notifications given up on.
+            reason: Why they were given up on.
+        """
+        logger.error("Giving up on the delivery of %d notification(s): %s", len(notifications), reason)
+        with self._lock:
+            self._dead_letters.extend((notification, reason) for notification in notifications)
+
+
+class NotificationDispatcher(DeliveryQueue, metaclass=SingletonMeta):
+    """
+    Singleton DeliveryQueue through which the handlers send their notifications, so that the escalation of an alert
+    never waits for the email server.
+    """
+
+    def __init__(self):
+        """
+        Initializes the NotificationDispatcher with the parameters defined in the settings.
+        """
+        super().__init__('notification-dispatcher', settings.NOTIFICATION_DISPATCHER_WORKERS,
+                         settings.NOTIFICATION_DISPATCHER_QUEUE_SIZE, settings.NOTIFICATION_DISPATCHER_MAX_ATTEMPTS,
+                         settings.NOTIFICATION_DISPATCHER_BACKOFF, settings.NOTIFICATION_DISPATCHER_MAX_BACKOFF,
+                         settings.NOTIFICATION_DISPATCHER_DEAD_LETTERS)
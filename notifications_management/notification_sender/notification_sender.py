@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
+from functools import lru_cache
 from django.urls import reverse
 from api.models import Notification
+from api.tokens import make_notification_token
 from ift785_project import settings
 from notifications_management.notification_level.notification_level import NotificationLevel
 
@@ -39,6 +41,21 @@ class NotificationSender(ABC):
         """
         self._level = value
 
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_link_prefix():
+        """
+        Get the part of the confirmation links shared by all the notifications.
+
+        The URL is resolved once and then cached for the life of the process.
+
+        Returns:
+            str: The confirmation link without the token of the notification.
+        """
+        url = reverse('api:confirm_notification')
+        domain = settings.DOMAIN
+        return f"{domain}{url}?token="
+
     @staticmethod
     def generate_link(notification: Notification):
         """
@@ -50,10 +67,8 @@ class NotificationSender(ABC):
         Returns:
             str: The confirmation link for the notification.
         """
-        token = notification.token
-        url = reverse('api:confirm_notification')
-        domain = settings.DOMAIN
-        return f"{domain}{url}?token={token}"
+        token = notification.token or make_notification_token(notification.pk)
+        return NotificationSender.get_link_prefix() + token
 
     def deliver_notification(self, notification: Notification):
         """
@@ -70,6 +85,47 @@ class NotificationSender(ABC):
         recipient = self.get_recipient(notification)
         self.send(subject=subject, content=content, recipient=recipient)
 
+    def deliver_notifications(self, notifications) -> list:
+        """
+         Deliver several notifications at once.
+
+         This method generates the content, subject, and recipient of every notification and then sends them all
+         together, so that the sender can share its resources (e.g. a connection) between them.
+
+         Args:
+             notifications (list[Notification]): The notification objects.
+
+         Returns:
+             list[Notification]: The notifications that could not be delivered.
+         """
+        messages = [
+            (notification, self.generate_subject(notification), self.generate_content(notification),
+             self.get_recipient(notification))
+            for notification in notifications
+        ]
+        return self.send_batch(messages)
+
+    def send_batch(self, messages) -> list:
+        """
+        Send several notifications.
+
+        This default implementation sends the messages one after the other with the send method. Concrete subclasses
+        may override it to send them more efficiently.
+
+        Args:
+            messages (list[tuple]): The (notification, subject, content, recipient) of each message.
+
+        Returns:
+            list[Notification]: The notifications whose message could not be sent.
+        """
+        failed_notifications = []
+        for notification, subject, content, recipient in messages:
+            try:
+                self.send(subject=subject, content=content, recipient=recipient)
+            except Exception:
+                failed_notifications.append(notification)
+        return failed_notifications
+
     def generate_content(self, notification: Notification):
         """
         Generate the content/body of the notification email.
@@ -0,0 +1,125 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from api.models import Notification
+from ift785_project import settings
+from notifications_management.models import OutboxMessage
+from notifications_management.notification_level.notification_level import NotificationLevel
+from notifications_management.notification_sender.email_notification_sender import EmailNotificationSender
+
+logger = logging.getLogger(__name__)
+
+
+def write_outbox_message(notification: Notification, level: NotificationLevel) -> OutboxMessage:
+    """
+    Renders the email of a notification and writes it to the outbox.
+
+    Args:
+        notification (Notification): The notification to send.
+        level (NotificationLevel): The level of notification used to render the email.
+
+    Returns:
+        OutboxMessage: The new outbox message.
+    """
+    return write_outbox_messages([notification], level)[0]
+
+
+def write_outbox_messages(notifications, level: NotificationLevel) -> list:
+    """
+    Renders the emails of several notifications and writes them to the outbox with a single INSERT.
+
+    Args:
+        notifications (list[Notification]): The notifications to send.
+        level (NotificationLevel): The level of notification used to render the emails.
+
+    Returns:
+        list[OutboxMessage]: The new outbox messages.
+    """
+    sender = EmailNotificationSender(level)
+    return OutboxMessage.objects.bulk_create([
+        OutboxMessage(notification=notification,
+                      subject=sender.generate_subject(notification),
+                      content=sender.generate_content(notification),
+                      recipient=sender.get_recipient(notification))
+        for notification in notifications
+    ])
+
+
+def claim_outbox_messages(batch_size: int) -> list:
+    """
+    Reserves a batch of the pending messages of the outbox to the caller for NOTIFICATION_OUTBOX_CLAIM_TIMEOUT seconds.
+
+    The messages are claimed with a single UPDATE whose conditions are checked again on each row, so that several
+    run_outbox processes can drain the outbox at the same time without sending the same message twice. The claim is
+    committed right away: no transaction is kept open while the emails are sent.
+
+    Args:
+        batch_size (int): The maximum number of messages to claim.
+
+    Returns:
+        list[OutboxMessage]: The messages claimed.
+    """
+    now = timezone.now()
+    claimable = (OutboxMessage.objects
+                 .filter(sent_at__isnull=True, attempts__lt=settings.NOTIFICATION_OUTBOX_MAX_ATTEMPTS)
+                 .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now)))
+    message_ids = list(claimable.order_by('id').values_list('id', flat=True)[:batch_size])
+    if not message_ids:
+        return []
+
+    claim = uuid.uuid4().hex
+    claimable.filter(pk__in=message_ids).update(
+        claimed_by=claim, claimed_until=now + timedelta(seconds=settings.NOTIFICATION_OUTBOX_CLAIM_TIMEOUT)
+    )
+    return list(OutboxMessage.objects.filter(claimed_by=claim).order_by('id'))
+
+
+def drain_outbox(batch_size: int) -> tuple:
+    """
+    Sends a batch of the pending messages of the outbox over a single connection.
+
+    The batch is first claimed (see claim_outbox_messages), then sent outside of any transaction, and finally the
+    messages sent are marked as sent in a short transaction; the others have their number of attempts incremented and
+    are given up on once it reaches NOTIFICATION_OUTBOX_MAX_ATTEMPTS. When the email server cannot be reached, every
+    message of the batch counts as failed.
+
+    Args:
+        batch_size (int): The maximum number of messages to send.
+
+    Returns:
+        tuple: The number of messages sent and the number of messages that could not be sent.
+    """
+    messages = claim_outbox_messages(batch_size)
+    if not messages:
+        return 0, 0
+
+    # The outbox messages stand in for the notifications: the sender reports back the ones it could not send
+    sender = EmailNotificationSender(None)
+    last_error = "The email server did not accept the message"
+    try:
+        failed_messages = sender.send_batch([
+            (message, message.subject, message.content, message.recipient) for message in messages
+        ])
+    except OSError as error:
+        # The email server could not be reached (smtplib errors are OSErrors too): the whole batch failed
+        logger.warning("Could not send a batch of %d emails: %s", len(messages), error)
+        failed_messages = messages
+        last_error = f"Could not reach the email server: {error}"
+
+    failed_ids = {message.pk for message in failed_messages}
+    sent_ids = [message.pk for message in messages if message.pk not in failed_ids]
+    for message in failed_messages:
+        message.attempts += 1
+        message.last_error = last_error
+        message.claimed_by = ''
+        message.claimed_until = None
+    with transaction.atomic():
+        OutboxMessage.objects.filter(pk__in=sent_ids).update(sent_at=timezone.now(), claimed_by='', claimed_until=None)
+        OutboxMessage.objects.bulk_update(failed_messages, ['attempts', 'last_error', 'claimed_by', 'claimed_until'])
+
+    return len(sent_ids), len(failed_messages)
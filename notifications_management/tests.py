@@ -1,21 +1,34 @@
-from datetime import datetime
-from unittest.mock import patch, MagicMock
-
-from django.test import TestCase
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest.mock import patch, MagicMock, ANY
+
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
 from api.models import Notification, Person, CaregiverLevel, Caregiver, SensorAlert, Home
 from notifications_management.notification_level.notification_level import NotificationLevel
 from notifications_management.notification_level.notification_level_one import NotificationLevelOne
 from notifications_management.notification_level.notification_level_three import NotificationLevelThree
 from notifications_management.notification_level.notification_level_two import NotificationLevelTwo
+from notifications_management.notification_sender.email_connection_pool import EmailConnectionPool
 from notifications_management.notification_sender.email_notification_sender import EmailNotificationSender
+from notifications_management.notification_sender.notification_dispatcher import DeliveryQueue
+from notifications_management.models import OutboxMessage
+from notifications_management.outbox import write_outbox_message, drain_outbox, claim_outbox_messages
+from chain_of_responsibility.handlers.base_handler import BaseHandler
+from chain_of_responsibility.worker_pool import WorkerPoolSaturated
 from ift785_project import settings
 from notifications_management.notification_sender.notification_sender import NotificationSender
 
 
 class EmailNotificationSenderTestCase(TestCase):
     def setUp(self):
+        EmailConnectionPool().close_all()
+        self.addCleanup(EmailConnectionPool().close_all)
         # Create necessary objects for the test
         self.elderly = Person.objects.create(first_name="John", last_name="Doe", email="john@example.com")
         self.caregiver = Person.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com")
@@ -28,6 +41,7 @@ class EmailNotificationSenderTestCase(TestCase):
                                                        measurable="Test Measurable", home=self.home)
         self.notification = Notification.objects.create(caregiver=self.caregiver_instance,
                                                         sensor_alert=self.sensor_alert, token="test_token")
+        self.addCleanup(NotificationLevel.evict_alert, self.sensor_alert.pk)
 
     def test_generate_subject_EmailNotificationSender_NotificationLevelOne(self):
         """
@@ -259,6 +273,7 @@ class EmailNotificationSenderTestCase(TestCase):
             from_email=settings.EMAIL_FROM,  # Use the default parameter for 'from_email'
             recipient_list=[recipient],
             fail_silently=False,
+            connection=ANY,
         )
 
     @patch('notifications_management.notification_sender.email_notification_sender.send_mail')
@@ -286,6 +301,7 @@ class EmailNotificationSenderTestCase(TestCase):
             from_email=settings.EMAIL_FROM,  # Use the default parameter for 'from_email'
             recipient_list=[recipient],
             fail_silently=False,
+            connection=ANY,
         )
 
     @patch('notifications_management.notification_sender.email_notification_sender.send_mail')
@@ -312,9 +328,395 @@ class EmailNotificationSenderTestCase(TestCase):
             from_email=settings.EMAIL_FROM,  # Use the default parameter for 'from_email'
             recipient_list=[recipient],
             fail_silently=False,
+            connection=ANY,
         )
 
 
+    def test_deliver_notifications_sends_all_emails(self):
+        """
+        Test the deliver_notifications method of EmailNotificationSender.
+
+        This test verifies that an email is sent for each notification of the batch.
+        """
+        other_notification = Notification.objects.create(caregiver=self.caregiver_instance,
+                                                         sensor_alert=self.sensor_alert, token="other_token")
+        email_sender = EmailNotificationSender(NotificationLevelThree())
+
+        failed_notifications = email_sender.deliver_notifications([self.notification, other_notification])
+
+        self.assertEqual(failed_notifications, [])
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, [self.caregiver.email])
+        self.assertEqual(mail.outbox[0].from_email, settings.EMAIL_FROM)
+
+    @patch('notifications_management.notification_sender.email_connection_pool.get_connection')
+    def test_deliver_notifications_uses_one_connection(self, mock_get_connection):
+        """
+        Test the deliver_notifications method of EmailNotificationSender.
+
+        This test verifies that a single connection is opened for the whole batch and that the notifications whose
+        email could not be sent are reported.
+        """
+        other_notification = Notification.objects.create(caregiver=self.caregiver_instance,
+                                                         sensor_alert=self.sensor_alert, token="other_token")
+        connection = mock_get_connection.return_value
+        connection.send_messages.side_effect = [1, Exception("Relay refused the message")]
+        email_sender = EmailNotificationSender(NotificationLevelThree())
+
+        failed_notifications = email_sender.deliver_notifications([self.notification, other_notification])
+
+        mock_get_connection.assert_called_once()
+        connection.open.assert_called_once()
+        connection.close.assert_not_called()
+        self.assertEqual(connection.send_messages.call_count, 2)
+        self.assertEqual(failed_notifications, [other_notification])
+
+
+    def test_alert_fields_rendered_once_per_alert(self):
+        """
+        Test that the alert-scoped part of the notifications of an alert is rendered once, and only the fields of the
+        recipient for each notification.
+        """
+        other_caregiver = Person.objects.create(first_name="Jack", last_name="Smith", email="jack@example.com")
+        other_notification = Notification.objects.create(
+            caregiver=Caregiver.objects.create(elderly=self.elderly, caregiver=other_caregiver,
+                                               level=self.caregiver_level),
+            sensor_alert=self.sensor_alert, token="other_token")
+        level = NotificationLevelThree()
+
+        with patch.object(NotificationLevelThree, 'get_alert_fields',
+                          wraps=level.get_alert_fields) as mock_get_alert_fields:
+            content = level.generate_content(self.notification)
+            other_content = level.generate_content(other_notification)
+            level.generate_subject(other_notification)
+
+        mock_get_alert_fields.assert_called_once()
+        self.assertIn(self.caregiver.first_name, content)
+        self.assertIn(other_caregiver.first_name, other_content)
+        self.assertIn("other_token", other_content)
+        self.assertIn(self.sensor_alert.location, other_content)
+
+    def test_evict_alert(self):
+        """
+        Test that the alert-scoped part of the notifications is rendered again once the alert has been evicted.
+        """
+        level = NotificationLevelOne()
+        level.generate_content(self.notification)
+        SensorAlert.objects.filter(pk=self.sensor_alert.pk).update(location="Bathroom")
+
+        NotificationLevel.evict_alert(self.sensor_alert.pk)
+        self.notification.sensor_alert.refresh_from_db()
+
+        self.assertIn("Bathroom", level.generate_content(self.notification))
+
+    def test_alert_fields_are_not_placeholders(self):
+        """
+        Test that a '$' in a field of the alert is rendered as is instead of being taken for a placeholder.
+        """
+        self.sensor_alert.location = "$link $5"
+        self.sensor_alert.save()
+
+        content = NotificationLevelThree().generate_content(self.notification)
+
+        self.assertIn("Location: $link $5", content)
+
+
+class EmailConnectionPoolTestCase(TestCase):
+    def setUp(self):
+        self.pool = EmailConnectionPool()
+        self.pool.close_all()
+        self.addCleanup(self.pool.close_all)
+        patcher = patch('notifications_management.notification_sender.email_connection_pool.get_connection',
+                        side_effect=lambda: MagicMock(spec=['open', 'close', 'send_messages', 'connection']))
+        self.mock_get_connection = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_connection_is_reused(self):
+        """
+        Test that a connection given back to the pool is lent again instead of opening a new one.
+        """
+        with self.pool.connection() as first:
+            first.connection.noop.return_value = (250, b'OK')
+        with self.pool.connection() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.mock_get_connection.assert_called_once()
+        first.open.assert_called_once()
+
+    def test_dead_connection_is_replaced(self):
+        """
+        Test that an idle connection failing the NOOP check is closed and replaced by a new one.
+        """
+        with self.pool.connection() as first:
+            first.connection.noop.side_effect = OSError("Connection reset by peer")
+        with self.pool.connection() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        first.close.assert_called_once()
+        self.assertEqual(self.mock_get_connection.call_count, 2)
+
+    @override_settings(EMAIL_CONNECTION_POOL_IDLE_TIMEOUT=0)
+    def test_idle_connection_is_closed(self):
+        """
+        Test that a connection idle for longer than the idle timeout is closed instead of being lent again.
+        """
+        with self.pool.connection() as first:
+            first.connection.noop.return_value = (250, b'OK')
+        with patch('notifications_management.notification_sender.email_connection_pool.time.monotonic',
+                   side_effect=lambda: float('inf')):
+            with self.pool.connection() as second:
+                pass
+
+        self.assertIsNot(first, second)
+        first.close.assert_called_once()
+
+    def test_failed_connection_is_not_reused(self):
+        """
+        Test that a connection whose use raised an exception is closed instead of being given back to the pool.
+        """
+        with self.assertRaises(OSError):
+            with self.pool.connection() as first:
+                raise OSError("Broken pipe")
+        with self.pool.connection() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        first.close.assert_called_once()
+
+
+class DeliveryQueueTestCase(TestCase):
+    def setUp(self):
+        self.sender = MagicMock()
+        self.notifications = [MagicMock(), MagicMock()]
+        patcher = patch('notifications_management.notification_sender.notification_dispatcher.EscalationScheduler')
+        self.mock_scheduler = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_queue(self, workers=0, queue_size=10, max_attempts=3):
+        return DeliveryQueue('test-delivery-queue', workers, queue_size, max_attempts, backoff=1, max_backoff=3,
+                             dead_letters=10)
+
+    def test_dispatch_in_background(self):
+        """
+        Test that the notifications are delivered by the worker threads of the queue.
+        """
+        self.sender.deliver_notifications.return_value = []
+        delivery_queue = self.create_queue(workers=1)
+
+        delivery_queue.dispatch(self.sender, self.notifications)
+        delivery_queue.join()
+
+        self.sender.deliver_notifications.assert_called_once_with(self.notifications)
+        self.mock_scheduler.return_value.schedule.assert_not_called()
+        self.assertEqual(delivery_queue.dead_letters, [])
+
+    def test_failed_notifications_are_retried(self):
+        """
+        Test that only the notifications that could not be delivered are retried, after a backoff.
+        """
+        self.sender.deliver_notifications.return_value = [self.notifications[1]]
+        delivery_queue = self.create_queue()
+
+        delivery_queue.dispatch(self.sender, self.notifications)
+
+        delay, retry, *args = self.mock_scheduler.return_value.schedule.call_args[0]
+        self.assertTrue(0.5 <= delay <= 1)
+        self.assertEqual(args, [self.sender, [self.notifications[1]], 2])
+
+        # Run the retry as the scheduler would
+        self.sender.deliver_notifications.return_value = []
+        retry(*args)
+        self.sender.deliver_notifications.assert_called_with([self.notifications[1]])
+        self.assertEqual(delivery_queue.dead_letters, [])
+
+    def test_backoff_is_exponential_and_bounded(self):
+        """
+        Test that the delay before a retry doubles at each attempt without exceeding the maximum backoff.
+        """
+        delivery_queue = self.create_queue()
+
+        self.assertTrue(1 <= delivery_queue.get_retry_delay(2) <= 2)
+        self.assertTrue(1.5 <= delivery_queue.get_retry_delay(10) <= 3)
+
+    def test_notifications_are_dead_lettered_after_max_attempts(self):
+        """
+        Test that a notification still failing at the last attempt is moved to the dead letters.
+        """
+        self.sender.deliver_notifications.side_effect = Exception("Relay unavailable")
+        delivery_queue = self.create_queue(max_attempts=1)
+
+        delivery_queue.dispatch(self.sender, self.notifications)
+
+        self.mock_scheduler.return_value.schedule.assert_not_called()
+        self.assertEqual([notification for notification, _ in delivery_queue.dead_letters], self.notifications)
+
+    def test_notifications_are_retried_when_queue_is_full(self):
+        """
+        Test that the notifications that cannot be queued are retried after a backoff instead of blocking the caller,
+        and only moved to the dead letters once every attempt has found the queue full.
+        """
+        delivery_queue = self.create_queue(workers=1, queue_size=1, max_attempts=2)
+        with patch.object(delivery_queue._pool, 'submit', side_effect=WorkerPoolSaturated("full")):
+            delivery_queue.dispatch(self.sender, self.notifications)
+
+            delay, retry, *args = self.mock_scheduler.return_value.schedule.call_args[0]
+            self.assertEqual(args, [self.sender, self.notifications, 2])
+            self.assertEqual(delivery_queue.dead_letters, [])
+
+            # Run the retry as the scheduler would, the queue being still full
+            retry(*args)
+
+        self.assertEqual(self.mock_scheduler.return_value.schedule.call_count, 1)
+        self.assertEqual(len(delivery_queue.dead_letters), 2)
+
+
+class OutboxTestCase(TestCase):
+    def setUp(self):
+        self.elderly = Person.objects.create(first_name="John", last_name="Doe", email="john@example.com")
+        self.caregiver = Person.objects.create(first_name="Jane", last_name="Doe", email="jane@example.com")
+        self.caregiver_instance = Caregiver.objects.create(elderly=self.elderly, caregiver=self.caregiver,
+                                                           level=CaregiverLevel.objects.create(level=1))
+        self.home = Home.objects.create(home="Test Home", elderly=self.elderly)
+        self.sensor_alert = SensorAlert.objects.create(subject="Test Alert", start=datetime.now(),
+                                                       location="Test Location", state=0.5,
+                                                       measurable="Test Measurable", home=self.home)
+        self.addCleanup(NotificationLevel.evict_alert, self.sensor_alert.pk)
+
+    @patch.object(settings, 'NOTIFICATION_OUTBOX_ENABLED', True)
+    def test_build_notification_writes_outbox_message(self):
+        """
+        Test that the email of a new notification is rendered and written to the outbox along with it.
+        """
+        notification = BaseHandler.build_notification(self.caregiver_instance, self.sensor_alert,
+                                                      NotificationLevelThree())
+
+        message = OutboxMessage.objects.get(notification=notification)
+        self.assertEqual(message.recipient, self.caregiver.email)
+        self.assertEqual(message.subject, NotificationLevelThree().generate_subject(notification))
+        self.assertIsNone(message.sent_at)
+
+    @patch.object(settings, 'NOTIFICATION_OUTBOX_ENABLED', True)
+    @patch('chain_of_responsibility.handlers.base_handler.write_outbox_messages', side_effect=Exception("Disk full"))
+    def test_build_notification_is_atomic(self, mock_write_outbox_message):
+        """
+        Test that no notification is saved when its email cannot be written to the outbox.
+        """
+        with self.assertRaises(Exception):
+            BaseHandler.build_notification(self.caregiver_instance, self.sensor_alert, NotificationLevelThree())
+
+        self.assertFalse(Notification.objects.exists())
+
+    def test_build_notification_without_outbox(self):
+        """
+        Test that nothing is written to the outbox when it is disabled.
+        """
+        BaseHandler.build_notification(self.caregiver_instance, self.sensor_alert, NotificationLevelThree())
+
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_drain_outbox(self):
+        """
+        Test that the pending messages of the outbox are sent and marked as sent, and that the failed ones are kept
+        for a later attempt.
+        """
+        notification = Notification.objects.create(caregiver=self.caregiver_instance, sensor_alert=self.sensor_alert,
+                                                   token="test_token")
+        sent_message = write_outbox_message(notification, NotificationLevelThree())
+        failed_message = write_outbox_message(notification, NotificationLevelTwo())
+
+        with patch('notifications_management.outbox.EmailNotificationSender.send_batch',
+                   side_effect=lambda messages: [messages[1][0]]):
+            self.assertEqual(drain_outbox(10), (1, 1))
+
+        sent_message.refresh_from_db()
+        failed_message.refresh_from_db()
+        self.assertIsNotNone(sent_message.sent_at)
+        self.assertIsNone(failed_message.sent_at)
+        self.assertEqual(failed_message.attempts, 1)
+
+    @patch('notifications_management.notification_sender.email_connection_pool.get_connection')
+    def test_run_outbox_command_when_server_unreachable(self, mock_get_connection):
+        """
+        Test that the run_outbox command survives an unreachable email server, counting a failed attempt for each
+        email of the batch.
+        """
+        EmailConnectionPool().close_all()
+        self.addCleanup(EmailConnectionPool().close_all)
+        mock_get_connection.return_value.open.side_effect = ConnectionRefusedError("Connection refused")
+        notification = Notification.objects.create(caregiver=self.caregiver_instance, sensor_alert=self.sensor_alert,
+                                                   token="test_token")
+        message = write_outbox_message(notification, NotificationLevelThree())
+
+        call_command('run_outbox', '--once', stdout=StringIO())
+
+        message.refresh_from_db()
+        self.assertIsNone(message.sent_at)
+        self.assertEqual(message.attempts, 1)
+        self.assertIn("Connection refused", message.last_error)
+
+    @patch('notifications_management.management.commands.run_outbox.time.sleep',
+           side_effect=[None, None, None, KeyboardInterrupt])
+    @patch('notifications_management.management.commands.run_outbox.drain_outbox', return_value=(0, 1))
+    def test_run_outbox_command_backs_off(self, mock_drain_outbox, mock_sleep):
+        """
+        Test that the run_outbox command keeps polling, waiting longer and longer, while no email can be sent.
+        """
+        with self.assertRaises(KeyboardInterrupt):
+            call_command('run_outbox', '--interval', '1', stdout=StringIO())
+
+        self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [1, 2, 4, 8])
+
+    def test_drain_outbox_sends_outside_transaction(self):
+        """
+        Test that the emails are sent once their batch is claimed, without any transaction open while they are sent.
+        """
+        notification = Notification.objects.create(caregiver=self.caregiver_instance, sensor_alert=self.sensor_alert,
+                                                   token="test_token")
+        write_outbox_message(notification, NotificationLevelThree())
+        # The test itself runs within transactions
+        atomic_blocks = len(connection.atomic_blocks)
+        atomic_blocks_while_sending = []
+
+        def send_batch(messages):
+            atomic_blocks_while_sending.append(len(connection.atomic_blocks))
+            return []
+
+        with patch('notifications_management.outbox.EmailNotificationSender.send_batch', side_effect=send_batch):
+            self.assertEqual(drain_outbox(10), (1, 0))
+
+        self.assertEqual(atomic_blocks_while_sending, [atomic_blocks])
+
+    def test_claimed_messages_are_not_claimed_again(self):
+        """
+        Test that the messages claimed by a drain are not claimed by another one until their claim expires.
+        """
+        notification = Notification.objects.create(caregiver=self.caregiver_instance, sensor_alert=self.sensor_alert,
+                                                   token="test_token")
+        message = write_outbox_message(notification, NotificationLevelThree())
+
+        self.assertEqual(claim_outbox_messages(10), [message])
+        self.assertEqual(claim_outbox_messages(10), [])
+
+        OutboxMessage.objects.update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(claim_outbox_messages(10), [message])
+
+    def test_run_outbox_command(self):
+        """
+        Test that the run_outbox command sends every pending email of the outbox.
+        """
+        notification = Notification.objects.create(caregiver=self.caregiver_instance, sensor_alert=self.sensor_alert,
+                                                   token="test_token")
+        for _ in range(3):
+            write_outbox_message(notification, NotificationLevelThree())
+
+        call_command('run_outbox', '--once', '--batch-size', '2', stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboxMessage.objects.filter(sent_at__isnull=True).exists())
+
+
 class NotificationSenderTestCase(TestCase):
 
     @patch('notifications_management.notification_sender.notification_sender.NotificationSender.send')
@@ -363,12 +765,32 @@ class NotificationSenderTestCase(TestCase):
         expected_url = "/confirm_notification"  # Assume this is the expected URL for notification confirmation
         mock_reverse.return_value = expected_url
 
+        # The prefix of the links is cached: make sure it is resolved with the mocked reverse, and not kept afterwards
+        NotificationSender.get_link_prefix.cache_clear()
+        self.addCleanup(NotificationSender.get_link_prefix.cache_clear)
+
         # Call the generate_link method without passing a Notification object
         generated_link = NotificationSender.generate_link(notification)
 
         # Check if the generated URL is correct
         self.assertEqual(generated_link, f"{domain}{expected_url}?token={token}")
 
+    @patch('notifications_management.notification_sender.notification_sender.reverse')
+    def test_generate_link_resolves_url_once(self, mock_reverse):
+        """
+        Test that the confirmation URL is resolved once and then reused for every link.
+        """
+        mock_reverse.return_value = "/confirm_notification"
+        NotificationSender.get_link_prefix.cache_clear()
+        self.addCleanup(NotificationSender.get_link_prefix.cache_clear)
+
+        first_link = NotificationSender.generate_link(Notification(token="first_token"))
+        second_link = NotificationSender.generate_link(Notification(token="second_token"))
+
+        mock_reverse.assert_called_once()
+        self.assertTrue(first_link.endswith("?token=first_token"))
+        self.assertTrue(second_link.endswith("?token=second_token"))
+
     """
     Tests methods: get_level & set_level
     """